@@ -0,0 +1,154 @@
+"""
+=============================================================================
+SCRIPT : benchmark_json_repair.py
+=============================================================================
+
+DESCRIPTION :
+    Compare, sur un corpus de réponses d'extraction malformées
+    (analyse/data/json_repair_corpus.jsonl), deux façons de décoder le JSON :
+    - "chaîne"  : l'ancienne chaîne de extract_json_from_response (4 tentatives
+                  regex + json.loads, recopiée ci-dessous) ; les cas qu'elle ne
+                  résout pas partaient vers le fallback LLM (appel réseau à
+                  Mistral Small, tronqué à 10 000 caractères), non exécuté ici
+    - "réparateur" : repair_json (app/json_repair.py), une seule passe locale
+
+    Le corpus est construit à partir de sections réelles des dossiers, mises au
+    format du schéma d'extraction, avec les défauts rencontrés dans les
+    réponses : texte ou backticks autour, virgules en trop ou manquantes,
+    guillemets non échappés, sauts de ligne bruts, échappements invalides,
+    caractères de contrôle, réponses tronquées.
+
+    Un cas est réussi si le JSON obtenu est identique au JSON attendu ou,
+    pour une réponse tronquée, s'il conserve au moins les sections écrites
+    en entier avant la coupure.
+
+OUTPUTS GÉNÉRÉS :
+    - Affichage console : résultat par type de défaut, latences, réparations
+
+USAGE :
+    python benchmark_json_repair.py
+=============================================================================
+"""
+
+import json
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "app"))
+
+from json_repair import JSONRepairError, repair_json  # noqa: E402
+
+CORPUS_PATH = ROOT_DIR / "analyse" / "data" / "json_repair_corpus.jsonl"
+REPEAT = 5
+
+
+def legacy_chain(response_text: str):
+    """Tentatives 1 à 4 de l'ancien extract_json_from_response (sans le fallback LLM)."""
+    json_start = response_text.find('{')
+    json_end = response_text.rfind('}') + 1
+    if json_start == -1 or json_end <= json_start:
+        raise ValueError("Aucune accolade { } trouvée dans la réponse")
+    json_str = response_text[json_start:json_end]
+
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', json_str))
+    except json.JSONDecodeError:
+        pass
+    try:
+        json_str_clean = re.sub(r',\s*([}\]])', r'\1', json_str)
+        json_str_clean = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', json_str_clean)
+        return json.loads(json_str_clean)
+    except json.JSONDecodeError:
+        pass
+    json_str_clean = json_str.replace('\\n', '__NEWLINE__ESCAPED__')
+    json_str_clean = json_str_clean.replace('\\r', '__RETURN__ESCAPED__')
+    json_str_clean = json_str_clean.replace('\\t', '__TAB__ESCAPED__')
+    json_str_clean = json_str_clean.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+    json_str_clean = json_str_clean.replace('__NEWLINE__ESCAPED__', '\\n')
+    json_str_clean = json_str_clean.replace('__RETURN__ESCAPED__', '\\r')
+    json_str_clean = json_str_clean.replace('__TAB__ESCAPED__', '\\t')
+    json_str_clean = re.sub(r',\s*([}\]])', r'\1', json_str_clean)
+    json_str_clean = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', json_str_clean)
+    return json.loads(json_str_clean)
+
+
+def repairer(response_text: str):
+    return repair_json(response_text).value
+
+
+def is_success(case, value) -> bool:
+    if case["expected"] is not None:
+        return value == case["expected"]
+    return isinstance(value, dict) and len(value.get("sections", [])) >= case["min_sections"]
+
+
+def run(decoder, case):
+    """Retourne (statut, latence ms) ; statut : "ok", "altéré" ou "échec"."""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        try:
+            value = decoder(case["raw"])
+        except (ValueError, JSONRepairError):
+            value = None
+    elapsed_ms = (time.perf_counter() - start) * 1000 / REPEAT
+    if value is None:
+        return "échec", elapsed_ms
+    return ("ok" if is_success(case, value) else "altéré"), elapsed_ms
+
+
+def main() -> int:
+    cases = [json.loads(line) for line in CORPUS_PATH.read_text(encoding="utf-8").splitlines() if line.strip()]
+    decoders = {"chaîne": legacy_chain, "réparateur": repairer}
+
+    by_defect = defaultdict(lambda: {name: Counter() for name in decoders})
+    latencies = {name: [] for name in decoders}
+    repairs = Counter()
+
+    for case in cases:
+        for name, decoder in decoders.items():
+            status, elapsed_ms = run(decoder, case)
+            by_defect[case["defect"]][name][status] += 1
+            latencies[name].append(elapsed_ms)
+        try:
+            repairs.update(set(repair_json(case["raw"]).repairs))
+        except JSONRepairError:
+            pass
+
+    print(f"Corpus : {len(cases)} réponses ({CORPUS_PATH.name})\n")
+    print(f"{'Défaut':<26} {'Cas':>4} {'Chaîne ok/altéré/échec':>24} {'Réparateur ok/altéré/échec':>28}")
+    print("-" * 86)
+    totals = {name: Counter() for name in decoders}
+    for defect, results in by_defect.items():
+        nb = sum(results["chaîne"].values())
+        cells = []
+        for name in decoders:
+            c = results[name]
+            totals[name].update(c)
+            cells.append(f"{c['ok']}/{c['altéré']}/{c['échec']}")
+        print(f"{defect:<26} {nb:>4} {cells[0]:>24} {cells[1]:>28}")
+    print("-" * 86)
+
+    for name in decoders:
+        c = totals[name]
+        values = sorted(latencies[name])
+        median = values[len(values) // 2]
+        print(f"{name:<11} : {c['ok']}/{len(cases)} réussis ({c['ok'] / len(cases) * 100:.0f}%), "
+              f"{c['altéré']} altéré(s), {c['échec']} échec(s) ; "
+              f"latence médiane {median:.2f} ms, max {values[-1]:.2f} ms")
+    print(f"\nÉchecs de la chaîne = appels au fallback LLM (un aller-retour réseau de plusieurs secondes chacun) : "
+          f"{totals['chaîne']['échec']}")
+    print("Réparations appliquées (nombre de réponses) : "
+          + ", ".join(f"{kind} {n}" for kind, n in repairs.most_common()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
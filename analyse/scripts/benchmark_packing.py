@@ -0,0 +1,93 @@
+"""
+=============================================================================
+SCRIPT : benchmark_packing.py
+=============================================================================
+
+DESCRIPTION :
+    Compare les deux modes de découpage en paquets de build_packets
+    (app/document_compression.py) sur tous les dossiers :
+    - "greedy"  : remplissage séquentiel (mode historique)
+    - "optimal" : programmation dynamique, nombre minimal de paquets puis
+                  tailles équilibrées et coupures entre sections sœurs pénalisées
+
+    Pour chaque budget d'entrée, affiche le nombre de paquets (= appels LLM
+    d'extraction) et la taille du plus gros paquet (qui fixe le temps de
+    l'extraction parallèle).
+
+OUTPUTS GÉNÉRÉS :
+    - Affichage console : tableau par dossier et par budget, puis totaux
+
+USAGE :
+    python benchmark_packing.py [budget1 budget2 ...]
+    (par défaut : 42000 20000 12000 tokens)
+=============================================================================
+"""
+
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[2] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from document_compression import build_packets, parse_document, shared_parent  # noqa: E402
+
+DOSSIERS_DIR = APP_DIR / "dossiers"
+DEFAULT_BUDGETS = [42000, 20000, 12000]
+MODES = ["greedy", "optimal"]
+
+
+def parent_splits(packets) -> int:
+    """Nombre de coupures entre deux paquets consécutifs dont les sections partagent un parent."""
+    return sum(
+        1 for prev, nxt in zip(packets, packets[1:])
+        if shared_parent(prev.nodes[-1], nxt.nodes[0])
+    )
+
+
+def main() -> int:
+    budgets = [int(arg) for arg in sys.argv[1:]] or DEFAULT_BUDGETS
+    documents = [(path.name, parse_document(path.read_text(encoding="utf-8")))
+                 for path in sorted(DOSSIERS_DIR.glob("*.txt"))]
+
+    for budget in budgets:
+        print(f"\n=== Budget d'entrée : {budget:,} tokens ===")
+        print(f"{'Dossier':<45} {'Paquets G/O':>12} {'Max G/O (tokens)':>20} {'Coupures G/O':>13} {'ms G/O':>12}")
+        print("-" * 106)
+        totals = {mode: {"packets": 0, "max": 0, "splits": 0} for mode in MODES}
+
+        for name, nodes in documents:
+            row = {}
+            for mode in MODES:
+                start = time.perf_counter()
+                try:
+                    packets = build_packets(nodes, max_input_tokens=budget, mode=mode)
+                except ValueError as e:
+                    row = None
+                    print(f"{name[:45]:<45} ⚠️ {e}")
+                    break
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                row[mode] = (len(packets), max(p.total_tokens for p in packets), parent_splits(packets), elapsed_ms)
+            if row is None:
+                continue
+
+            for mode in MODES:
+                totals[mode]["packets"] += row[mode][0]
+                totals[mode]["max"] += row[mode][1]
+                totals[mode]["splits"] += row[mode][2]
+            g, o = row["greedy"], row["optimal"]
+            marker = " ✅" if (o[0], o[1]) < (g[0], g[1]) else ""
+            print(f"{name[:45]:<45} {g[0]:>5} / {o[0]:<5} {g[1]:>9,} / {o[1]:<8,} {g[2]:>5} / {o[2]:<5} "
+                  f"{g[3]:>5.1f} / {o[3]:<5.1f}{marker}")
+
+        print("-" * 106)
+        g, o = totals["greedy"], totals["optimal"]
+        print(f"{'TOTAL':<45} {g['packets']:>5} / {o['packets']:<5} {g['max']:>9,} / {o['max']:<8,} "
+              f"{g['splits']:>5} / {o['splits']:<5}")
+        print("   (Max : somme sur les dossiers de la taille du plus gros paquet)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
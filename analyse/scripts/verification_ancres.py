@@ -0,0 +1,147 @@
+"""
+=============================================================================
+SCRIPT : verification_ancres.py
+=============================================================================
+
+DESCRIPTION :
+    Vérifie le découpage local par ancres de la compression simplifiée
+    (slice_structure / AnchorLocator, app/simple_compression.py) sans appel LLM.
+
+    Pour chaque dossier, les sections détectées par parse_document servent de
+    vérité terrain : on simule la réponse du LLM (titre + 8 premiers / 8
+    derniers mots de chaque section) puis on vérifie que le contenu découpé
+    localement correspond exactement au texte de la section. Les ancres sont
+    aussi dégradées comme peut le faire un LLM (comparaison mot à mot) :
+    - "exactes"   : citation littérale
+    - "casse"     : minuscules et accents supprimés
+    - "mot faux"  : un mot remplacé
+    - "mot perdu" : un mot omis
+
+    Affiche aussi une estimation des tokens de sortie de l'identification :
+    JSON d'ancres contre JSON recopiant le contenu (mode "complet").
+
+OUTPUTS GÉNÉRÉS :
+    - Affichage console : taux de sections retrouvées par dégradation,
+      tokens de sortie estimés, temps de découpage local
+    - Code de sortie 1 si moins de 98 % des sections sont retrouvées avec des
+      ancres exactes (les écarts restants viennent de passages cités à
+      l'identique ailleurs dans le document : titre, ouverture et fin répétés,
+      ambigus pour la référence elle-même)
+
+USAGE :
+    python verification_ancres.py
+=============================================================================
+"""
+
+import json
+import random
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[2] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from document_compression import parse_document  # noqa: E402
+from simple_compression import estimate_tokens, slice_structure  # noqa: E402
+
+DOSSIERS_DIR = APP_DIR / "dossiers"
+ANCHOR_WORDS = 8
+MIN_SECTION_WORDS = 2 * ANCHOR_WORDS
+MIN_EXACT_RATE = 0.98
+
+
+def strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def degrade(words, kind, rng):
+    words = list(words)
+    if kind == "casse":
+        return [strip_accents(w).lower() for w in words]
+    if kind == "mot faux":
+        words[rng.randrange(len(words))] = "xyz"
+    elif kind == "mot perdu":
+        del words[rng.randrange(len(words))]
+    return words
+
+
+def words_of(text: str):
+    """Mots du texte (la ponctuation isolée en bord de section est ignorée)."""
+    return re.findall(r"\w+", text)
+
+
+def expected_sections(text: str):
+    """Sections (titre, contenu hors ligne de titre) assez longues pour porter deux ancres."""
+    sections = []
+    for node in parse_document(text):
+        start, end = node.spans[0][0], node.spans[-1][1]
+        raw = node.source.text[start:end]
+        first_break = raw.find("\n")
+        content = raw[first_break + 1:].strip() if first_break != -1 else ""
+        if len(content.split()) >= MIN_SECTION_WORDS and node.source.text.count(content) == 1:
+            sections.append((node.title, content, node.source.text))
+    return sections
+
+
+def main() -> int:
+    rng = random.Random(18)
+    kinds = ["exactes", "casse", "mot faux", "mot perdu"]
+    found = {kind: 0 for kind in kinds}
+    total = 0
+    tokens_anchors = tokens_full = 0
+    slicing_ms = 0.0
+    exact_failures = 0
+
+    for path in sorted(DOSSIERS_DIR.glob("*.txt")):
+        sections = expected_sections(path.read_text(encoding="utf-8"))
+        if not sections:
+            continue
+        buffer = sections[0][2]
+        total += len(sections)
+
+        full = {"faits": {"sous_sections": [{"titre": t, "contenu": c} for t, c, _ in sections]}}
+        tokens_full += estimate_tokens(json.dumps(full, ensure_ascii=False, indent=2))
+
+        for kind in kinds:
+            subsections = []
+            for title, content, _ in sections:
+                words = content.split()
+                subsections.append({
+                    "titre": title,
+                    "debut": " ".join(degrade(words[:ANCHOR_WORDS], kind, rng)),
+                    "fin": " ".join(degrade(words[-ANCHOR_WORDS:], kind, rng)),
+                })
+            anchors = {"faits": {"sous_sections": subsections}}
+            if kind == "exactes":
+                tokens_anchors += estimate_tokens(json.dumps(anchors, ensure_ascii=False, indent=2))
+
+            start = time.perf_counter()
+            structure, _missing = slice_structure(buffer, anchors)
+            slicing_ms += (time.perf_counter() - start) * 1000
+
+            for (title, content, _), got in zip(sections, structure["faits"]["sous_sections"]):
+                if words_of(got["contenu"]) == words_of(content):
+                    found[kind] += 1
+                elif kind == "exactes":
+                    exact_failures += 1
+                    print(f"  ❌ {path.name} / {title[:60]!r} : contenu découpé différent")
+
+    print(f"{total} sections de référence sur {len(list(DOSSIERS_DIR.glob('*.txt')))} dossiers\n")
+    for kind in kinds:
+        print(f"  Ancres {kind:<10} : {found[kind]}/{total} sections retrouvées à l'identique "
+              f"({found[kind] / total * 100:.1f}%)")
+    print(f"\nTokens de sortie estimés : ancres {tokens_anchors:,} contre contenu recopié {tokens_full:,} "
+          f"(÷{tokens_full / tokens_anchors:.1f})")
+    print(f"Découpage local : {slicing_ms / len(kinds):.1f} ms par passe sur l'ensemble des dossiers")
+    if found["exactes"] / total < MIN_EXACT_RATE:
+        print(f"❌ {exact_failures} section(s) non retrouvée(s) avec des ancres exactes")
+        return 1
+    print(f"✅ Ancres exactes : {found['exactes']}/{total} sections retrouvées (seuil {MIN_EXACT_RATE:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
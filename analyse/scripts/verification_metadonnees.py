@@ -0,0 +1,89 @@
+"""
+=============================================================================
+SCRIPT : verification_metadonnees.py
+=============================================================================
+
+DESCRIPTION :
+    Test différentiel de l'index de métadonnées en un balayage
+    (DocumentMetadataIndex, construit par parse_document) contre l'extraction
+    de référence section par section (extract_light_metadata) de
+    app/document_compression.py, sur toutes les sections des dossiers.
+
+    Les sections fusionnées (titre seul rattaché à la section suivante) sont
+    ignorées : leurs métadonnées ne portent que sur la section d'origine.
+
+OUTPUTS GÉNÉRÉS :
+    - Affichage console : divergences éventuelles et temps par dossier
+    - Code de sortie 1 si au moins une divergence est détectée
+
+USAGE :
+    python verification_metadonnees.py
+=============================================================================
+"""
+
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[2] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from document_compression import (  # noqa: E402
+    DocumentMetadataIndex,
+    extract_header_registry,
+    extract_light_metadata,
+    parse_document,
+)
+
+DOSSIERS_DIR = APP_DIR / "dossiers"
+
+
+def main() -> int:
+    nb_divergences = 0
+    total_ref = 0.0
+    total_index = 0.0
+
+    print(f"{'Dossier':<50} {'Sections':>8} {'Réf. (ms)':>10} {'Index (ms)':>10}")
+    print("-" * 82)
+
+    for path in sorted(DOSSIERS_DIR.glob("*.txt")):
+        text = path.read_text(encoding="utf-8")
+        header_registry = extract_header_registry(text)
+        nodes = [node for node in parse_document(text) if len(node.spans) == 1]
+        buffer = nodes[0].source.text if nodes else ""
+
+        start = time.perf_counter()
+        reference = [extract_light_metadata(node.text, header_registry=header_registry) for node in nodes]
+        ref_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        index = DocumentMetadataIndex(buffer, [node.spans[0] for node in nodes])
+        indexed = [
+            index.metadata_for(node.spans, node.approx_tokens, header_registry)
+            for node in nodes
+        ]
+        index_ms = (time.perf_counter() - start) * 1000
+
+        total_ref += ref_ms
+        total_index += index_ms
+
+        for node, ref, got in zip(nodes, reference, indexed):
+            for key in ref:
+                if ref[key] != got[key]:
+                    nb_divergences += 1
+                    print(f"  ❌ {path.name} {node.id} [{key}] référence={ref[key]!r:.120} index={got[key]!r:.120}")
+
+        print(f"{path.name[:50]:<50} {len(nodes):>8} {ref_ms:>10.1f} {index_ms:>10.1f}")
+
+    print("-" * 82)
+    if total_index:
+        print(f"Total : référence {total_ref:.1f} ms, index {total_index:.1f} ms (x{total_ref / total_index:.1f})")
+    if nb_divergences:
+        print(f"❌ {nb_divergences} divergence(s)")
+        return 1
+    print("✅ Aucune divergence")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
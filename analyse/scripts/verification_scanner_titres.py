@@ -0,0 +1,94 @@
+"""
+=============================================================================
+SCRIPT : verification_scanner_titres.py
+=============================================================================
+
+DESCRIPTION :
+    Test différentiel du scanner de titres en une passe (scan_headings :
+    pré-filtre multi-lignes + classify_heading) contre l'implémentation de
+    référence (heading_level_and_kind) de app/document_compression.py,
+    sur toutes les lignes des dossiers.
+
+    Vérifie également que clean_line (split/join) produit exactement le même
+    résultat que l'ancienne substitution regex re.sub(r"\\s+", " ", ...).strip().
+
+OUTPUTS GÉNÉRÉS :
+    - Affichage console : divergences éventuelles et temps par dossier
+    - Code de sortie 1 si au moins une divergence est détectée
+
+USAGE :
+    python verification_scanner_titres.py
+=============================================================================
+"""
+
+import re
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[2] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from document_compression import (  # noqa: E402
+    clean_line,
+    heading_level_and_kind,
+    scan_headings,
+    split_lines,
+)
+
+DOSSIERS_DIR = APP_DIR / "dossiers"
+
+
+def clean_line_reference(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip()
+
+
+def main() -> int:
+    nb_divergences = 0
+    total_ref = 0.0
+    total_scan = 0.0
+
+    print(f"{'Dossier':<50} {'Lignes':>7} {'Titres':>7} {'Réf. (ms)':>10} {'Scan (ms)':>10}")
+    print("-" * 90)
+
+    for path in sorted(DOSSIERS_DIR.glob("*.txt")):
+        lines = split_lines(path.read_text(encoding="utf-8"))
+
+        start = time.perf_counter()
+        reference = [heading_level_and_kind(line) for line in lines]
+        ref_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        headings = scan_headings(lines)
+        scan_ms = (time.perf_counter() - start) * 1000
+
+        scanned = [None] * len(lines)
+        for line_no, level, kind, _stripped in headings:
+            scanned[line_no] = (level, kind)
+
+        total_ref += ref_ms
+        total_scan += scan_ms
+
+        for line_no, (line, ref, got) in enumerate(zip(lines, reference, scanned), start=1):
+            if ref != got:
+                nb_divergences += 1
+                print(f"  ❌ {path.name}:{line_no} référence={ref} scanner={got} | {line[:80]!r}")
+            if clean_line(line) != clean_line_reference(line):
+                nb_divergences += 1
+                print(f"  ❌ {path.name}:{line_no} clean_line diverge | {line[:80]!r}")
+
+        nb_titles = sum(1 for r in reference if r)
+        print(f"{path.name[:50]:<50} {len(lines):>7} {nb_titles:>7} {ref_ms:>10.1f} {scan_ms:>10.1f}")
+
+    print("-" * 90)
+    print(f"Total : référence {total_ref:.1f} ms, scanner {total_scan:.1f} ms "
+          f"(x{total_ref / total_scan:.1f})" if total_scan else "")
+    if nb_divergences:
+        print(f"❌ {nb_divergences} divergence(s)")
+        return 1
+    print("✅ Aucune divergence")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
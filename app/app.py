@@ -3,16 +3,12 @@ import streamlit.components.v1 as components
 import os
 import json
 import html
-import re
+import uuid
 from pathlib import Path
 from urllib.parse import urlencode
-from openai import OpenAI
-from mistralai import Mistral
 import requests
 from dotenv import load_dotenv
-import tiktoken
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+import asyncio
 
 # Répertoire de base (où se trouve app.py)
 BASE_DIR = Path(__file__).parent
@@ -25,21 +21,93 @@ print(f"[DEBUG] .env path: {_env_path.absolute()}, exists: {_env_path.exists()},
 
 # Import du module de compression pour les documents longs
 from document_compression import (
-    parse_and_packetize,
+    EXTRACTION_JSON_SCHEMA,
     build_extraction_system_prompt,
     build_extraction_user_prompt,
+    build_fragment_repair_prompt,
     build_final_system_prompt,
     build_final_user_prompt,
+    build_merge_system_prompt,
+    build_merge_user_prompt,
     compute_compressed_tokens,
+    compute_serialization_savings,
+    group_for_merge,
+    serialize_extracted_jsons,
+    parse_document,
     approximate_tokens as approx_tokens_simple,
 )
 
+# Comptage des tokens par modèle (ratio calibré sur l'usage renvoyé par les API)
+# et comptabilité des conversations (encodeur tiktoken partagé, comptes par message)
+from token_counting import count_messages_tokens, count_text_tokens, counter_from_name, get_token_counter, record_usage
+
+# Résultats de parsing mémorisés (mémoire + disque)
+from parse_cache import cached_parse_and_packetize, get_parse_cache
+
+# Boucle asyncio partagée pour l'extraction des paquets
+from async_runtime import run_blocking
+
+# Réparation locale des JSON d'extraction
+from json_repair import REPAIR_TRUNCATED, repair_json
+
+# Validation locale des extractions contre leur JSON Schema
+from schema_validation import SchemaError, get_at, set_at, subschema_at, validate
+
+# Cache persistant des extractions par paquet
+from extraction_cache import get_extraction_cache, make_cache_key
+
+# Points de reprise du pipeline par paquets (par exécution et par paquet)
+from checkpoints import RUN_COMPLETED, RUN_INCOMPLETE, document_hash, get_checkpoint_store
+
+# Dossiers, prompts et critères d'évaluation (lus à la demande, mémorisés par date de modification)
+from corpus import get_corpus
+
+# Documents de la conversation (une copie par session, messages par référence)
+from document_store import FOLLOW_UP_FULL, FOLLOW_UP_SECTIONS, FOLLOW_UP_SUMMARY, DocumentStore
+
+# File des évaluations Magistral (lots, déduplication, résultats récupérés au rerun)
+from evaluations import get_evaluation_queue
+
+# Jobs d'arrière-plan (pool de workers + table SQLite)
+from jobs import STATUS_DONE, get_job_runner
+
+# Contrôle adaptatif de la concurrence (AIMD) par fournisseur
+from concurrency import all_limiter_metrics, get_limiter, throttle_reason
+
 # Import du module de compression simplifiée
 from simple_compression import simple_compression_pipeline
 
+# Registre des modèles et clients LLM partagés
+from llm_clients import (
+    MODEL_SPECS,
+    MODEL_TOKEN_LIMITS,
+    PROVIDERS,
+    EXTRACTION_MODEL_ID,
+    EXTRACTION_TEMPERATURE,
+    EVALUATION_MODEL_ID,
+    chat_complete,
+    chat_stream,
+    get_mistral_client,
+    json_schema_response_format,
+)
+
+# Sérialisation des données intermédiaires du prompt final ("json" compacté/minifié, "lines" ou "indent")
+FINAL_PROMPT_SERIALIZATION = os.getenv("FINAL_PROMPT_SERIALIZATION", "json")
+
+# Extraction en sorties structurées (JSON Schema imposé au modèle) ; STRUCTURED_EXTRACTION=0 pour désactiver
+STRUCTURED_EXTRACTION = os.getenv("STRUCTURED_EXTRACTION", "1") != "0"
 
-def copy_button(text: str, button_id: str):
-    """Génère un bouton HTML/JS pour copier du texte dans le presse-papiers (format Word)"""
+# Réduction hiérarchique des JSON intermédiaires lorsqu'ils dépassent le contexte du modèle de synthèse ;
+# TREE_REDUCE=0 pour désactiver
+TREE_REDUCE = os.getenv("TREE_REDUCE", "1") != "0"
+FINAL_OUTPUT_RESERVE_TOKENS = 8000  # Contexte réservé à la réponse finale
+MERGE_GROUP_TOKENS = 24000  # Taille maximale des extractions fusionnées en un appel
+MERGE_OUTPUT_TOKENS = 12000  # Taille cible maximale d'une fusion (sortie du modèle d'extraction)
+MAX_REDUCE_LEVELS = 4
+
+
+def copy_button_html(text: str, button_id: str) -> str:
+    """HTML/JS du bouton de copie dans le presse-papiers (format Word)"""
     # Échapper le texte pour JavaScript
     escaped_text = html.escape(text).replace('\n', '\\n').replace('\r', '').replace("'", "\\'")
 
@@ -108,7 +176,8 @@ def copy_button(text: str, button_id: str):
         }}
     </script>
     """
-    components.html(html_code, height=50)
+    return html_code
+
 
 
 # Configuration de la page
@@ -117,82 +186,26 @@ st.set_page_config(page_title="Assistant Juridique IA", layout="wide")
 # Titre de l'application
 st.title("Assistant Juridique IA - Résumé de conclusion et rédaction de l'exposé du litige")
 
-# Mapping des noms de prompts vers les fichiers
-PROMPT_FILES = {
-    "Résumé Conclusions": BASE_DIR / "prompts/resume_conclusions.md",
-    "Synthèse Faits & Procédure": BASE_DIR / "prompts/synthese_faits_procedure.md",
-    "Synthèse Moyens": BASE_DIR / "prompts/synthese_moyens.md",
-    "Rapport de synthèse": BASE_DIR / "prompts/synthese_faits_procedure_moyens.md",
-    "Rédaction Exposé du Litige": BASE_DIR / "prompts/redaction_expose_litige.md"
+# Prompts système proposés : libellé → fichier prompts/<nom>.md (contenu lu via le corpus)
+SYSTEM_PROMPT_NAMES = {
+    "Résumé Conclusions": "resume_conclusions",
+    "Synthèse Faits & Procédure": "synthese_faits_procedure",
+    "Synthèse Moyens": "synthese_moyens",
+    "Rapport de synthèse": "synthese_faits_procedure_moyens",
+    "Rédaction Exposé du Litige": "redaction_expose_litige",
 }
 
 
-# Charger les prompts système depuis les fichiers .md
-def load_system_prompts():
-    """
-    Charge les prompts système depuis les fichiers markdown
-    """
-    prompts = {}
-
-    # Chemins des fichiers de prompts (ordre préservé avec Python 3.7+)
-    prompt_files = [
-        ("Résumé Conclusions", BASE_DIR / "prompts/resume_conclusions.md"),
-        ("Synthèse Faits & Procédure", BASE_DIR / "prompts/synthese_faits_procedure.md"),
-        ("Synthèse Moyens", BASE_DIR / "prompts/synthese_moyens.md"),
-        ("Rapport de synthèse", BASE_DIR / "prompts/synthese_faits_procedure_moyens.md"),
-        ("Rédaction Exposé du Litige", BASE_DIR / "prompts/redaction_expose_litige.md")
-    ]
-
-    # Charger chaque fichier
-    for name, filepath in prompt_files:
-        try:
-            prompts[name] = filepath.read_text(encoding='utf-8')
-        except FileNotFoundError:
-            prompts[name] = f"Erreur : Le fichier {filepath} n'a pas été trouvé."
-
-    return prompts
-
-# Charger les fichiers de conclusions
-def load_conclusion_files():
+def load_system_prompt(name):
     """
-    Charge les fichiers de conclusions juridiques
+    Charge un prompt système (libellé de SYSTEM_PROMPT_NAMES) ; le contenu est
+    mémorisé par le corpus tant que le fichier n'est pas modifié.
     """
-    files = {}
-
-    conclusion_files = {
-        "Dossier 4 - Conclusion Appelante": BASE_DIR / "dossiers/Dossier_4_conclusion_appelante.txt",
-        "Dossier 4 - Conclusion Intimée": BASE_DIR / "dossiers/Dossier_4_conclusion_intimee.txt",
-        "Dossier 5 - Leonard (Employeur)": BASE_DIR / "dossiers/Dossier_5_Leonard_(employeur).txt",
-        "Dossier 5 - Leonard (Salarié)": BASE_DIR / "dossiers/Dossier_5_Leonard_(salarie).txt",
-        "Dossier 6 - Conclusion Appelant": BASE_DIR / "dossiers/Dossier_6_conclusion_appelant.txt",
-        "Dossier 6 - Conclusion Intimée": BASE_DIR / "dossiers/Dossier_6_conclusion_intimee.txt",
-        "Dossier 7 - Conclusion Appelante": BASE_DIR / "dossiers/Dossier_7_conculsion_appelante.txt",
-        "Dossier 7 - Conclusion Intimée": BASE_DIR / "dossiers/Dossier_7_conclusion_intimee.txt",
-        "Dossier 8 - Demandeur": BASE_DIR / "dossiers/Dossier_8_demandeur.txt",
-        "Dossier 8 - Intimée": BASE_DIR / "dossiers/Dossier_8_intimee.txt",
-        "Dossier 9-2 - Demandeur": BASE_DIR / "dossiers/Dossier_9-2_demandeur.txt",
-        "Dossier 9-2 - Défendeur": BASE_DIR / "dossiers/Dossier_9-2_defendeur.txt",
-        "Dossier 13 - Conclusion Défendeur": BASE_DIR / "dossiers/dossier_13_conclusion_defendeur.txt",
-        "Dossier 14 - Défendeur": BASE_DIR / "dossiers/Doissier 14 - defendeur.txt",
-        "Dossier 14 - Demandeur": BASE_DIR / "dossiers/Dossier 14 - demandeur.txt",
-        "Dossier 15 - Défendeur": BASE_DIR / "dossiers/Dossier_15_defendeur.txt",
-        "Dossier 15 - Demandeur": BASE_DIR / "dossiers/Dossier_15_demandeur.txt",
-        "Dossier 17-3 - Assignation": BASE_DIR / "dossiers/Dossier_17-3_Dossier  assignation sans def .txt"
-    }
-
-    for name, filepath in conclusion_files.items():
-        try:
-            files[name] = filepath.read_text(encoding='utf-8')
-        except FileNotFoundError:
-            files[name] = f"Erreur : Le fichier {filepath} n'a pas été trouvé."
-
-    return files
-
-# Charger les prompts système
-SYSTEM_PROMPTS = load_system_prompts()
+    try:
+        return get_corpus().prompt(SYSTEM_PROMPT_NAMES[name])
+    except (KeyError, FileNotFoundError):
+        return f"Prompt non trouvé: {name}"
 
-# Charger les fichiers de conclusions
-CONCLUSION_FILES = load_conclusion_files()
 
 # Initialiser session_state pour l'historique
 if "messages" not in st.session_state:
@@ -204,6 +217,32 @@ if "message_count" not in st.session_state:
 if "evaluations" not in st.session_state:
     st.session_state.evaluations = {}  # Clé = index du message assistant
 
+if "pending_evaluations" not in st.session_state:
+    st.session_state.pending_evaluations = {}  # Clé = index du message assistant, valeur = clé de la file
+
+if "documents" not in st.session_state:
+    st.session_state.documents = DocumentStore()  # Documents référencés par l'historique (doc_ref)
+
+if "message_views" not in st.session_state:
+    st.session_state.message_views = {}  # Clé = id du message (voir get_message_view)
+
+if "pending_job" not in st.session_state:
+    # Job d'arrière-plan en cours pour cette session (identifiant aussi dans l'URL)
+    st.session_state.pending_job = None
+    st.session_state.job_error = None
+    restored_job = get_job_runner().get(st.query_params.get("job", ""))
+    if restored_job is not None:
+        # Rafraîchissement du navigateur : reprendre la conversation du job
+        st.session_state.messages = [
+            st.session_state.documents.message(m["role"], m["content"]) for m in restored_job.params["messages"]
+        ]
+        st.session_state.message_count = sum(1 for m in st.session_state.messages if m["role"] == "user")
+        st.session_state.pending_job = restored_job.id
+
+if "resumable_run" not in st.session_state:
+    # Exécution par paquets inaboutie proposée à la reprise (bouton du chat)
+    st.session_state.resumable_run = None
+
 if "custom_prompt" not in st.session_state:
     st.session_state.custom_prompt = "Vous êtes un assistant juridique. Répondez aux questions de l'utilisateur de manière précise et professionnelle."
 
@@ -233,53 +272,23 @@ MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "")
 print(f"[DEBUG] MISTRAL_API_KEY loaded: {bool(MISTRAL_API_KEY)} ({len(MISTRAL_API_KEY)} chars)")
 print(f"[DEBUG] NEBIUS_API_KEY loaded: {bool(NEBIUS_API_KEY)} ({len(NEBIUS_API_KEY)} chars)")
 
-# Limites de tokens par modèle (contexte d'entrée)
-MODEL_TOKEN_LIMITS = {
-    "Mixtral 8x22B (Mistral)": 64000,
-    "Mistral-medium-2508": 128000,
-    "Mistral Large 2": 131072,
-    "Mistral Small 4": 256000,
-    "GPT-OSS-120B (Nebius)": 128000,
-    "Nemotron Super 120B (Nebius)": 1000000
-}
-
-def estimate_tokens(text):
-    """
-    Compte le nombre de tokens dans un texte en utilisant tiktoken.
-    Utilise l'encodage cl100k_base (GPT-4, compatible avec la plupart des LLMs modernes).
-    """
-    if not text:
-        return 0
-    encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
-
-def count_messages_tokens(system_prompt, messages_history):
-    """
-    Compte le nombre total de tokens dans les messages.
-    """
-    total = estimate_tokens(system_prompt)
-    for msg in messages_history:
-        total += estimate_tokens(msg.get("content", ""))
-    return total
 
 def load_evaluation_criteria():
     """
     Charge les critères d'évaluation depuis le fichier evaluation_criteria.json
+    (mémorisés par le corpus)
     """
     try:
-        return json.loads((BASE_DIR / "evaluation_criteria.json").read_text(encoding='utf-8'))
+        return get_corpus().read_json("evaluation_criteria.json")
     except FileNotFoundError:
         return {}
 
-# Charger les critères d'évaluation
-EVALUATION_CRITERIA = load_evaluation_criteria()
-
 def load_evaluation_prompt():
     """
     Charge le prompt d'évaluation depuis le fichier evaluation_prompt.md
     """
     try:
-        return (BASE_DIR / "prompts/evaluation_prompt.md").read_text(encoding='utf-8')
+        return get_corpus().prompt("evaluation_prompt")
     except FileNotFoundError:
         return None
 
@@ -296,7 +305,8 @@ def evaluate_with_magistral(document_source, reponse_llm, prompt_type):
     if not prompt_template:
         return {"error": "Fichier evaluation_prompt.md non trouvé"}
 
-    criteria = EVALUATION_CRITERIA.get(prompt_type, EVALUATION_CRITERIA["Résumé Conclusions"])
+    evaluation_criteria = load_evaluation_criteria()
+    criteria = evaluation_criteria.get(prompt_type, evaluation_criteria["Résumé Conclusions"])
 
     # Construire la liste des critères pour le prompt
     criteres_text = "\n".join([f"- **{nom}** : {description}" for nom, description in criteria["criteres"]])
@@ -312,9 +322,9 @@ def evaluate_with_magistral(document_source, reponse_llm, prompt_type):
     )
 
     try:
-        client = Mistral(api_key=MISTRAL_API_KEY)
-        response = client.chat.complete(
-            model="magistral-medium-2506",
+        response = chat_complete(
+            "mistral",
+            model=EVALUATION_MODEL_ID,
             messages=[{"role": "user", "content": evaluation_prompt}]
         )
 
@@ -400,6 +410,13 @@ def evaluate_with_magistral(document_source, reponse_llm, prompt_type):
 if st.sidebar.button("🔄 Nouvelle conversation", type="primary", use_container_width=True):
     st.session_state.messages = []
     st.session_state.message_count = 0
+    st.session_state.message_views = {}
+    st.session_state.documents = DocumentStore()
+    st.session_state.evaluations = {}
+    # Évaluations en cours abandonnées : leurs résultats redeviennent évinçables
+    for pending_key in st.session_state.pending_evaluations.values():
+        get_evaluation_queue(evaluate_with_magistral).release(pending_key)
+    st.session_state.pending_evaluations = {}
     st.rerun()
 
 st.sidebar.markdown("---")
@@ -410,7 +427,23 @@ st.sidebar.header("Configuration")
 # Sélection du modèle
 model_choice = st.sidebar.selectbox(
     "Modèle LLM",
-    ["Mixtral 8x22B (Mistral)", "Mistral-medium-2508", "Mistral Large 2", "Mistral Small 4", "GPT-OSS-120B (Nebius)", "Nemotron Super 120B (Nebius)"]
+    list(MODEL_SPECS)
+)
+
+# Affichage de la réponse au fil de la génération
+enable_streaming = st.sidebar.checkbox(
+    "Affichage progressif (streaming)",
+    value=True,
+    key="enable_streaming",
+    help="Affiche la réponse au fur et à mesure de sa génération (réponse directe et résumé final des modes compression)"
+)
+
+# Exécution des pipelines hors du thread du script
+enable_background_jobs = st.sidebar.checkbox(
+    "Exécution en arrière-plan",
+    value=False,
+    key="enable_background_jobs",
+    help="Les traitements longs s'exécutent dans un job : la page reste utilisable et le résultat est conservé en cas de rafraîchissement (pas d'affichage progressif)"
 )
 
 # Sélection du prompt système
@@ -437,13 +470,48 @@ if enable_simple_compression:
 elif enable_compression:
     st.sidebar.info("📦 Mode compression : le document sera découpé en paquets et traité en plusieurs étapes.")
 
-# Mapping des prompts compression vers les fichiers
-COMPRESSION_PROMPT_FILES = {
-    "Résumé Conclusions (mode compression)": BASE_DIR / "prompts/resume_conclusions_compression_mode.md",
-    "Rapport de synthèse (mode compression)": BASE_DIR / "prompts/synthese_faits_procedure_moyens_compression_mode.md",
+# Reprise des exécutions interrompues (compression par paquets uniquement)
+resume_previous_run = enable_compression and not enable_simple_compression and st.sidebar.checkbox(
+    "Reprendre l'exécution précédente",
+    value=True,
+    key="resume_previous_run",
+    help="Si le traitement précédent du même document n'a pas abouti (paquet en échec, redémarrage), seuls les paquets manquants ou en échec sont ré-extraits"
+)
+
+# Relances en appel direct : document des tours précédents renvoyé au modèle
+# (les modes compression ne traitent que le document du dernier message)
+FOLLOW_UP_OPTIONS = {
+    "Document complet": FOLLOW_UP_FULL,
+    "Résumé (réponse précédente)": FOLLOW_UP_SUMMARY,
+    "Sections choisies": FOLLOW_UP_SECTIONS,
+}
+follow_up_mode = FOLLOW_UP_FULL
+follow_up_sections = []
+if not enable_compression:
+    follow_up_mode = FOLLOW_UP_OPTIONS[st.sidebar.selectbox(
+        "Relances : document renvoyé",
+        list(FOLLOW_UP_OPTIONS),
+        key="follow_up_mode",
+        help="Pour les questions suivantes, le document déjà transmis peut être renvoyé en entier, "
+             "remplacé par une mention (sa synthèse figure dans la réponse précédente) ou réduit aux sections choisies"
+    )]
+    follow_up_document = st.session_state.documents.latest(st.session_state.messages)
+    if follow_up_mode == FOLLOW_UP_SECTIONS and follow_up_document is not None:
+        follow_up_titles = [title for title, _text in follow_up_document.sections()]
+        follow_up_sections = st.sidebar.multiselect(
+            "Sections renvoyées",
+            list(range(len(follow_up_titles))),
+            format_func=lambda i: follow_up_titles[i][:80],
+            key=f"follow_up_sections_{follow_up_document.doc_hash[:12]}"
+        )
+
+# Mapping des prompts compression vers les fichiers prompts/<nom>.md
+COMPRESSION_PROMPT_NAMES = {
+    "Résumé Conclusions (mode compression)": "resume_conclusions_compression_mode",
+    "Rapport de synthèse (mode compression)": "synthese_faits_procedure_moyens_compression_mode",
 }
 
-# Mapping des prompts standards vers les clés SYSTEM_PROMPTS
+# Mapping des prompts standards vers les libellés de SYSTEM_PROMPT_NAMES
 PROMPT_MAPPING = {
     "Résumé Conclusions": "Résumé Conclusions",
     "Rapport de synthèse": "Rapport de synthèse",
@@ -458,11 +526,11 @@ elif enable_simple_compression:
 elif enable_compression:
     # Pour les modes compression standard, le prompt sera chargé par document_compression.py
     # On stocke juste une référence pour l'affichage
-    system_prompt = f"[Mode compression - prompt chargé depuis {COMPRESSION_PROMPT_FILES[prompt_choice].name}]"
+    system_prompt = f"[Mode compression - prompt chargé depuis {COMPRESSION_PROMPT_NAMES[prompt_choice]}.md]"
 else:
     # Pour les prompts standards, utiliser le mapping
     prompt_key = PROMPT_MAPPING.get(prompt_choice, prompt_choice)
-    system_prompt = SYSTEM_PROMPTS.get(prompt_key, f"Prompt non trouvé: {prompt_choice}")
+    system_prompt = load_system_prompt(prompt_key)
 
 # Éditeur du prompt sélectionné (sauf pour le prompt personnalisable qui a son propre onglet)
 if prompt_choice != "Prompt personnalisable":
@@ -475,9 +543,9 @@ if prompt_choice != "Prompt personnalisable":
             label_visibility="collapsed"
         )
         if st.button("💾 Sauvegarder", use_container_width=True):
-            filepath = PROMPT_FILES.get(prompt_choice)
-            if filepath:
-                filepath.write_text(edited_prompt, encoding='utf-8')
+            prompt_name = SYSTEM_PROMPT_NAMES.get(prompt_choice)
+            if prompt_name:
+                get_corpus().prompt_path(prompt_name).write_text(edited_prompt, encoding='utf-8')
                 st.success("✅ Sauvegardé !")
                 st.rerun()
 else:
@@ -493,80 +561,8 @@ enable_evaluation = st.sidebar.checkbox(
     help="Évalue automatiquement chaque réponse avec Magistral Medium (modèle de raisonnement)"
 )
 
-# Fonction pour appeler le modèle
-def call_model(model_choice, system_prompt, messages_history):
-    """
-    Appelle le modèle sélectionné avec l'historique des messages
-    """
-    import time
-    call_start = time.time()
-
-    # Construire les messages avec le système + historique
-    full_messages = [{"role": "system", "content": system_prompt}] + messages_history
-
-    # Calculer les tokens approximatifs
-    total_content = system_prompt + "".join([m.get("content", "") for m in messages_history])
-    approx_input_tokens = len(total_content) // 4
-
-    print(f"      📡 call_model() appelé", flush=True)
-    print(f"         └─ Modèle: {model_choice}", flush=True)
-    print(f"         └─ Tokens input estimés: ~{approx_input_tokens:,}", flush=True)
-
-    # Mixtral 8x22B via Mistral
-    if model_choice == "Mixtral 8x22B (Mistral)":
-        if not MISTRAL_API_KEY:
-            raise ValueError("La clé API Mistral n'est pas configurée.")
-
-        print(f"         └─ 🔄 Appel API Mistral (open-mixtral-8x22b)...", flush=True)
-        client = Mistral(api_key=MISTRAL_API_KEY)
-        response = client.chat.complete(
-            model="open-mixtral-8x22b",
-            messages=full_messages,
-            temperature=0.3
-        )
-        elapsed = time.time() - call_start
-        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s", flush=True)
-        return response.choices[0].message.content
-
-    # Mistral Medium 2508 (modèle assistant numérique)
-    elif model_choice == "Mistral-medium-2508":
-        if not MISTRAL_API_KEY:
-            raise ValueError("La clé API Mistral n'est pas configurée.")
-
-        print(f"         └─ 🔄 Appel API Mistral (mistral-medium-2508)...", flush=True)
-        client = Mistral(api_key=MISTRAL_API_KEY)
-        response = client.chat.complete(
-            model="mistral-medium-2508",
-            messages=full_messages,
-            temperature=0.3
-        )
-        elapsed = time.time() - call_start
-        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s", flush=True)
-        return response.choices[0].message.content
-
-    # Mistral Large 2 (modèle flagship)
-    elif model_choice == "Mistral Large 2":
-        if not MISTRAL_API_KEY:
-            raise ValueError("La clé API Mistral n'est pas configurée.")
-
-        print(f"         └─ 🔄 Appel API Mistral (mistral-large-2411)...", flush=True)
-        client = Mistral(api_key=MISTRAL_API_KEY)
-        response = client.chat.complete(
-            model="mistral-large-2411",
-            messages=full_messages,
-            temperature=0.3
-        )
-        elapsed = time.time() - call_start
-        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s", flush=True)
-        return response.choices[0].message.content
-
-    # Mistral Small 4 (modèle compact performant)
-    elif model_choice == "Mistral Small 4":
-        if not MISTRAL_API_KEY:
-            raise ValueError("La clé API Mistral n'est pas configurée.")
-
-        # Renforcer l'instruction de style et de complétude pour ce modèle
-        style_instruction = """
+# Consignes ajoutées pour les modèles qui ont tendance à s'arrêter trop tôt (Mistral Small 4)
+COMPLETENESS_INSTRUCTION = """
 
 ⚠️ INSTRUCTIONS CRITIQUES :
 
@@ -584,254 +580,152 @@ def call_model(model_choice, system_prompt, messages_history):
 
 ⚠️ NE T'ARRÊTE PAS AVANT D'AVOIR TOUT TRAITÉ !
 """
-        enhanced_system_prompt = system_prompt + style_instruction
 
-        # Ajouter un rappel des instructions à la fin du dernier message utilisateur
-        # (technique de "bookending" pour les longs contextes)
-        enhanced_messages = [{"role": "system", "content": enhanced_system_prompt}]
-        for i, msg in enumerate(messages_history):
-            if i == len(messages_history) - 1 and msg["role"] == "user":
-                # Dernier message utilisateur : ajouter rappel à la fin
-                rappel = """
+COMPLETENESS_REMINDER = """
 
 ---
 ⚠️ RAPPEL FINAL : Ta réponse doit être EXHAUSTIVE et COMPLÈTE (minimum 5000 mots). Traite TOUS les moyens de TOUTES les parties. Ne t'arrête pas avant d'avoir tout couvert. Rédige en prose littéraire fluide, comme un arrêt de cour d'appel.
 """
-                enhanced_messages.append({"role": msg["role"], "content": msg["content"] + rappel})
-            else:
-                enhanced_messages.append(msg)
-
-        print(f"         └─ 🔄 Appel API Mistral (mistral-small-2603)...", flush=True)
-        client = Mistral(api_key=MISTRAL_API_KEY)
-        response = client.chat.complete(
-            model="mistral-small-2603",
-            messages=enhanced_messages,
-            temperature=0.3
-        )
-        elapsed = time.time() - call_start
-        # Debug: stocker la raison d'arrêt pour affichage
-        finish_reason = response.choices[0].finish_reason
-        usage = response.usage
-        st.session_state["debug_finish_reason"] = finish_reason
-        st.session_state["debug_usage"] = f"Tokens: {usage.prompt_tokens} (prompt) + {usage.completion_tokens} (completion) = {usage.total_tokens} (total)"
-
-        # Log console pour debug supplémentaire
-        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s (finish_reason={finish_reason}, tokens={usage.completion_tokens})", flush=True)
 
-        return response.choices[0].message.content
 
-    # GPT-OSS-120B via Nebius (OpenAI compatible)
-    elif model_choice == "GPT-OSS-120B (Nebius)":
-        if not NEBIUS_API_KEY:
-            raise ValueError("La clé API Nebius n'est pas configurée.")
-
-        print(f"         └─ 🔄 Appel API Nebius (gpt-oss-120b)...", flush=True)
-        client = OpenAI(
-            base_url="https://api.studio.nebius.ai/v1/",
-            api_key=NEBIUS_API_KEY
-        )
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b",
-            messages=full_messages,
-            temperature=0.3
-        )
-        elapsed = time.time() - call_start
-        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s", flush=True)
-        return response.choices[0].message.content
-
-    # Nemotron Super 120B via Nebius (OpenAI compatible)
-    elif model_choice == "Nemotron Super 120B (Nebius)":
-        if not NEBIUS_API_KEY:
-            raise ValueError("La clé API Nebius n'est pas configurée.")
-
-        print(f"         └─ 🔄 Appel API Nebius (nemotron-3-super-120b)...", flush=True)
-        client = OpenAI(
-            base_url="https://api.studio.nebius.ai/v1/",
-            api_key=NEBIUS_API_KEY
-        )
-        response = client.chat.completions.create(
-            model="nvidia/nemotron-3-super-120b-a12b",
-            messages=full_messages,
-            temperature=0.3
-        )
-        elapsed = time.time() - call_start
-        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s", flush=True)
-        return response.choices[0].message.content
+def build_model_messages(spec, system_prompt, messages_history):
+    """
+    Construit la liste de messages envoyée au modèle (système + historique).
+    Pour les modèles marqués `completeness_reminder`, renforce le prompt système
+    et ajoute un rappel à la fin du dernier message utilisateur ("bookending").
+    """
+    # Seuls role/content sont envoyés (l'historique porte aussi debug_info, compression_info...)
+    api_messages = [{"role": msg["role"], "content": msg["content"]} for msg in messages_history]
+    if not spec.completeness_reminder:
+        return [{"role": "system", "content": system_prompt}] + api_messages
+
+    enhanced_messages = [{"role": "system", "content": system_prompt + COMPLETENESS_INSTRUCTION}]
+    for i, msg in enumerate(api_messages):
+        if i == len(api_messages) - 1 and msg["role"] == "user":
+            # Dernier message utilisateur : ajouter rappel à la fin
+            enhanced_messages.append({"role": msg["role"], "content": msg["content"] + COMPLETENESS_REMINDER})
+        else:
+            enhanced_messages.append(msg)
+    return enhanced_messages
 
 
-def repair_json_with_llm(malformed_json: str, max_length=10000) -> dict:
+def record_response_debug(spec, full_messages, finish_reason, usage, elapsed, debug_sink=None):
     """
-    Fallback : utilise un petit LLM pour réparer un JSON malformé.
+    Enregistre l'usage (calibration des tokens) et, pour les modèles marqués
+    `capture_debug`, la raison d'arrêt et les tokens pour affichage debug.
 
     Args:
-        malformed_json: Le JSON malformé à réparer
-        max_length: Longueur max du JSON à envoyer (pour limiter les coûts)
-
-    Returns:
-        dict: Le JSON réparé et parsé
+        debug_sink: Dictionnaire recevant les infos debug (défaut: st.session_state ;
+            les jobs d'arrière-plan, sans accès à la session, fournissent le leur)
     """
-    if not MISTRAL_API_KEY:
-        raise ValueError("Clé API Mistral non configurée pour le fallback JSON repair")
-
-    # Tronquer si trop long
-    json_to_repair = malformed_json[:max_length] if len(malformed_json) > max_length else malformed_json
+    if usage:
+        record_usage(spec.model_id, full_messages, usage.prompt_tokens)
 
-    repair_prompt = f"""Tu es un expert en réparation de JSON malformé.
+    if spec.capture_debug and usage:
+        sink = debug_sink if debug_sink is not None else st.session_state
+        sink["debug_finish_reason"] = finish_reason
+        sink["debug_usage"] = f"Tokens: {usage.prompt_tokens} (prompt) + {usage.completion_tokens} (completion) = {usage.total_tokens} (total)"
+        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s (finish_reason={finish_reason}, tokens={usage.completion_tokens})", flush=True)
+    else:
+        print(f"         └─ ✅ Réponse reçue en {elapsed:.1f}s (finish_reason={finish_reason})", flush=True)
 
-TÂCHE : Le JSON ci-dessous contient une ou plusieurs erreurs de syntaxe. Répare-le et retourne UNIQUEMENT le JSON corrigé, sans aucun texte avant ou après.
 
-ERREURS COURANTES À CORRIGER :
-- Virgules trailing (avant ] ou }})
-- Guillemets non échappés dans les chaînes
-- Sauts de ligne non échappés
-- Accolades/crochets non fermés
-- JSON tronqué (fermer proprement les structures ouvertes)
+# Fonction pour appeler le modèle
+def call_model(model_choice, system_prompt, messages_history, stream=False, debug_sink=None):
+    """
+    Appelle le modèle sélectionné avec l'historique des messages
 
-JSON MALFORMÉ :
-```
-{json_to_repair}
-```
+    Args:
+        stream: Si True, retourne un ChatStream à afficher avec st.write_stream
+            (le texte complet est ensuite dans .text) au lieu du texte complet
+        debug_sink: Voir record_response_debug
+    """
+    import time
+    call_start = time.time()
 
-RETOURNE UNIQUEMENT LE JSON CORRIGÉ (sans backticks, sans explication) :"""
+    spec = MODEL_SPECS.get(model_choice)
+    if spec is None:
+        raise ValueError(f"Modèle inconnu : {model_choice}")
 
-    try:
-        client = Mistral(api_key=MISTRAL_API_KEY)
-        response = client.chat.complete(
-            model="mistral-small-2603",
-            messages=[{"role": "user", "content": repair_prompt}],
-            temperature=0.0,
-            max_tokens=max_length + 1000  # Un peu plus pour les corrections
-        )
+    # Calculer les tokens approximatifs
+    total_content = system_prompt + "".join([m.get("content", "") for m in messages_history])
+    approx_input_tokens = len(total_content) // 4
 
-        repaired_text = response.choices[0].message.content
+    print(f"      📡 call_model() appelé", flush=True)
+    print(f"         └─ Modèle: {model_choice}", flush=True)
+    print(f"         └─ Tokens input estimés: ~{approx_input_tokens:,}", flush=True)
 
-        # Extraire le JSON réparé (même logique que extract_json_from_response)
-        json_start = repaired_text.find('{')
-        json_end = repaired_text.rfind('}') + 1
+    full_messages = build_model_messages(spec, system_prompt, messages_history)
 
-        if json_start != -1 and json_end > json_start:
-            json_str = repaired_text[json_start:json_end]
-            return json.loads(json_str)
-        else:
-            raise ValueError("Le LLM n'a pas retourné de JSON valide")
+    if stream:
+        print(f"         └─ 🔄 Appel API en flux {PROVIDERS[spec.provider].label} ({spec.model_id})...", flush=True)
+        response_stream = chat_stream(
+            spec.provider,
+            model=spec.model_id,
+            messages=full_messages,
+            temperature=spec.temperature
+        )
+        return response_stream.on_complete(
+            lambda done: record_response_debug(
+                spec, full_messages, done.finish_reason, done.usage, time.time() - call_start, debug_sink
+            )
+        )
 
-    except Exception as e:
-        raise ValueError(f"Échec du fallback LLM repair: {str(e)}")
+    print(f"         └─ 🔄 Appel API {PROVIDERS[spec.provider].label} ({spec.model_id})...", flush=True)
+    response = chat_complete(
+        spec.provider,
+        model=spec.model_id,
+        messages=full_messages,
+        temperature=spec.temperature
+    )
+    record_response_debug(
+        spec, full_messages, response.choices[0].finish_reason, response.usage, time.time() - call_start, debug_sink
+    )
+    return response.choices[0].message.content
 
 
-def extract_json_from_response(response_text: str, debug=False) -> dict:
+def extract_json_from_response(response_text: str, debug=False):
     """
     Extrait un objet JSON d'une réponse LLM.
-    Gère les cas où le JSON est entouré de backticks markdown.
-    Applique plusieurs nettoyages pour corriger les erreurs JSON courantes.
-    """
-    original_length = len(response_text)
-
-    # Stratégie 1 : Chercher le premier { et le dernier } (ignore les backticks)
-    # Cette approche est plus robuste que le regex si les backticks sont malformés
-    json_start = response_text.find('{')
-    json_end = response_text.rfind('}') + 1
-
-    if json_start == -1 or json_end <= json_start:
-        raise ValueError("Aucune accolade { } trouvée dans la réponse")
+    Gère les cas où le JSON est entouré de texte ou de backticks markdown.
+    Les erreurs courantes (virgules, guillemets non échappés, sauts de ligne,
+    réponse tronquée...) sont réparées localement en une passe (json_repair).
 
-    json_str = response_text[json_start:json_end]
+    Returns:
+        tuple: (dict extrait, liste des réparations appliquées) ; une réponse
+        tronquée (REPAIR_TRUNCATED) a été complétée localement et a perdu sa fin
+    """
+    result = repair_json(response_text)
 
+    if result.repaired:
+        print(f"🩹 JSON réparé localement: {result.summary()}", flush=True)
     if debug:
-        print(f"[DEBUG extract_json] Original length: {original_length}, JSON extracted: {len(json_str)} chars")
-        print(f"[DEBUG extract_json] First 200 chars: {json_str[:200]}")
+        print(f"[DEBUG extract_json] Response length: {len(response_text)}, repairs: {result.repairs or 'aucune'}")
+        print(f"[DEBUG extract_json] First 200 chars: {response_text[:200]}")
 
-    # Tentative 1 : Parser tel quel
-    try:
-        result = json.loads(json_str)
-        if debug:
-            print(f"[DEBUG extract_json] ✅ Parsed on attempt 1 (as-is)")
-        return result
-    except json.JSONDecodeError as e:
-        if debug:
-            print(f"[DEBUG extract_json] ❌ Attempt 1 failed: {str(e)[:100]}")
+    if not isinstance(result.value, dict):
+        raise ValueError(f"Le JSON extrait n'est pas un objet ({type(result.value).__name__})")
+    return result.value, result.repairs
 
-    # Tentative 2 : Nettoyer les caractères de contrôle (sauf \n, \r, \t légitimes dans les strings)
-    try:
-        json_str_clean = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', json_str)
-        result = json.loads(json_str_clean)
-        if debug:
-            print(f"[DEBUG extract_json] ✅ Parsed on attempt 2 (remove control chars)")
-        return result
-    except json.JSONDecodeError as e:
-        if debug:
-            print(f"[DEBUG extract_json] ❌ Attempt 2 failed: {str(e)[:100]}")
 
-    # Tentative 3 : Nettoyer les virgules trailing (,] et ,})
-    try:
-        json_str_clean = re.sub(r',\s*([}\]])', r'\1', json_str)
-        json_str_clean = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', json_str_clean)
-        result = json.loads(json_str_clean)
-        if debug:
-            print(f"[DEBUG extract_json] ✅ Parsed on attempt 3 (remove trailing commas)")
-        return result
-    except json.JSONDecodeError as e:
-        if debug:
-            print(f"[DEBUG extract_json] ❌ Attempt 3 failed: {str(e)[:100]}")
-
-    # Tentative 4 : Remplacer les sauts de ligne non échappés dans les strings
-    try:
-        # Protéger les vraies nouvelles lignes échappées (\n)
-        json_str_clean = json_str.replace('\\n', '__NEWLINE__ESCAPED__')
-        json_str_clean = json_str_clean.replace('\\r', '__RETURN__ESCAPED__')
-        json_str_clean = json_str_clean.replace('\\t', '__TAB__ESCAPED__')
-
-        # Supprimer les vraies nouvelles lignes/retours (non échappés dans le JSON brut)
-        json_str_clean = json_str_clean.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-
-        # Restaurer les échappements
-        json_str_clean = json_str_clean.replace('__NEWLINE__ESCAPED__', '\\n')
-        json_str_clean = json_str_clean.replace('__RETURN__ESCAPED__', '\\r')
-        json_str_clean = json_str_clean.replace('__TAB__ESCAPED__', '\\t')
-
-        # Nettoyer virgules et caractères de contrôle
-        json_str_clean = re.sub(r',\s*([}\]])', r'\1', json_str_clean)
-        json_str_clean = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', json_str_clean)
-
-        result = json.loads(json_str_clean)
-        if debug:
-            print(f"[DEBUG extract_json] ✅ Parsed on attempt 4 (replace unescaped newlines)")
-        return result
-    except json.JSONDecodeError as e:
-        if debug:
-            print(f"[DEBUG extract_json] ❌ Attempt 4 failed: {str(e)[:100]}")
-            # Montrer où se trouve l'erreur
-            error_pos = getattr(e, 'pos', None)
-            if error_pos:
-                context_start = max(0, error_pos - 100)
-                context_end = min(len(json_str_clean), error_pos + 100)
-                print(f"[DEBUG extract_json] Error context: ...{json_str_clean[context_start:context_end]}...")
-
-    # Tentative 5 : FALLBACK - Utiliser un petit LLM pour réparer le JSON
-    try:
-        if debug:
-            print(f"[DEBUG extract_json] 🤖 Attempt 5: Fallback LLM repair...")
-        result = repair_json_with_llm(json_str)
-        if debug:
-            print(f"[DEBUG extract_json] ✅ Parsed on attempt 5 (LLM repair)")
-        return result
-    except Exception as e:
-        if debug:
-            print(f"[DEBUG extract_json] ❌ Attempt 5 failed: {str(e)[:100]}")
-
-        # Toutes les tentatives ont échoué
-        raise ValueError(f"Impossible de parser le JSON après tous les nettoyages + LLM repair. Erreur: {str(e)}")
-
-
-def call_model_fast_extraction(system_prompt, messages_history, timeout_seconds=120):
+async def call_model_fast_extraction(system_prompt, messages_history, timeout_seconds=120, max_throttle_retries=3, max_timeout_retries=1, response_format=None, max_tokens=16000):
     """
-    Appelle Mistral Small directement pour les extractions JSON.
+    Appelle Mistral Small directement pour les extractions JSON (client asynchrone).
     Optimisé pour être rapide avec un timeout explicite.
 
+    Le nombre d'appels simultanés est piloté par le limiteur adaptatif du
+    fournisseur : en cas de 429 / 5xx / timeout, la concurrence est réduite et
+    l'appel est retenté après un délai exponentiel. Un timeout n'est retenté
+    que max_timeout_retries fois : chaque tentative peut durer timeout_seconds.
+
     Args:
         system_prompt: Le prompt système
         messages_history: Liste des messages
         timeout_seconds: Timeout en secondes (défaut: 120s = 2min)
+        max_throttle_retries: Nombre de nouvelles tentatives après une surcharge (défaut: 3)
+        max_timeout_retries: Parmi celles-ci, nombre maximal après un timeout (défaut: 1)
+        response_format: Format de sortie imposé (voir json_schema_response_format), optionnel
+        max_tokens: Nombre maximal de tokens de la réponse (défaut: 16000)
 
     Returns:
         Le contenu de la réponse
@@ -850,35 +744,159 @@ def call_model_fast_extraction(system_prompt, messages_history, timeout_seconds=
     total_chars = sum(len(m.get("content", "")) for m in full_messages)
     print(f"         [EXTRACTION] Messages construits: {len(full_messages)} messages, {total_chars:,} chars", flush=True)
 
-    # Créer un client Mistral
-    print(f"         [EXTRACTION] Création client Mistral...", flush=True)
-    client = Mistral(api_key=MISTRAL_API_KEY)
-    print(f"         [EXTRACTION] Client créé, appel API...", flush=True)
+    # Client Mistral partagé (pool de connexions keep-alive)
+    client = get_mistral_client()
+    print(f"         [EXTRACTION] Client prêt, appel API...", flush=True)
     sys.stdout.flush()
     sys.stderr.flush()
 
-    try:
-        response = client.chat.complete(
-            model="mistral-small-2603",  # Modèle rapide pour l'extraction
-            messages=full_messages,
-            temperature=0.0,  # Température = 0 pour JSON déterministe et valide
-            max_tokens=16000  # Augmenté pour éviter la troncature du JSON
-        )
+    limiter = get_limiter("mistral")
+    extra_params = {"response_format": response_format} if response_format else {}
+    timeouts = 0
 
-        elapsed = time.time() - call_start
-        print(f"         └─ ✅ Extraction reçue en {elapsed:.1f}s", flush=True)
-        return response.choices[0].message.content
+    for attempt in range(max_throttle_retries + 1):
+        try:
+            async with limiter.slot():
+                response = await asyncio.wait_for(
+                    client.chat.complete_async(
+                        model=EXTRACTION_MODEL_ID,  # Modèle rapide pour l'extraction
+                        messages=full_messages,
+                        temperature=EXTRACTION_TEMPERATURE,  # Température = 0 pour JSON déterministe et valide
+                        max_tokens=max_tokens,  # 16000 par défaut pour éviter la troncature du JSON
+                        **extra_params
+                    ),
+                    timeout=timeout_seconds
+                )
+
+            elapsed = time.time() - call_start
+            print(f"         └─ ✅ Extraction reçue en {elapsed:.1f}s", flush=True)
+            if response.usage:
+                record_usage(EXTRACTION_MODEL_ID, full_messages, response.usage.prompt_tokens)
+            return response.choices[0].message.content
 
-    except Exception as e:
-        elapsed = time.time() - call_start
-        print(f"         └─ ❌ Erreur après {elapsed:.1f}s: {type(e).__name__}: {str(e)[:200]}", flush=True)
-        raise
+        except Exception as e:
+            elapsed = time.time() - call_start
+            print(f"         └─ ❌ Erreur après {elapsed:.1f}s: {type(e).__name__}: {str(e)[:200]}", flush=True)
+            reason = throttle_reason(e)
+            if reason == "timeout":
+                timeouts += 1
+                if timeouts > max_timeout_retries:
+                    raise
+            if reason and attempt < max_throttle_retries:
+                delay = 2 ** (attempt + 1)
+                print(f"         └─ ⏳ Surcharge ({reason}) - nouvelle tentative dans {delay}s (concurrence: {int(limiter.limit)})", flush=True)
+                await asyncio.sleep(delay)
+                continue
+            raise
+
+
+def invalid_fragment_paths(errors):
+    """
+    Regroupe les erreurs de schéma par fragment à corriger : chaque section
+    fautive est corrigée séparément ; les champs de premier niveau (hors
+    sections) forment un fragment à part.
+
+    Returns:
+        dict chemin du fragment → liste des erreurs (chemins relatifs au fragment)
+    """
+    fragments = {}
+    for error in errors:
+        if len(error.path) >= 2 and error.path[0] == "sections":
+            fragment_path = error.path[:2]
+        else:
+            fragment_path = ()
+        fragments.setdefault(fragment_path, []).append(error)
+    return fragments
 
 
-def extract_packet_parallel(packet, packet_index, extraction_system_prompt, log_fn, max_retries=1):
+def extraction_response_format():
+    """Format de réponse imposé aux extractions et fusions (None hors sorties structurées)."""
+    if not STRUCTURED_EXTRACTION:
+        return None
+    return json_schema_response_format("packet_extraction", EXTRACTION_JSON_SCHEMA)
+
+
+async def repair_invalid_fragments(extracted_json, log_fn, label):
+    """
+    Valide une extraction contre EXTRACTION_JSON_SCHEMA et fait corriger par le
+    modèle les seuls fragments invalides (une section, ou les champs de premier
+    niveau), en parallèle, au lieu de ré-extraire tout le paquet.
+
+    Args:
+        extracted_json: JSON extrait du paquet (modifié en place)
+        log_fn: Fonction de logging
+        label: Extraction corrigée, pour les logs ("PAQUET 3", "FUSION N1.2")
+
+    Returns:
+        tuple: (JSON extrait, fragments corrigés ; écarts au schéma restants,
+        liste vide si l'extraction est conforme)
+
+    Raises:
+        ValueError: si la liste des sections est absente ou invalide (le
+            paquet doit alors être ré-extrait)
+    """
+    errors = validate(extracted_json, EXTRACTION_JSON_SCHEMA)
+    if not errors:
+        return extracted_json, []
+    if any(error.path in (("sections",), ()) for error in errors):
+        raise ValueError(f"Extraction non conforme au schéma: {errors[0]}")
+
+    fragments = invalid_fragment_paths(errors)
+    log_fn(f"         └─ 🩹 {label} - {len(errors)} écart(s) au schéma, "
+           f"{len(fragments)} fragment(s) à corriger: {', '.join(str(e) for e in errors[:3])}")
+
+    async def repair_one(fragment_path, fragment_errors):
+        schema = subschema_at(EXTRACTION_JSON_SCHEMA, fragment_path)
+        fragment = get_at(extracted_json, fragment_path)
+        if not fragment_path:
+            # Champs de premier niveau : les sections (valides) ne sont pas renvoyées
+            fragment = {key: value for key, value in fragment.items() if key != "sections"}
+            properties = {key: value for key, value in schema["properties"].items() if key != "sections"}
+            schema = {**schema, "properties": properties, "required": list(properties)}
+        relative_errors = [str(SchemaError(error.path[len(fragment_path):], error.message)) for error in fragment_errors]
+
+        try:
+            response = await call_model_fast_extraction(
+                "Vous corrigez des fragments JSON pour qu'ils respectent un JSON Schema. Retournez uniquement le JSON corrigé.",
+                [{"role": "user", "content": build_fragment_repair_prompt(fragment, relative_errors)}],
+                response_format=json_schema_response_format("fragment", schema),
+                max_tokens=4000,
+            )
+            repaired, repairs = extract_json_from_response(response)
+        except Exception as e:
+            # Le fragment d'origine est conservé : le reste de l'extraction reste exploitable
+            log_fn(f"         └─ ⚠️ Correction du fragment {fragment_errors[0].location} impossible: {str(e)[:120]}")
+            return fragment_path, get_at(extracted_json, fragment_path), fragment_errors
+        remaining = [SchemaError(fragment_path + error.path, error.message) for error in validate(repaired, schema)]
+        if REPAIR_TRUNCATED in repairs:
+            remaining.append(SchemaError(fragment_path, "fragment tronqué"))
+        if remaining:
+            log_fn(f"         └─ ⚠️ Fragment {fragment_errors[0].location} encore non conforme: {remaining[0]}")
+        if not fragment_path:
+            repaired["sections"] = extracted_json.get("sections", [])
+        return fragment_path, repaired, remaining
+
+    results = await asyncio.gather(*(repair_one(path, errs) for path, errs in fragments.items()))
+    remaining_errors = []
+    for fragment_path, repaired, remaining in results:
+        extracted_json = set_at(extracted_json, fragment_path, repaired)
+        remaining_errors.extend(remaining)
+    nb_fixed = sum(1 for _path, _repaired, remaining in results if not remaining)
+    log_fn(f"         └─ ✅ {label} - {nb_fixed}/{len(results)} fragment(s) corrigé(s)")
+    return extracted_json, remaining_errors
+
+
+async def extract_packet_parallel(packet, packet_index, extraction_system_prompt, log_fn, max_retries=1, on_packet_done=None):
     """
-    Extrait un paquet en appelant l'API Mistral (thread-safe).
-    En cas d'erreur de parsing JSON, réessaie une fois avec un prompt plus strict.
+    Extrait un paquet en appelant l'API Mistral (coroutine, exécutée sur la boucle partagée).
+    En mode sorties structurées (STRUCTURED_EXTRACTION), le JSON Schema de
+    l'extraction est imposé au modèle et seuls les fragments non conformes sont
+    renvoyés pour correction. Si la réponse reste inexploitable (pas de JSON,
+    pas de sections), réessaie une fois avec un prompt plus strict.
+
+    Une extraction dégradée (réponse tronquée complétée localement, fragments
+    encore non conformes au schéma) est utilisée pour ce tour mais n'est ni
+    mise en cache ni enregistrée comme point de reprise : elle sera ré-extraite.
 
     Args:
         packet: Le paquet à extraire
@@ -886,6 +904,8 @@ def extract_packet_parallel(packet, packet_index, extraction_system_prompt, log_
         extraction_system_prompt: Le prompt système d'extraction
         log_fn: Fonction de logging (thread-safe)
         max_retries: Nombre de tentatives en cas d'erreur JSON (défaut: 1)
+        on_packet_done: Fonction optionnelle (packet_index, packet, extracted_json)
+            appelée pour une extraction complète et conforme (point de reprise)
 
     Returns:
         tuple: (packet_index, packet, extracted_json, error)
@@ -897,6 +917,20 @@ def extract_packet_parallel(packet, packet_index, extraction_system_prompt, log_
     prompt_tokens = approx_tokens_simple(extraction_user_prompt)
     log_fn(f"         └─ Tokens prompt total: ~{prompt_tokens:,}")
 
+    # Cache disque : un paquet identique (même modèle, mêmes prompts) n'est pas ré-extrait
+    cache = get_extraction_cache()
+    cache_key = make_cache_key(
+        EXTRACTION_MODEL_ID, EXTRACTION_TEMPERATURE, extraction_system_prompt, extraction_user_prompt,
+        response_format=extraction_response_format(),
+    )
+    # Lecture / écriture SQLite hors de la boucle partagée
+    cached_json = await asyncio.to_thread(cache.get, cache_key)
+    if cached_json is not None:
+        log_fn(f"         └─ ♻️ Extraction trouvée dans le cache ({len(cached_json.get('sections', []))} sections)")
+        if on_packet_done:
+            on_packet_done(packet_index, packet, cached_json)
+        return (packet_index, packet, cached_json, None)
+
     # Boucle de retry
     last_response = None  # Pour stocker la dernière réponse brute
     for attempt in range(max_retries + 1):
@@ -921,14 +955,23 @@ VOUS DEVEZ ABSOLUMENT :
                 log_fn(f"         └─ 📡 Envoi requête API (Mistral Small)...")
                 messages = [{"role": "user", "content": extraction_user_prompt}]
 
-            response = call_model_fast_extraction(extraction_system_prompt, messages)
+            response = await call_model_fast_extraction(
+                extraction_system_prompt,
+                messages,
+                response_format=extraction_response_format(),
+            )
             last_response = response  # Sauvegarder pour debug
 
             response_tokens = approx_tokens_simple(response)
             log_fn(f"         └─ 📥 Réponse reçue: ~{response_tokens:,} tokens")
 
             # Parser le JSON de la réponse (avec debug activé si on est en retry)
-            extracted_json = extract_json_from_response(response, debug=(attempt > 0))
+            # Réparation locale (sans appel réseau) : exécutée directement sur la boucle
+            extracted_json, repairs = extract_json_from_response(response, debug=(attempt > 0))
+            degraded = ["réponse tronquée"] if REPAIR_TRUNCATED in repairs else []
+            if STRUCTURED_EXTRACTION:
+                extracted_json, remaining_errors = await repair_invalid_fragments(extracted_json, log_fn, f"PAQUET {packet_index+1}")
+                degraded += [str(error) for error in remaining_errors]
             nb_sections_extracted = len(extracted_json.get("sections", []))
 
             if attempt > 0:
@@ -936,6 +979,12 @@ VOUS DEVEZ ABSOLUMENT :
             else:
                 log_fn(f"         └─ ✅ JSON parsé: {nb_sections_extracted} sections extraites")
 
+            if degraded:
+                log_fn(f"         └─ ⚠️ Extraction dégradée ({'; '.join(degraded[:3])}) : ni mise en cache ni point de reprise")
+            else:
+                await asyncio.to_thread(cache.put, cache_key, extracted_json)
+                if on_packet_done:
+                    on_packet_done(packet_index, packet, extracted_json)
             return (packet_index, packet, extracted_json, None)
 
         except (json.JSONDecodeError, ValueError) as e:
@@ -1021,7 +1070,152 @@ VOUS DEVEZ ABSOLUMENT :
     return (packet_index, packet, None, "Erreur inconnue")
 
 
-def call_model_with_compression(model_choice, user_query, prompt_type="resume_conclusions", progress_callback=None):
+async def extract_packets_async(packets, extraction_system_prompt, log_fn, report_progress, done_results=None, on_packet_done=None):
+    """
+    Lance l'extraction de tous les paquets en parallèle sur la boucle partagée.
+    Le nombre d'appels simultanés est piloté par le limiteur adaptatif du
+    fournisseur (voir call_model_fast_extraction), partagé entre toutes les sessions.
+
+    Args:
+        packets: Liste des paquets à extraire
+        extraction_system_prompt: Le prompt système d'extraction
+        log_fn: Fonction de logging
+        report_progress: Fonction recevant les messages de progression
+        done_results: dict optionnel packet_index → JSON déjà extrait (reprise) ;
+            ces paquets ne sont pas ré-extraits
+        on_packet_done: Fonction optionnelle (packet_index, packet, extracted_json)
+            appelée dès qu'un paquet est extrait avec succès (extraction
+            complète et conforme, voir extract_packet_parallel)
+
+    Returns:
+        list: Tuples (packet_index, packet, extracted_json, error) dans l'ordre des paquets
+    """
+    done_results = done_results or {}
+    nb_packets = len(packets)
+    completed_count = len(done_results)
+
+    async def extract_one(packet_index, packet):
+        nonlocal completed_count
+        if packet_index in done_results:
+            return (packet_index, packet, done_results[packet_index], None)
+        result = await extract_packet_parallel(
+            packet, packet_index, extraction_system_prompt, log_fn, on_packet_done=on_packet_done
+        )
+        completed_count += 1
+        report_progress(f"Extraction : {completed_count}/{nb_packets} paquets traités")
+        return result
+
+    log_fn(f"   🚀 {nb_packets - len(done_results)} paquets soumis pour extraction parallèle")
+    results = await asyncio.gather(*(extract_one(i, packet) for i, packet in enumerate(packets)))
+    return list(results)
+
+
+def final_reduce_budget(model_choice, final_system_prompt, token_counter):
+    """Tokens disponibles pour les données intermédiaires dans le prompt final du modèle choisi."""
+    overhead = token_counter.count(final_system_prompt) + token_counter.count(build_final_user_prompt([], serialization=FINAL_PROMPT_SERIALIZATION))
+    return MODEL_TOKEN_LIMITS.get(model_choice, 32000) - overhead - FINAL_OUTPUT_RESERVE_TOKENS
+
+
+async def merge_extractions(group_jsons, target_tokens, log_fn, merge_label):
+    """
+    Fusionne un groupe d'extractions consécutives en une seule (modèle d'extraction,
+    même JSON Schema que les paquets).
+
+    Returns:
+        tuple: (JSON fusionné ou None, erreur)
+    """
+    try:
+        response = await call_model_fast_extraction(
+            build_merge_system_prompt(),
+            [{"role": "user", "content": build_merge_user_prompt(group_jsons, target_tokens, FINAL_PROMPT_SERIALIZATION)}],
+            response_format=extraction_response_format(),
+        )
+        merged, _repairs = extract_json_from_response(response)
+        if STRUCTURED_EXTRACTION:
+            merged, _remaining_errors = await repair_invalid_fragments(merged, log_fn, f"FUSION {merge_label}")
+        if not merged.get("sections"):
+            raise ValueError("Fusion sans sections")
+    except Exception as e:
+        log_fn(f"      └─ ⚠️ Fusion {merge_label} impossible: {str(e)[:120]}")
+        return None, str(e)
+    merged["packet_id"] = "+".join(str(packet_json.get("packet_id", "?")) for packet_json in group_jsons)
+    return merged, None
+
+
+async def tree_reduce_async(extracted_jsons, budget_tokens, token_counter, log_fn, report_progress):
+    """
+    Réduction hiérarchique : tant que les données intermédiaires dépassent le
+    budget du prompt final, les extractions consécutives sont regroupées
+    (MERGE_GROUP_TOKENS par groupe) et fusionnées en parallèle, niveau par niveau.
+    Un groupe dont la fusion échoue est conservé tel quel.
+
+    Args:
+        extracted_jsons: JSON intermédiaires des paquets (dans l'ordre)
+        budget_tokens: Tokens disponibles pour les données du prompt final
+        token_counter: Compteur de tokens
+        log_fn: Fonction de logging
+        report_progress: Fonction recevant les messages de progression
+
+    Returns:
+        tuple: (JSON réduits, comptabilité par niveau)
+    """
+    import time
+
+    def size_of(packet_jsons):
+        return token_counter.count(serialize_extracted_jsons(packet_jsons, FINAL_PROMPT_SERIALIZATION))
+
+    current = [packet_json for packet_json in extracted_jsons if "error" not in packet_json]
+    errors = [packet_json for packet_json in extracted_jsons if "error" in packet_json]
+    levels = []
+    tokens_in = size_of(current)
+
+    while tokens_in > budget_tokens and len(levels) < MAX_REDUCE_LEVELS:
+        level = len(levels) + 1
+        level_start = time.time()
+        sizes = [size_of([packet_json]) for packet_json in current]
+        groups = group_for_merge(sizes, MERGE_GROUP_TOKENS)
+        # Part du budget final allouée à chaque groupe, plafonnée par la sortie du modèle
+        targets = [min(MERGE_OUTPUT_TOKENS, max(1000, sum(sizes[i] for i in group) * budget_tokens // tokens_in)) for group in groups]
+        log_fn(f"   🌳 Niveau {level}: {len(current)} extraction(s), ~{tokens_in:,} tokens > budget {budget_tokens:,} "
+               f"→ {len(groups)} fusion(s) en parallèle")
+        report_progress(f"Réduction hiérarchique, niveau {level} : {len(groups)} fusion(s)...")
+
+        merged = await asyncio.gather(*(
+            merge_extractions([current[i] for i in group], target, log_fn, f"N{level}.{g + 1}")
+            for g, (group, target) in enumerate(zip(groups, targets))
+        ))
+        reduced = []
+        failed_merges = 0
+        for group, (merged_json, error) in zip(groups, merged):
+            if error:
+                failed_merges += 1
+                reduced.extend(current[i] for i in group)
+            else:
+                reduced.append(merged_json)
+
+        tokens_out = size_of(reduced)
+        levels.append({
+            "level": level,
+            "inputs": len(current),
+            "merges": len(groups),
+            "failed_merges": failed_merges,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "elapsed_s": round(time.time() - level_start, 1),
+        })
+        log_fn(f"      └─ ✅ Niveau {level}: ~{tokens_in:,} → ~{tokens_out:,} tokens ({len(reduced)} extraction(s))")
+        if tokens_out >= tokens_in:
+            log_fn(f"      └─ ⚠️ Aucun gain au niveau {level} : arrêt de la réduction")
+            break
+        current, tokens_in = reduced, tokens_out
+
+    if tokens_in > budget_tokens:
+        log_fn(f"   ⚠️ Données intermédiaires encore au-dessus du budget (~{tokens_in:,} > {budget_tokens:,} tokens)")
+    # Les paquets en échec restent signalés au modèle de synthèse
+    return current + errors, levels
+
+
+def call_model_with_compression(model_choice, user_query, prompt_type="resume_conclusions", progress_callback=None, stream_final=False, debug_sink=None, resume_previous_run=False):
     """
     Pipeline de compression pour les documents longs.
 
@@ -1029,23 +1223,37 @@ def call_model_with_compression(model_choice, user_query, prompt_type="resume_co
     1. Parser le document en sections
     2. Découper en paquets
     3. Pour chaque paquet, extraire un JSON intermédiaire via LLM
-    4. Générer le résumé final à partir des JSON intermédiaires
+    4. Si ces JSON dépassent le contexte du modèle de synthèse, les fusionner
+       par groupes, niveau par niveau (réduction hiérarchique)
+    5. Générer le résumé final à partir des JSON intermédiaires
 
     Args:
         model_choice: Le modèle LLM à utiliser
         user_query: Le document source (conclusions)
         prompt_type: Type de prompt de synthèse ("resume_conclusions" ou "rapport_synthese")
         progress_callback: Fonction optionnelle pour afficher la progression
+        stream_final: Si True, le résumé final est retourné en flux (ChatStream,
+            à afficher avec st.write_stream) et n'est généré qu'à l'affichage
+        debug_sink: Voir record_response_debug (étape de synthèse finale)
+        resume_previous_run: Si True et qu'une exécution précédente du même
+            document n'a pas abouti, ses paquets déjà extraits sont repris
+            (seuls les paquets manquants ou en échec sont ré-extraits)
 
     Returns:
         dict avec les clés:
         - "nb_sections": nombre de sections détectées
         - "nb_packets": nombre de paquets créés
         - "extracted_jsons": liste des JSON intermédiaires
-        - "final_response": le résumé final
+        - "run_id": identifiant de l'exécution (points de reprise)
+        - "failed_packets": identifiants des paquets en échec
+        - "resumed_packets": nombre de paquets repris d'une exécution précédente
+        - "final_response": le résumé final (ChatStream si stream_final)
         - "tokens_original": nombre de tokens du document original
         - "tokens_compressed": nombre de tokens après compression
         - "compression_ratio": ratio de compression
+        - "reduce_budget_tokens": tokens disponibles pour les données du prompt final
+        - "reduce_levels": comptabilité par niveau de la réduction hiérarchique
+          (vide si les données tenaient dans le budget)
     """
     import time
     import sys
@@ -1070,16 +1278,32 @@ def call_model_with_compression(model_choice, user_query, prompt_type="resume_co
     if progress_callback:
         progress_callback(f"Analyse du document ({tokens_original:,} tokens)...")
 
-    nodes, packets = parse_and_packetize(
+    # Points de reprise : chaque paquet extrait est enregistré dès qu'il est obtenu
+    checkpoints = get_checkpoint_store()
+    doc_hash = document_hash(user_query)
+    previous_run = checkpoints.latest_resumable_run(doc_hash) if resume_previous_run else None
+
+    # Tokens comptés pour le modèle d'extraction, qui reçoit les paquets. Une
+    # reprise redécoupe avec le compteur de l'exécution interrompue ; sinon le
+    # ratio calibré est figé pour ce document (mêmes paquets d'un appel à l'autre)
+    token_counter = counter_from_name(previous_run.counter_name) if previous_run else None
+    token_counter = token_counter or get_token_counter(EXTRACTION_MODEL_ID, document_key=doc_hash)
+    log(f"   ℹ️  Comptage des tokens: {token_counter.name}")
+
+    nodes, packets, parse_cached = cached_parse_and_packetize(
         user_query,
         max_input_tokens=42000,  # Même config que le notebook
         prompt_budget_tokens=2500,
         output_budget_tokens=3000,
+        packing_mode="optimal",  # Moins de paquets, tailles équilibrées
+        token_counter=token_counter,
     )
 
     nb_sections = len(nodes)
     nb_packets = len(packets)
 
+    if parse_cached:
+        log(f"   ♻️  Parsing réutilisé depuis le cache ({get_parse_cache().stats()})")
     log(f"   ✅ Parsing terminé: {nb_sections} sections détectées")
     for node in nodes:
         log(f"      • {node.id}: {node.title[:50]}{'...' if len(node.title) > 50 else ''} ({node.section_type}, ~{node.approx_tokens} tokens)")
@@ -1092,59 +1316,91 @@ def call_model_with_compression(model_choice, user_query, prompt_type="resume_co
 
     # Étape 3 : Extraire un JSON intermédiaire pour chaque paquet (EN PARALLÈLE)
     # On utilise Mistral Small pour l'extraction (plus rapide, suffisant pour le JSON)
-    log(f"📊 ÉTAPE 2/3 - Extraction LLM ({nb_packets} paquets) - MODE PARALLÈLE (2 workers)")
+    log(f"📊 ÉTAPE 2/3 - Extraction LLM ({nb_packets} paquets) - MODE PARALLÈLE (asyncio)")
     log(f"   ℹ️  Modèle d'extraction: Mistral Small (rapide)")
     extraction_system_prompt = build_extraction_system_prompt()
 
-    # Dictionnaire pour conserver l'ordre des paquets
-    extracted_jsons_dict = {}
-    max_workers = 2  # Traiter 2 paquets simultanément
-
-    # Lock pour les callbacks progress thread-safe
-    progress_lock = threading.Lock()
-
-    # Utiliser ThreadPoolExecutor pour traiter les paquets en parallèle
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Soumettre tous les paquets
-        future_to_packet = {
-            executor.submit(extract_packet_parallel, packet, i, extraction_system_prompt, log): (i, packet)
-            for i, packet in enumerate(packets)
-        }
-
-        log(f"   🚀 {len(future_to_packet)} paquets soumis pour extraction parallèle")
-
-        # Récupérer les résultats au fur et à mesure
-        completed_count = 0
-        for future in as_completed(future_to_packet):
-            packet_index, packet, extracted_json, error = future.result()
-            completed_count += 1
-
-            # Callback progress (thread-safe)
-            with progress_lock:
-                if progress_callback:
-                    progress_callback(f"Extraction : {completed_count}/{nb_packets} paquets traités")
+    packet_keys = [
+        make_cache_key(
+            EXTRACTION_MODEL_ID, EXTRACTION_TEMPERATURE, extraction_system_prompt, build_extraction_user_prompt(packet),
+            response_format=extraction_response_format(),
+        )
+        for packet in packets
+    ]
+    done_results = {}
+    if previous_run:
+        run_id = previous_run.run_id
+        saved = checkpoints.load_packets(run_id)
+        for i, packet in enumerate(packets):
+            checkpoint = saved.get(packet.id)
+            # Un paquet dont le contenu a changé (nouveau découpage) est ré-extrait
+            if checkpoint and checkpoint["packet_key"] == packet_keys[i]:
+                done_results[i] = checkpoint["result"]
+        checkpoints.resume_run(run_id, nb_packets)
+        log(f"   ♻️  Reprise de l'exécution {run_id}: {len(done_results)}/{nb_packets} paquets déjà extraits")
+        if progress_callback:
+            progress_callback(f"Reprise de l'exécution précédente : {len(done_results)}/{nb_packets} paquet(s) déjà extrait(s)")
+    else:
+        run_id = checkpoints.start_run(doc_hash, nb_packets, counter_name=token_counter.name)
+        log(f"   ℹ️  Exécution {run_id} (points de reprise activés)")
+
+    def save_checkpoint(packet_index, packet, extracted_json):
+        checkpoints.save_packet(run_id, packet.id, packet_keys[packet_index], extracted_json)
+
+    # Compteurs du cache partagé au début de l'extraction (statistiques de cette exécution)
+    cache_stats_start = get_extraction_cache().stats()
+
+    # Résultats indexés par position pour conserver l'ordre des paquets
+    try:
+        results = run_blocking(
+            lambda report: extract_packets_async(
+                packets, extraction_system_prompt, log, report,
+                done_results=done_results,
+                on_packet_done=save_checkpoint,
+            ),
+            progress_callback=progress_callback
+        )
+    except Exception:
+        checkpoints.set_status(run_id, RUN_INCOMPLETE)
+        raise
 
-            # Stocker le résultat dans le dictionnaire (avec ou sans erreur)
-            if error:
-                # Si erreur, extracted_json contient déjà le dict d'erreur avec raw_response_sample
-                if isinstance(extracted_json, dict):
-                    extracted_jsons_dict[packet_index] = extracted_json
-                else:
-                    # Fallback si le format n'est pas correct
-                    extracted_jsons_dict[packet_index] = {
-                        "packet_id": packet.id,
-                        "error": f"Erreur: {error}",
-                        "raw_response": ""
-                    }
-            else:
+    extracted_jsons_dict = {}
+    for packet_index, packet, extracted_json, error in results:
+        # Stocker le résultat dans le dictionnaire (avec ou sans erreur)
+        if error:
+            # Si erreur, extracted_json contient déjà le dict d'erreur avec raw_response_sample
+            if isinstance(extracted_json, dict):
                 extracted_jsons_dict[packet_index] = extracted_json
+            else:
+                # Fallback si le format n'est pas correct
+                extracted_jsons_dict[packet_index] = {
+                    "packet_id": packet.id,
+                    "error": f"Erreur: {error}",
+                    "raw_response": ""
+                }
+        else:
+            extracted_jsons_dict[packet_index] = extracted_json
 
     # Reconstituer la liste dans l'ordre original
     extracted_jsons = [extracted_jsons_dict[i] for i in range(nb_packets)]
+    failed_packets = [packet.id for _, packet, _, error in results if error]
     log(f"   ✅ Extraction parallèle terminée: {len(extracted_jsons)} paquets traités")
+    if failed_packets:
+        # L'exécution reste reprenable : seuls ces paquets seront ré-extraits
+        log(f"   ⚠️  {len(failed_packets)} paquet(s) en échec: {', '.join(failed_packets)}")
+
+    concurrency_metrics = get_limiter("mistral").metrics()
+    log(f"   └─ Concurrence d'extraction: {concurrency_metrics['concurrency_limit']} appels simultanés, "
+        f"{concurrency_metrics['throttle_events']} surcharge(s) observée(s)")
+
+    cache_stats = get_extraction_cache().stats()
+    cache_stats["run_hits"] = cache_stats["hits"] - cache_stats_start["hits"]
+    cache_stats["run_misses"] = cache_stats["misses"] - cache_stats_start["misses"]
+    log(f"   └─ Cache d'extraction: {cache_stats['run_hits']} hit(s) / {cache_stats['run_misses']} miss(es) "
+        f"({cache_stats['entries']} entrées, {cache_stats['size_bytes'] / 1e6:.1f} Mo)")
 
     # Calculer les tokens du contenu compressé
-    tokens_compressed = compute_compressed_tokens(extracted_jsons)
+    tokens_compressed = compute_compressed_tokens(extracted_jsons, token_counter=token_counter)
     compression_ratio = round((1 - tokens_compressed / tokens_original) * 100, 1) if tokens_original > 0 else 0
 
     log(f"📊 RÉSULTAT COMPRESSION INTERMÉDIAIRE")
@@ -1152,6 +1408,13 @@ def call_model_with_compression(model_choice, user_query, prompt_type="resume_co
     log(f"   └─ Tokens compressé: {tokens_compressed:,}")
     log(f"   └─ Ratio de compression: {compression_ratio}%")
 
+    # Compaction des données intermédiaires envoyées au modèle de synthèse
+    final_prompt_savings = compute_serialization_savings(
+        extracted_jsons, FINAL_PROMPT_SERIALIZATION, token_counter=token_counter
+    )
+    log(f"   └─ Données du prompt final ({FINAL_PROMPT_SERIALIZATION}): {final_prompt_savings['tokens_before']:,} → "
+        f"{final_prompt_savings['tokens_after']:,} tokens (-{final_prompt_savings['saved_pct']}%)")
+
     if progress_callback:
         progress_callback(f"Compression : {tokens_original:,} → {tokens_compressed:,} tokens ({compression_ratio}% de réduction)")
 
@@ -1163,10 +1426,23 @@ def call_model_with_compression(model_choice, user_query, prompt_type="resume_co
         progress_callback("Génération du résumé final...")
 
     final_system_prompt = build_final_system_prompt(prompt_type)
+
+    # Réduction hiérarchique si les données intermédiaires dépassent le contexte du modèle de synthèse
+    reduce_budget_tokens = final_reduce_budget(model_choice, final_system_prompt, token_counter)
+    final_jsons, reduce_levels = extracted_jsons, []
+    if TREE_REDUCE and final_prompt_savings["tokens_after"] > reduce_budget_tokens:
+        log(f"   🌳 Données intermédiaires (~{final_prompt_savings['tokens_after']:,} tokens) au-delà du budget "
+            f"de {model_choice} ({reduce_budget_tokens:,} tokens) : réduction hiérarchique")
+        final_jsons, reduce_levels = run_blocking(
+            lambda report: tree_reduce_async(extracted_jsons, reduce_budget_tokens, token_counter, log, report),
+            progress_callback=progress_callback
+        )
+
     final_user_prompt = build_final_user_prompt(
-        extracted_jsons,
+        final_jsons,
         mode="resume_global",
-        max_pages_hint=5
+        max_pages_hint=5,
+        serialization=FINAL_PROMPT_SERIALIZATION
     )
 
     final_prompt_tokens = approx_tokens_simple(final_user_prompt)
@@ -1174,29 +1450,409 @@ def call_model_with_compression(model_choice, user_query, prompt_type="resume_co
     log(f"   └─ 📡 Envoi requête API finale ({model_choice})...")
 
     messages = [{"role": "user", "content": final_user_prompt}]
-    final_response = call_model(model_choice, final_system_prompt, messages)
 
-    final_response_tokens = approx_tokens_simple(final_response)
-    log(f"   └─ 📥 Réponse finale reçue: ~{final_response_tokens:,} tokens")
-
-    print("\n" + "="*60, flush=True)
-    log(f"✅ PIPELINE TERMINÉ")
-    log(f"   📄 {tokens_original:,} tokens → 📦 {tokens_compressed:,} tokens → 📝 {final_response_tokens:,} tokens")
-    print("="*60 + "\n", flush=True)
+    def log_final(final_text):
+        checkpoints.set_status(run_id, RUN_INCOMPLETE if failed_packets else RUN_COMPLETED)
+        final_response_tokens = approx_tokens_simple(final_text)
+        log(f"   └─ 📥 Réponse finale reçue: ~{final_response_tokens:,} tokens")
+
+        print("\n" + "="*60, flush=True)
+        log(f"✅ PIPELINE TERMINÉ")
+        log(f"   📄 {tokens_original:,} tokens → 📦 {tokens_compressed:,} tokens → 📝 {final_response_tokens:,} tokens")
+        print("="*60 + "\n", flush=True)
+
+    # Tant que la synthèse n'a pas abouti, l'exécution reste reprenable
+    checkpoints.set_status(run_id, RUN_INCOMPLETE)
+    if stream_final:
+        final_response = call_model(model_choice, final_system_prompt, messages, stream=True, debug_sink=debug_sink)
+        final_response.on_complete(lambda done: log_final(done.text))
+    else:
+        final_response = call_model(model_choice, final_system_prompt, messages, debug_sink=debug_sink)
+        log_final(final_response)
 
     return {
         "nb_sections": nb_sections,
         "nb_packets": nb_packets,
         "extracted_jsons": extracted_jsons,
+        "run_id": run_id,
+        "failed_packets": failed_packets,
+        "resumed_packets": len(done_results),
         "final_system_prompt": final_system_prompt,  # Prompt système (instructions détaillées)
         "final_user_prompt": final_user_prompt,  # Prompt user (JSON + consigne courte)
         "final_response": final_response,
         "tokens_original": tokens_original,
         "tokens_compressed": tokens_compressed,
-        "compression_ratio": compression_ratio
+        "compression_ratio": compression_ratio,
+        "final_prompt_savings": final_prompt_savings,
+        "reduce_budget_tokens": reduce_budget_tokens,
+        "reduce_levels": reduce_levels,
+        "concurrency_metrics": concurrency_metrics,
+        "extraction_cache": cache_stats
     }
 
 
+# Paramètres du pipeline de compression simplifiée
+SIMPLE_COMPRESSION_SETTINGS = {
+    "final_model": "mistral-large-latest",
+    "final_prompt": "resume_conclusions",
+    "threshold_tokens": 7000,
+    "reduction_pct": 20.0,
+}
+
+
+def build_simple_compression_info(intermediary_data):
+    """Infos de compression simplifiée conservées avec le message assistant."""
+    tokens_original = intermediary_data["tokens_original"]
+    tokens_reconstitue = intermediary_data["tokens_reconstitue"]
+    reduction_pct = round((1 - tokens_reconstitue / tokens_original) * 100, 1) if tokens_original > 0 else 0
+    return {
+        "type": "simple",
+        "nb_reductions": len(intermediary_data["sous_sections_reduites"]),
+        "sous_sections_reduites": intermediary_data["sous_sections_reduites"],
+        "document_reconstitue": intermediary_data["document_reconstitue"],
+        "tokens_original": tokens_original,
+        "tokens_reconstitue": tokens_reconstitue,
+        "tokens_final": intermediary_data["tokens_final"],
+        "reduction_pct": reduction_pct
+    }
+
+
+def build_standard_compression_info(result):
+    """Infos de compression par paquets conservées avec le message assistant."""
+    return {
+        "type": "standard",
+        "nb_sections": result["nb_sections"],
+        "nb_packets": result["nb_packets"],
+        "extracted_jsons": result["extracted_jsons"],
+        "final_user_prompt": result["final_user_prompt"],
+        "tokens_original": result["tokens_original"],
+        "tokens_compressed": result["tokens_compressed"],
+        "compression_ratio": result["compression_ratio"],
+        "final_prompt_savings": result["final_prompt_savings"],
+        "reduce_levels": result["reduce_levels"],
+        "concurrency_metrics": result["concurrency_metrics"]
+    }
+
+
+def reduce_levels_line(levels):
+    """Ligne de résumé de la réduction hiérarchique (vide si elle n'a pas eu lieu)."""
+    if not levels:
+        return ""
+    tokens = " → ".join(f"{tokens:,}" for tokens in [levels[0]["tokens_in"]] + [level["tokens_out"] for level in levels])
+    merges = sum(level["merges"] for level in levels)
+    return f"\n\n🌳 **Réduction hiérarchique** : {tokens} tokens ({len(levels)} niveau(x), {merges} fusion(s))"
+
+
+def pop_debug_info(source):
+    """Retire et retourne les infos debug (finish_reason, usage) déposées par call_model."""
+    if "debug_finish_reason" not in source:
+        return None
+    return {
+        "finish_reason": source.pop("debug_finish_reason"),
+        "usage": source.pop("debug_usage", "")
+    }
+
+
+def compression_prompt_type_for(prompt_choice):
+    """Type de prompt de synthèse du pipeline par paquets."""
+    if "Rapport de synthèse" in prompt_choice:
+        return "rapport_synthese"
+    return "resume_conclusions"
+
+
+def run_pipeline_job(params, report):
+    """
+    Handler des jobs d'arrière-plan : exécute le pipeline demandé (sans appel
+    à l'API Streamlit) et retourne la réponse, les infos de compression et
+    les infos debug.
+    """
+    debug = {}
+    compression_info = None
+
+    if params["mode"] == "simple":
+        mistral_api_key = os.getenv("MISTRAL_API_KEY")
+        if not mistral_api_key:
+            raise ValueError("MISTRAL_API_KEY non trouvée dans .env")
+        response_text, intermediary_data = simple_compression_pipeline(
+            document=params["user_query"],
+            api_key=mistral_api_key,
+            progress_callback=report,
+            **SIMPLE_COMPRESSION_SETTINGS
+        )
+        compression_info = build_simple_compression_info(intermediary_data)
+    elif params["mode"] == "standard":
+        result = call_model_with_compression(
+            params["model_choice"],
+            params["user_query"],
+            prompt_type=params["compression_prompt_type"],
+            progress_callback=report,
+            debug_sink=debug,
+            resume_previous_run=params.get("resume", False)
+        )
+        compression_info = build_standard_compression_info(result)
+        response_text = result["final_response"]
+    else:
+        report("Génération de la réponse...")
+        response_text = call_model(
+            params["model_choice"],
+            params["system_prompt"],
+            params["messages"],
+            debug_sink=debug
+        )
+
+    # L'évaluation éventuelle est soumise à la file à la récupération du résultat (collect_finished_job)
+    return {
+        "response_text": response_text,
+        "compression_info": compression_info,
+        "debug_info": pop_debug_info(debug),
+    }
+
+
+def remember_resumable_run(user_query):
+    """Propose la reprise si la dernière exécution par paquets du document n'a pas abouti."""
+    run = get_checkpoint_store().latest_resumable_run(document_hash(user_query))
+    if run is None:
+        st.session_state.resumable_run = None
+        return
+    st.session_state.resumable_run = {
+        "user_query": user_query,
+        "nb_done": run.nb_done,
+        "nb_packets": run.nb_packets,
+    }
+
+
+def collect_finished_job():
+    """
+    Intègre le résultat du job en cours de la session s'il est terminé
+    (réponse, compression_info, debug_info) et soumet son évaluation si demandée.
+
+    Returns:
+        Le job encore en cours, ou None
+    """
+    job_id = st.session_state.pending_job
+    if not job_id:
+        return None
+    job = get_job_runner().get(job_id)
+    if job is not None and not job.finished:
+        return job
+
+    st.session_state.pending_job = None
+    st.query_params.pop("job", None)
+    if job is None:
+        return None
+
+    if job.params["mode"] == "standard":
+        remember_resumable_run(job.params["user_query"])
+
+    if job.status == STATUS_DONE:
+        result = job.result
+        message_data = {"role": "assistant", "content": result["response_text"]}
+        if result.get("debug_info"):
+            message_data["debug_info"] = result["debug_info"]
+        if result.get("compression_info"):
+            message_data["compression_info"] = store_compression_info(result["compression_info"])
+        st.session_state.messages.append(message_data)
+        if job.params.get("evaluate"):
+            submit_evaluation(
+                len(st.session_state.messages) - 1,
+                job.params["user_query"],
+                result["response_text"],
+                job.params["prompt_choice"]
+            )
+    else:
+        st.session_state.job_error = job.error
+        # Comme en mode synchrone : la question en échec est retirée de l'historique
+        if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
+            st.session_state.messages.pop()
+            st.session_state.message_count -= 1
+    return None
+
+
+# Rafraîchissement du panneau de progression des jobs d'arrière-plan
+JOB_POLL_INTERVAL_S = 2
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_S)
+def job_status_panel(job_id):
+    """
+    Progression du job d'arrière-plan : seul ce panneau est rafraîchi pendant
+    l'exécution ; la page entière n'est réexécutée qu'à la fin du job, pour
+    intégrer son résultat (collect_finished_job).
+    """
+    job = get_job_runner().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    with st.chat_message("assistant"):
+        status_label = "en file d'attente" if job.status == "queued" else f"en cours depuis {job.elapsed_s:.0f}s"
+        st.info(f"⏳ Traitement {status_label}\n\n{job.progress or ''}")
+
+
+def submit_evaluation(message_index, document_source, response_text, prompt_type):
+    """Soumet l'évaluation Magistral d'une réponse à la file (résultat récupéré par collect_evaluations)."""
+    key = get_evaluation_queue(evaluate_with_magistral).submit(document_source, response_text, prompt_type)
+    st.session_state.pending_evaluations[message_index] = key
+
+
+def collect_evaluations():
+    """Rattache aux messages les évaluations terminées ; retourne le nombre d'évaluations encore en cours."""
+    queue = get_evaluation_queue(evaluate_with_magistral)
+    for message_index, key in list(st.session_state.pending_evaluations.items()):
+        result = queue.collect(key)
+        if result is not None:
+            st.session_state.evaluations[message_index] = result
+            del st.session_state.pending_evaluations[message_index]
+    return len(st.session_state.pending_evaluations)
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_S)
+def evaluation_status_panel():
+    """
+    Suivi des évaluations en cours : seul ce panneau est rafraîchi ; la page
+    entière n'est réexécutée que lorsqu'une évaluation est terminée, pour
+    l'afficher sous sa réponse (collect_evaluations).
+    """
+    queue = get_evaluation_queue(evaluate_with_magistral)
+    pending = st.session_state.pending_evaluations
+    if any(queue.finished(key) for key in pending.values()):
+        st.rerun()
+    st.caption(f"⏳ {len(pending)} évaluation(s) Magistral en cours")
+
+
+def conversation_messages():
+    """Historique de la session à envoyer au modèle, documents résolus selon l'option de relance."""
+    return st.session_state.documents.api_messages(
+        st.session_state.messages, follow_up_mode, follow_up_sections
+    )
+
+
+def store_compression_info(compression_info):
+    """
+    Range dans le magasin de la session les textes volumineux des infos de
+    compression (document reconstitué, prompt final) ; l'info conservée avec
+    le message n'en garde que la référence.
+    """
+    documents = st.session_state.documents
+    for key, label in (("document_reconstitue", "Document reconstitué"), ("final_user_prompt", "Prompt final")):
+        if compression_info.get(key):
+            compression_info[f"{key}_ref"] = documents.put(compression_info.pop(key), label)
+    return compression_info
+
+
+def message_id(message):
+    """Identifiant stable d'un message de l'historique (attribué au premier affichage)."""
+    if "id" not in message:
+        message["id"] = uuid.uuid4().hex[:12]
+    return message["id"]
+
+
+def build_message_view(message, user_question):
+    """
+    Éléments d'affichage d'un message, calculés une seule fois : aperçu,
+    bouton de copie (texte échappé), champs du formulaire Tally, résumé de
+    compression. Les contenus volumineux (query complète, JSON intermédiaires,
+    document reconstitué, prompts finaux) ne sont pas inclus : ils sont lus
+    dans le message lorsque l'utilisateur demande à les afficher.
+    """
+    content = message["content"]
+    view = {"id": message_id(message), "has_full": False}
+
+    # Document rangé dans le magasin de la session : le message n'en porte que le libellé
+    if "doc_ref" in message:
+        view["preview"] = f"*{content}*"
+        view["has_full"] = True
+    # Pour les messages utilisateur : tronquer si > 1500 caractères
+    elif message["role"] == "user" and len(content) > 1500:
+        view["preview"] = f"*[Query - {len(content):,} caractères]*"
+        view["has_full"] = True
+    # Pour les messages assistant : tronquer si > 10000 caractères
+    elif message["role"] == "assistant" and len(content) > 10000:
+        view["preview"] = f"{content[:500]}...\n\n*[Réponse tronquée - {len(content):,} caractères au total]*"
+        view["has_full"] = True
+    else:
+        view["preview"] = content
+
+    if message["role"] != "assistant":
+        return view
+
+    view["copy_html"] = copy_button_html(content, f"copy_btn_{view['id']}")
+    view["tally_fields"] = {"Question": user_question[:500], "Answer": content[:500]}
+    view["tally_urls"] = {}
+
+    comp_info = message.get("compression_info")
+    if comp_info and comp_info.get("type", "standard") == "simple":
+        doc_reconstitue = st.session_state.documents.text(comp_info.get("document_reconstitue_ref"))
+        view["reconstitue_preview"] = (
+            f"{doc_reconstitue[:2000]}...\n\n*[Document reconstitué - {len(doc_reconstitue):,} caractères]*"
+            if len(doc_reconstitue) > 2000 else doc_reconstitue
+        )
+        view["reconstitue_is_long"] = len(doc_reconstitue) > 2000
+        view["compression_summary"] = (
+            f"✂️ **Mode compression simplifiée** : {comp_info.get('nb_reductions', 0)} sous-section(s) réduite(s)\n\n"
+            f"📊 **Tokens** : {comp_info.get('tokens_original', 0):,} → {comp_info.get('tokens_reconstitue', 0):,} (reconstitué) "
+            f"→ {comp_info.get('tokens_final', 0):,} (final)\n"
+            f"(**{comp_info.get('reduction_pct', 0)}%** de réduction avant résumé final)"
+        )
+    elif comp_info:
+        savings = comp_info.get("final_prompt_savings")
+        savings_line = (
+            f"\n\n🗜️ **Prompt final** : {savings['tokens_before']:,} → {savings['tokens_after']:,} tokens "
+            f"(**-{savings['saved_pct']}%** après compaction)"
+        ) if savings else ""
+        view["compression_summary"] = (
+            f"📦 **Mode compression** : {comp_info['nb_sections']} sections → {comp_info['nb_packets']} paquet(s)\n\n"
+            f"📊 **Tokens** : {comp_info.get('tokens_original', 0):,} → {comp_info.get('tokens_compressed', 0):,} "
+            f"(**{comp_info.get('compression_ratio', 0)}%** de réduction)"
+            + savings_line
+            + reduce_levels_line(comp_info.get("reduce_levels"))
+        )
+    return view
+
+
+def get_message_view(idx):
+    """Vue du message idx de l'historique, mémorisée par identifiant de message dans la session."""
+    message = st.session_state.messages[idx]
+    views = st.session_state.message_views
+    view = views.get(message_id(message))
+    if view is None:
+        user_question = ""
+        if idx > 0 and st.session_state.messages[idx - 1]["role"] == "user":
+            user_question = st.session_state.documents.full_content(st.session_state.messages[idx - 1])
+        view = views[message["id"]] = build_message_view(message, user_question)
+    return view
+
+
+def tally_url_for(view, prompt_label, model_label):
+    """URL du formulaire Tally (hidden fields), mémorisée par prompt et modèle sélectionnés."""
+    key = (prompt_label, model_label)
+    if key not in view["tally_urls"]:
+        tally_params = {**view["tally_fields"], "Prompt": prompt_label, "LLMmodel": model_label}
+        view["tally_urls"][key] = f"https://tally.so/r/9qZx9X?{urlencode(tally_params)}"
+    return view["tally_urls"][key]
+
+
+# Visionneuse de l'onglet "Fichiers de conclusions" : affichage page par page
+DOSSIER_PAGE_CHARS = 20000
+
+
+def dossier_metadata(text):
+    """Taille, tokens et nombre de sections détectées d'un dossier (mémorisés par le corpus)."""
+    return {
+        "caracteres": len(text),
+        "tokens": count_text_tokens(text),
+        "sections": len(parse_document(text)),
+    }
+
+
+def dossier_page_offsets(text, page_chars=DOSSIER_PAGE_CHARS):
+    """Débuts de page (coupure en fin de ligne lorsque c'est possible)."""
+    offsets = [0]
+    while len(text) - offsets[-1] > page_chars:
+        start = offsets[-1]
+        cut = text.rfind("\n", start, start + page_chars)
+        offsets.append(cut + 1 if cut > start else start + page_chars)
+    return offsets
+
+
 # Créer les onglets
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["💬 Chat", "📄 Fichiers de conclusions", "✏️ Prompt personnalisable", "📐 Modèle de trame", "📖 Guide d'utilisation"])
 
@@ -1206,55 +1862,61 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(["💬 Chat", "📄 Fichiers de conclusio
 with tab1:
     st.header("Chat")
 
-    # Afficher l'historique des messages
+    # Intégrer le résultat du job d'arrière-plan s'il vient de se terminer
+    running_job = collect_finished_job()
+    if collect_evaluations():
+        evaluation_status_panel()
+    if st.session_state.job_error:
+        st.error(f"Erreur lors de la génération de la réponse : {st.session_state.job_error}")
+        st.session_state.job_error = None
+
+    # Exécution par paquets inaboutie : reprise sans ré-extraire les paquets déjà obtenus
+    resumable_run = st.session_state.resumable_run
+    if resumable_run and running_job is None and enable_compression and not enable_simple_compression:
+        if st.button(
+            f"🔁 Reprendre l'exécution précédente ({resumable_run['nb_done']}/{resumable_run['nb_packets']} paquets déjà extraits)",
+            key="resume_run_button"
+        ):
+            st.session_state.resume_query = resumable_run["user_query"]
+            st.session_state.resumable_run = None
+            st.rerun()
+
+    # Afficher l'historique des messages : éléments d'affichage mémorisés par message
+    # (get_message_view) ; les contenus volumineux ne sont envoyés au navigateur que
+    # lorsque leur case est cochée (le contenu d'un expander est envoyé même fermé)
     for idx, message in enumerate(st.session_state.messages):
+        view = get_message_view(idx)
+        msg_key = view["id"]
         with st.chat_message(message["role"]):
-            content = message["content"]
-
-            # Pour les messages utilisateur : tronquer si > 1500 caractères
-            if message["role"] == "user" and len(content) > 1500:
-                st.markdown(f"*[Query - {len(content):,} caractères]*")
-                with st.expander("📄 Voir la query complète"):
-                    st.code(content, language=None)
-            # Pour les messages assistant : tronquer si > 10000 caractères
-            elif message["role"] == "assistant" and len(content) > 10000:
-                st.markdown(f"{content[:500]}...\n\n*[Réponse tronquée - {len(content):,} caractères au total]*")
-                with st.expander("📄 Voir la réponse complète"):
-                    st.markdown(content)
-            else:
-                st.markdown(content)
+            st.markdown(view["preview"])
+            if view["has_full"]:
+                full_label = "📄 Voir la query complète" if message["role"] == "user" else "📄 Voir la réponse complète"
+                if st.checkbox(full_label, key=f"full_{msg_key}"):
+                    full_content = st.session_state.documents.full_content(message)
+                    if message["role"] == "user":
+                        st.code(full_content, language=None)
+                    else:
+                        st.markdown(full_content)
 
             # Ajouter le document reconstitué pour la compression simplifiée
-            if message["role"] == "assistant" and "compression_info" in message:
+            if message["role"] == "assistant" and "reconstitue_preview" in view:
                 comp_info = message["compression_info"]
-                if comp_info.get("type") == "simple" and "document_reconstitue" in comp_info:
-                    st.markdown("---")
-                    st.markdown("### 📄 Document intermédiaire (conclusion compressée)")
-
-                    tokens_orig = comp_info.get('tokens_original', 0)
-                    tokens_reconst = comp_info.get('tokens_reconstitue', 0)
-                    reduction_pct = comp_info.get('reduction_pct', 0)
-
-                    st.info(
-                        f"**Taux de compression réalisé** : {tokens_orig:,} tokens → {tokens_reconst:,} tokens "
-                        f"(**{reduction_pct}%** de réduction)"
+                st.markdown("---")
+                st.markdown("### 📄 Document intermédiaire (conclusion compressée)")
+                st.info(
+                    f"**Taux de compression réalisé** : {comp_info.get('tokens_original', 0):,} tokens → "
+                    f"{comp_info.get('tokens_reconstitue', 0):,} tokens (**{comp_info.get('reduction_pct', 0)}%** de réduction)"
+                )
+                # Afficher un extrait + case à cocher pour le document complet
+                st.markdown(view["reconstitue_preview"])
+                if view["reconstitue_is_long"] and st.checkbox("📄 Voir le document reconstitué complet", key=f"doc_reconst_main_{msg_key}"):
+                    st.text_area(
+                        "Document reconstitué",
+                        st.session_state.documents.text(comp_info.get("document_reconstitue_ref")),
+                        height=400,
+                        key=f"doc_reconst_text_{msg_key}"
                     )
 
-                    doc_reconstitue = comp_info.get("document_reconstitue", "")
-
-                    # Afficher un extrait + expandeur pour le document complet
-                    if len(doc_reconstitue) > 2000:
-                        st.markdown(f"{doc_reconstitue[:2000]}...\n\n*[Document reconstitué - {len(doc_reconstitue):,} caractères]*")
-                        with st.expander("📄 Voir le document reconstitué complet"):
-                            st.text_area(
-                                "Document reconstitué",
-                                doc_reconstitue,
-                                height=400,
-                                key=f"doc_reconst_main_{idx}"
-                            )
-                    else:
-                        st.markdown(doc_reconstitue)
-
         # Afficher le lien vers le formulaire Tally après chaque réponse de l'assistant
         if message["role"] == "assistant":
             # Afficher les infos de debug si disponibles (Mistral Small 4)
@@ -1270,22 +1932,9 @@ with tab1:
             # Afficher les infos de compression si disponibles
             if "compression_info" in message:
                 comp_info = message["compression_info"]
-                compression_type = comp_info.get("type", "standard")
-
-                if compression_type == "simple":
-                    # Affichage pour compression simplifiée
-                    nb_reductions = comp_info.get('nb_reductions', 0)
-                    tokens_orig = comp_info.get('tokens_original', 0)
-                    tokens_reconst = comp_info.get('tokens_reconstitue', 0)
-                    tokens_final = comp_info.get('tokens_final', 0)
-                    reduction_pct = comp_info.get('reduction_pct', 0)
-
-                    st.success(
-                        f"✂️ **Mode compression simplifiée** : {nb_reductions} sous-section(s) réduite(s)\n\n"
-                        f"📊 **Tokens** : {tokens_orig:,} → {tokens_reconst:,} (reconstitué) → {tokens_final:,} (final)\n"
-                        f"(**{reduction_pct}%** de réduction avant résumé final)"
-                    )
+                st.success(view["compression_summary"])
 
+                if comp_info.get("type", "standard") == "simple":
                     with st.expander("🔍 Voir les sous-sections réduites"):
                         st.markdown("### ✂️ Sous-sections traitées")
                         for subsection in comp_info.get("sous_sections_reduites", []):
@@ -1296,36 +1945,32 @@ with tab1:
                             reduction_sub = round((1 - tokens_red / tokens_orig_sub) * 100, 1) if tokens_orig_sub > 0 else 0
 
                             st.markdown(f"**{section_name.upper()} - {titre}**")
-                            st.info(f"📊 {tokens_orig_sub:,} tokens → {tokens_red:,} tokens ({reduction_sub}% de réduction)")
+                            duree_sub = f", {subsection['duree_s']} s" if subsection.get("duree_s") is not None else ""
+                            st.info(f"📊 {tokens_orig_sub:,} tokens → {tokens_red:,} tokens ({reduction_sub}% de réduction{duree_sub})")
 
                         # Afficher le document reconstitué
                         st.markdown("---")
                         st.markdown("### 📄 Document reconstitué (avant résumé final)")
-                        with st.expander("Voir le document reconstitué complet", expanded=False):
+                        if st.checkbox("Voir le document reconstitué complet", key=f"reconstitue_{msg_key}"):
                             st.text_area(
                                 "Document reconstitué",
-                                comp_info.get("document_reconstitue", "Non disponible"),
+                                st.session_state.documents.text(comp_info.get("document_reconstitue_ref"), "Non disponible"),
                                 height=400,
-                                key=f"reconstitue_{idx}"
+                                key=f"reconstitue_text_{msg_key}"
                             )
 
                 else:
-                    # Affichage pour compression standard (par paquets)
-                    tokens_orig = comp_info.get('tokens_original', 0)
-                    tokens_comp = comp_info.get('tokens_compressed', 0)
-                    ratio = comp_info.get('compression_ratio', 0)
-                    st.success(
-                        f"📦 **Mode compression** : {comp_info['nb_sections']} sections → {comp_info['nb_packets']} paquet(s)\n\n"
-                        f"📊 **Tokens** : {tokens_orig:,} → {tokens_comp:,} (**{ratio}%** de réduction)"
-                    )
                     with st.expander("🔍 Voir les données intermédiaires extraites"):
+                        extracted_jsons = comp_info.get("extracted_jsons", [])
                         st.markdown("### 📦 JSON extraits par paquet")
-                        for i, packet_json in enumerate(comp_info.get("extracted_jsons", [])):
-                            st.markdown(f"**Paquet {i+1}**")
+                        for i, packet_json in enumerate(extracted_jsons):
                             if "error" in packet_json:
-                                st.warning(f"Erreur d'extraction : {packet_json['error']}")
-                            else:
-                                st.json(packet_json)
+                                st.warning(f"Paquet {i+1} - Erreur d'extraction : {packet_json['error']}")
+                        if st.checkbox(f"Afficher les {len(extracted_jsons)} JSON extraits", key=f"packets_{msg_key}"):
+                            for i, packet_json in enumerate(extracted_jsons):
+                                if "error" not in packet_json:
+                                    st.markdown(f"**Paquet {i+1}**")
+                                    st.json(packet_json)
 
                         # Afficher les prompts finaux utilisés pour la synthèse
                         st.markdown("---")
@@ -1335,39 +1980,27 @@ with tab1:
                         final_system_prompt = comp_info.get("final_system_prompt", "Non disponible")
                         if final_system_prompt != "Non disponible":
                             st.markdown("#### 🎯 System Prompt (instructions)")
-                            with st.expander("Voir le system prompt complet", expanded=False):
+                            if st.checkbox("Voir le system prompt complet", key=f"final_system_{msg_key}"):
                                 st.code(final_system_prompt, language="markdown")
 
                         # User prompt (JSON + consigne courte)
-                        final_user_prompt = comp_info.get("final_user_prompt", "Non disponible")
+                        final_user_prompt = st.session_state.documents.text(comp_info.get("final_user_prompt_ref"), "Non disponible")
                         if final_user_prompt != "Non disponible":
                             st.markdown("#### 💬 User Prompt (JSON + consigne)")
-                            with st.expander("Voir le user prompt complet", expanded=False):
+                            if st.checkbox("Voir le user prompt complet", key=f"final_user_{msg_key}"):
                                 st.code(final_user_prompt, language=None)
 
-            # Récupérer la question de l'utilisateur (message précédent)
-            user_question = ""
-            if idx > 0 and st.session_state.messages[idx - 1]["role"] == "user":
-                user_question = st.session_state.messages[idx - 1]["content"]
-
-            # Construire l'URL Tally avec les hidden fields (taille réduite pour éviter les problèmes d'URL)
-            tally_params = {
-                "Question": user_question[:500],
-                "Answer": content[:500],
-                "Prompt": prompt_choice,
-                "LLMmodel": model_choice
-            }
-            tally_url = f"https://tally.so/r/9qZx9X?{urlencode(tally_params)}"
-
-            # Boutons d'action : Copier + Feedback
+            # Boutons d'action : Copier + Feedback (HTML et URL mémorisés dans la vue du message)
             col_copy, col_feedback = st.columns([1, 1])
             with col_copy:
-                copy_button(content, f"copy_btn_{idx}")
+                components.html(view["copy_html"], height=50)
             with col_feedback:
-                st.link_button("📝 Donner votre avis", tally_url, type="secondary", use_container_width=True)
+                st.link_button("📝 Donner votre avis", tally_url_for(view, prompt_choice, model_choice), type="secondary", use_container_width=True)
 
             # Afficher l'évaluation si disponible
-            if idx in st.session_state.evaluations:
+            if idx in st.session_state.pending_evaluations:
+                st.caption("⏳ Évaluation Magistral en cours...")
+            elif idx in st.session_state.evaluations:
                 eval_data = st.session_state.evaluations[idx]
                 if "error" not in eval_data:
                     with st.expander(f"🎯 Évaluation Magistral - Score global : {eval_data.get('score_global', 'N/A')}/5"):
@@ -1417,12 +2050,18 @@ with tab1:
                         if st.checkbox("🔍 Voir la réponse brute de Magistral", key=f"raw_{idx}"):
                             st.code(str(eval_data["raw_response"]), language=None)
 
-    # Zone de saisie - désactivée si on a déjà 5 questions posées
+    # Job en cours : progression (panneau rafraîchi seul, voir job_status_panel)
+    if running_job is not None:
+        job_status_panel(running_job.id)
+
+    # Zone de saisie - désactivée si on a déjà 5 questions posées ou si un job est en cours
     max_questions = 5
-    can_ask = st.session_state.message_count < max_questions
+    can_ask = st.session_state.message_count < max_questions and running_job is None
 
     if not can_ask:
         st.info(f"Limite atteinte : vous avez posé {max_questions} questions (question initiale + 4 relances). Cliquez sur 'Nouvelle conversation' dans la barre latérale pour recommencer.")
+    if not can_ask and st.session_state.get("dossier_query"):
+        st.info("💬 Le dossier envoyé depuis l'onglet 'Fichiers de conclusions' sera traité dès que le chat sera disponible.")
 
     # Zone de saisie de la question
     user_query = st.chat_input(
@@ -1430,10 +2069,25 @@ with tab1:
         disabled=not can_ask
     )
 
+    # Bouton de reprise : le document de l'exécution inaboutie est soumis à nouveau
+    resume_requested = False
+    if not user_query and can_ask and st.session_state.get("resume_query"):
+        user_query = st.session_state.pop("resume_query")
+        resume_requested = True
+
+    # Dossier envoyé depuis l'onglet "Fichiers de conclusions" : seule sa référence transite par la session
+    # (conservée tant que le chat ne peut pas la traiter, par ex. pendant un job)
+    query_label = "Document"
+    if not user_query and can_ask and st.session_state.get("dossier_query"):
+        dossier = get_corpus().dossier(st.session_state.pop("dossier_query"))
+        if dossier is not None:
+            user_query = dossier.text
+            query_label = dossier.label
+
     # Traiter la question de l'utilisateur
     if user_query and can_ask:
-        # Ajouter la question de l'utilisateur à l'historique
-        st.session_state.messages.append({"role": "user", "content": user_query})
+        # Ajouter la question de l'utilisateur à l'historique (document volumineux : par référence)
+        st.session_state.messages.append(st.session_state.documents.message("user", user_query, query_label))
         st.session_state.message_count += 1
 
         # Vérifier le nombre de tokens avant l'appel (sauf en mode compression)
@@ -1441,7 +2095,7 @@ with tab1:
 
         if not enable_compression:
             # Mode normal : vérifier la limite de tokens
-            estimated_tokens = count_messages_tokens(system_prompt, st.session_state.messages)
+            estimated_tokens = count_messages_tokens(system_prompt, conversation_messages())
             token_limit = MODEL_TOKEN_LIMITS.get(model_choice, 32000)
 
             if estimated_tokens > token_limit:
@@ -1465,8 +2119,32 @@ with tab1:
             # Le document sera découpé en paquets respectant les limites
             st.sidebar.success(f"📦 Mode compression : pas de limite de tokens")
 
+        # Générer la réponse dans un job d'arrière-plan
+        if should_proceed and enable_background_jobs:
+            if enable_simple_compression:
+                job_mode = "simple"
+            elif enable_compression:
+                job_mode = "standard"
+            else:
+                job_mode = "direct"
+            job_params = {
+                "mode": job_mode,
+                "model_choice": model_choice,
+                "system_prompt": system_prompt,
+                "prompt_choice": prompt_choice,
+                "compression_prompt_type": compression_prompt_type_for(prompt_choice),
+                "user_query": user_query,
+                "messages": [{"role": m["role"], "content": m["content"]} for m in conversation_messages()],
+                "evaluate": enable_evaluation,
+                "resume": resume_previous_run or resume_requested,
+            }
+            job_id = get_job_runner().submit(job_mode, run_pipeline_job, job_params)
+            st.session_state.pending_job = job_id
+            st.query_params["job"] = job_id
+            st.rerun()
+
         # Générer et afficher la réponse si autorisé
-        if should_proceed:
+        elif should_proceed:
             # Générer et afficher la réponse
             with st.chat_message("assistant"):
                 try:
@@ -1489,57 +2167,43 @@ with tab1:
                                 final_summary, intermediary_data = simple_compression_pipeline(
                                     document=user_query,
                                     api_key=mistral_api_key,
-                                    final_model="mistral-large-latest",
-                                    final_prompt="resume_conclusions",
-                                    threshold_tokens=7000,
-                                    reduction_pct=20.0,
-                                    progress_callback=update_progress
+                                    progress_callback=update_progress,
+                                    stream_final=enable_streaming,
+                                    **SIMPLE_COMPRESSION_SETTINGS
                                 )
 
                             progress_placeholder.empty()
 
-                            # Afficher les statistiques
-                            nb_reductions = len(intermediary_data["sous_sections_reduites"])
-                            tokens_original = intermediary_data["tokens_original"]
-                            tokens_reconstitue = intermediary_data["tokens_reconstitue"]
-                            tokens_final = intermediary_data["tokens_final"]
+                            if enable_streaming:
+                                # Résumé final affiché au fil de l'eau (tokens_final renseigné à la fin du flux)
+                                st.write_stream(final_summary)
+                                final_summary = final_summary.text.strip()
 
-                            reduction_pct = round((1 - tokens_reconstitue / tokens_original) * 100, 1) if tokens_original > 0 else 0
+                            # Stocker les infos pour affichage ultérieur
+                            compression_info = build_simple_compression_info(intermediary_data)
 
+                            # Afficher les statistiques
                             st.success(
-                                f"✅ Compression simplifiée terminée : {nb_reductions} sous-section(s) réduite(s)\n\n"
-                                f"📊 **Tokens** : {tokens_original:,} → {tokens_reconstitue:,} (reconstitué) → {tokens_final:,} (final)\n"
-                                f"(**{reduction_pct}%** de réduction avant résumé final)"
+                                f"✅ Compression simplifiée terminée : {compression_info['nb_reductions']} sous-section(s) réduite(s)\n\n"
+                                f"📊 **Tokens** : {compression_info['tokens_original']:,} → {compression_info['tokens_reconstitue']:,} (reconstitué) → {compression_info['tokens_final']:,} (final)\n"
+                                f"(**{compression_info['reduction_pct']}%** de réduction avant résumé final)"
                             )
 
-                            # Stocker les infos pour affichage ultérieur
-                            compression_info = {
-                                "type": "simple",
-                                "nb_reductions": nb_reductions,
-                                "sous_sections_reduites": intermediary_data["sous_sections_reduites"],
-                                "document_reconstitue": intermediary_data["document_reconstitue"],
-                                "tokens_original": tokens_original,
-                                "tokens_reconstitue": tokens_reconstitue,
-                                "tokens_final": tokens_final,
-                                "reduction_pct": reduction_pct
-                            }
-
                             response_text = final_summary
 
                         else:
                             # Pipeline de compression standard (par paquets)
                             # Déterminer le type de prompt compression
-                            if "Rapport de synthèse" in prompt_choice:
-                                compression_prompt_type = "rapport_synthese"
-                            else:
-                                compression_prompt_type = "resume_conclusions"
+                            compression_prompt_type = compression_prompt_type_for(prompt_choice)
 
                             with st.spinner("Pipeline de compression en cours..."):
                                 result = call_model_with_compression(
                                     model_choice,
                                     user_query,
                                     prompt_type=compression_prompt_type,
-                                    progress_callback=update_progress
+                                    progress_callback=update_progress,
+                                    stream_final=enable_streaming,
+                                    resume_previous_run=resume_previous_run or resume_requested
                                 )
 
                             progress_placeholder.empty()
@@ -1548,22 +2212,39 @@ with tab1:
                             st.success(
                                 f"✅ Compression terminée : {result['nb_sections']} sections → {result['nb_packets']} paquet(s)\n\n"
                                 f"📊 **Tokens** : {result['tokens_original']:,} → {result['tokens_compressed']:,} "
-                                f"(**{result['compression_ratio']}%** de réduction)"
+                                f"(**{result['compression_ratio']}%** de réduction)\n\n"
+                                f"🗜️ **Prompt final** : {result['final_prompt_savings']['tokens_before']:,} → "
+                                f"{result['final_prompt_savings']['tokens_after']:,} tokens "
+                                f"(**-{result['final_prompt_savings']['saved_pct']}%** après compaction)"
+                                + reduce_levels_line(result["reduce_levels"])
                             )
 
+                            if result["resumed_packets"]:
+                                st.info(f"♻️ Exécution précédente reprise : {result['resumed_packets']}/{result['nb_packets']} paquet(s) non ré-extrait(s)")
+                            if result["failed_packets"]:
+                                st.warning(f"⚠️ {len(result['failed_packets'])} paquet(s) en échec ({', '.join(result['failed_packets'])}) : l'exécution peut être reprise")
+
                             # Stocker les infos de compression pour affichage ultérieur
-                            compression_info = {
-                                "type": "standard",
-                                "nb_sections": result["nb_sections"],
-                                "nb_packets": result["nb_packets"],
-                                "extracted_jsons": result["extracted_jsons"],
-                                "final_user_prompt": result["final_user_prompt"],
-                                "tokens_original": result["tokens_original"],
-                                "tokens_compressed": result["tokens_compressed"],
-                                "compression_ratio": result["compression_ratio"]
-                            }
-
-                            response_text = result["final_response"]
+                            compression_info = build_standard_compression_info(result)
+
+                            if enable_streaming:
+                                # Résumé final affiché au fil de l'eau
+                                final_stream = result["final_response"]
+                                st.write_stream(final_stream)
+                                response_text = final_stream.text
+                            else:
+                                response_text = result["final_response"]
+
+                    elif enable_streaming:
+                        # Appel simple (1 étape), réponse affichée au fil de l'eau
+                        response_stream = call_model(
+                            model_choice,
+                            system_prompt,
+                            conversation_messages(),
+                            stream=True
+                        )
+                        st.write_stream(response_stream)
+                        response_text = response_stream.text
 
                     else:
                         # Appel simple (1 étape)
@@ -1571,57 +2252,94 @@ with tab1:
                             response_text = call_model(
                                 model_choice,
                                 system_prompt,
-                                st.session_state.messages
+                                conversation_messages()
                             )
 
                     # Récupérer les infos de debug si disponibles (Mistral Small 4)
-                    debug_info = None
-                    if "debug_finish_reason" in st.session_state:
-                        finish_reason = st.session_state.pop("debug_finish_reason")
-                        usage_info = st.session_state.pop("debug_usage", "")
-                        debug_info = {
-                            "finish_reason": finish_reason,
-                            "usage": usage_info
-                        }
+                    debug_info = pop_debug_info(st.session_state)
 
                     # Ajouter la réponse à l'historique (avec debug_info et compression_info si disponibles)
                     message_data = {"role": "assistant", "content": response_text}
                     if debug_info:
                         message_data["debug_info"] = debug_info
                     if enable_compression and 'compression_info' in dir():
-                        message_data["compression_info"] = compression_info
+                        message_data["compression_info"] = store_compression_info(compression_info)
                     st.session_state.messages.append(message_data)
 
-                    # Évaluation automatique si activée
+                    # Évaluation automatique si activée : soumise à la file, la réponse s'affiche sans l'attendre
                     if enable_evaluation:
-                        with st.spinner("Évaluation avec Magistral Medium..."):
-                            # Récupérer le document source (question de l'utilisateur)
-                            document_source = user_query
-                            eval_result = evaluate_with_magistral(
-                                document_source,
-                                response_text,
-                                prompt_choice
-                            )
-                            # Stocker l'évaluation avec l'index du message
-                            eval_index = len(st.session_state.messages) - 1
-                            st.session_state.evaluations[eval_index] = eval_result
+                        submit_evaluation(
+                            len(st.session_state.messages) - 1,
+                            user_query,
+                            response_text,
+                            prompt_choice
+                        )
+
+                    if enable_compression and not enable_simple_compression:
+                        remember_resumable_run(user_query)
 
                     st.rerun()
 
                 except Exception as e:
                     error_msg = f"Erreur lors de la génération de la réponse : {str(e)}"
-                    st.error(error_msg)
                     st.session_state.messages.pop()
                     st.session_state.message_count -= 1
+                    if enable_compression and not enable_simple_compression:
+                        # Erreur affichée au rechargement, avec le bouton de reprise
+                        remember_resumable_run(user_query)
+                        st.session_state.job_error = str(e)
+                        st.rerun()
+                    st.error(error_msg)
 
 # ============================================================
 # ONGLET 2 : FICHIERS DE CONCLUSIONS
 # ============================================================
 with tab2:
-    st.markdown("Cliquez sur l'icône 📋 en haut à droite de chaque bloc pour copier le contenu.")
-    for name, content in CONCLUSION_FILES.items():
-        with st.expander(name):
-            st.code(content, language=None, line_numbers=False)
+    corpus = get_corpus()
+    dossiers = corpus.dossiers()
+
+    if st.session_state.get("dossier_sent"):
+        st.success(f"💬 **{st.session_state.pop('dossier_sent')}** envoyé dans le chat (onglet 💬 Chat)")
+
+    # Métadonnées de tous les dossiers (calculées une fois par fichier, sans envoyer leur contenu au navigateur)
+    rows = []
+    for label, dossier in dossiers.items():
+        metadata = corpus.derive(dossier.path, "metadata", dossier_metadata)
+        rows.append({
+            "Dossier": label,
+            "Taille (Ko)": round(metadata["caracteres"] / 1000, 1),
+            "Tokens": metadata["tokens"],
+            "Sections détectées": metadata["sections"],
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    selected_label = st.selectbox("Dossier à afficher", list(dossiers), key="viewer_dossier")
+    if selected_label:
+        dossier = dossiers[selected_label]
+        text = dossier.text
+        offsets = corpus.derive(dossier.path, "pages", dossier_page_offsets)
+        nb_pages = len(offsets)
+
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page = st.number_input(
+                f"Page (sur {nb_pages})",
+                min_value=1,
+                max_value=nb_pages,
+                value=1,
+                key=f"viewer_page_{dossier.name}"
+            )
+        with col2:
+            st.markdown("&nbsp;")
+            if st.button("💬 Envoyer dans le chat", key="send_dossier_to_chat", help="Soumet ce dossier comme question dans l'onglet Chat, sans passer par le presse-papier"):
+                st.session_state.dossier_query = dossier.name
+                st.session_state.dossier_sent = selected_label
+                st.rerun()
+
+        start = offsets[page - 1]
+        end = offsets[page] if page < nb_pages else len(text)
+        st.caption(f"Caractères {start:,} à {end:,} sur {len(text):,}")
+        st.code(text[start:end], language=None, line_numbers=False)
 
 # ============================================================
 # ONGLET 3 : PROMPT PERSONNALISABLE
@@ -1806,3 +2524,16 @@ with st.sidebar.expander("ℹ️ Configuration des clés API"):
 
     Vous pouvez les définir dans un fichier `.env` à la racine du projet.
     """)
+
+# Métriques du contrôle adaptatif de concurrence (extraction des paquets)
+limiter_metrics = all_limiter_metrics()
+if limiter_metrics:
+    with st.sidebar.expander("📈 Concurrence d'extraction"):
+        for provider_name, metrics in limiter_metrics.items():
+            st.markdown(
+                f"**{PROVIDERS[provider_name].label}** : {metrics['concurrency_limit']} appel(s) simultané(s) "
+                f"({metrics['in_flight']} en cours)\n\n"
+                f"✅ {metrics['successes']} succès · ⚠️ {metrics['throttle_events']} surcharge(s)"
+            )
+            if metrics["recent_throttles"]:
+                st.json(metrics["recent_throttles"])
@@ -0,0 +1,77 @@
+"""
+Boucle asyncio partagée par le processus Streamlit.
+
+Les scripts Streamlit s'exécutent dans un thread par session, sans boucle
+d'événements. Ce module démarre une seule boucle dans un thread dédié :
+toutes les sessions y soumettent leurs coroutines, ce qui permet de garder
+de nombreux appels LLM en vol sans un thread système par requête.
+
+Les messages de progression sont renvoyés au thread appelant (celui du
+script Streamlit), seul autorisé à mettre à jour l'interface.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future, wait
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Retourne la boucle partagée, en la démarrant au premier appel."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro: Awaitable[T]) -> Future:
+    """Planifie une coroutine sur la boucle partagée (thread-safe)."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_blocking(
+    coro_factory: Callable[[Callable[[str], None]], Awaitable[T]],
+    progress_callback: Optional[Callable[[str], None]] = None,
+    poll_interval: float = 0.2,
+) -> T:
+    """
+    Exécute une coroutine sur la boucle partagée et attend son résultat.
+
+    Args:
+        coro_factory: Fonction recevant `report(msg)` et retournant la coroutine
+        progress_callback: Appelé dans le thread courant pour chaque message reporté
+        poll_interval: Intervalle de relève des messages de progression (secondes)
+
+    Returns:
+        Le résultat de la coroutine (les exceptions sont propagées)
+    """
+    messages: "queue.Queue[str]" = queue.Queue()
+    future = submit(coro_factory(messages.put))
+
+    def drain() -> None:
+        while True:
+            try:
+                msg = messages.get_nowait()
+            except queue.Empty:
+                return
+            if progress_callback:
+                progress_callback(msg)
+
+    while not future.done():
+        wait([future], timeout=poll_interval)
+        drain()
+    drain()
+    return future.result()
@@ -0,0 +1,212 @@
+"""
+Points de reprise du pipeline de compression par paquets.
+
+Chaque exécution (run) du pipeline est rattachée à l'empreinte du document.
+Le JSON extrait de chaque paquet est enregistré dès qu'il est obtenu, sous la
+clé (run, paquet) : si un paquet échoue ou si le processus redémarre, une
+reprise de l'exécution ne ré-extrait que les paquets manquants ou en échec
+avant la synthèse finale.
+
+Chaque point de reprise mémorise aussi l'empreinte de la requête d'extraction
+du paquet (voir extraction_cache.make_cache_key) : un paquet dont le contenu
+ou les prompts ont changé (nouveau découpage) n'est pas réutilisé. Le nom du
+compteur de tokens utilisé pour le découpage est enregistré avec l'exécution :
+une reprise redécoupe le document avec le même compteur.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_CHECKPOINTS_PATH = Path(__file__).parent.parent / ".cache" / "checkpoints.sqlite"
+
+RUN_RUNNING = "running"
+RUN_INCOMPLETE = "incomplete"
+RUN_COMPLETED = "completed"
+
+
+def document_hash(text: str) -> str:
+    """Empreinte SHA-256 du document source."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class RunInfo:
+    """Exécution enregistrée (lue depuis la table)."""
+    run_id: str
+    doc_hash: str
+    status: str
+    nb_packets: int
+    nb_done: int
+    updated_at: float
+    counter_name: str = ""
+
+    @property
+    def resumable(self) -> bool:
+        return self.status != RUN_COMPLETED
+
+
+class CheckpointStore:
+    """
+    Tables SQLite des exécutions et des paquets extraits.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CHECKPOINTS_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                doc_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                nb_packets INTEGER NOT NULL,
+                counter_name TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS packets (
+                run_id TEXT NOT NULL,
+                packet_id TEXT NOT NULL,
+                packet_key TEXT NOT NULL,
+                result TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (run_id, packet_id)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_doc ON runs(doc_hash, updated_at)")
+        self._conn.commit()
+
+    def start_run(self, doc_hash: str, nb_packets: int, counter_name: str = "") -> str:
+        """
+        Enregistre une nouvelle exécution et retourne son identifiant.
+
+        Args:
+            counter_name: Nom du compteur de tokens du découpage (TokenCounter.name)
+        """
+        run_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, doc_hash, status, nb_packets, counter_name, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, doc_hash, RUN_RUNNING, nb_packets, counter_name, now, now),
+            )
+            self._conn.commit()
+        return run_id
+
+    def resume_run(self, run_id: str, nb_packets: int) -> None:
+        """Repasse une exécution existante en cours (reprise)."""
+        self.set_status(run_id, RUN_RUNNING, nb_packets=nb_packets)
+
+    def set_status(self, run_id: str, status: str, nb_packets: Optional[int] = None) -> None:
+        with self._lock:
+            if nb_packets is None:
+                self._conn.execute(
+                    "UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?",
+                    (status, time.time(), run_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE runs SET status = ?, nb_packets = ?, updated_at = ? WHERE run_id = ?",
+                    (status, nb_packets, time.time(), run_id),
+                )
+            self._conn.commit()
+
+    def save_packet(self, run_id: str, packet_id: str, packet_key: str, result: Dict[str, object]) -> None:
+        """Enregistre le JSON extrait d'un paquet (remplace un point de reprise obsolète)."""
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO packets (run_id, packet_id, packet_key, result, completed_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, packet_id, packet_key, payload, now),
+            )
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+            self._conn.commit()
+
+    def load_packets(self, run_id: str) -> Dict[str, Dict[str, object]]:
+        """
+        Points de reprise d'une exécution.
+
+        Returns:
+            dict packet_id → {"packet_key": ..., "result": JSON extrait}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT packet_id, packet_key, result FROM packets WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+        return {packet_id: {"packet_key": key, "result": json.loads(result)} for packet_id, key, result in rows}
+
+    def latest_resumable_run(self, doc_hash: str) -> Optional[RunInfo]:
+        """Dernière exécution non terminée pour ce document (ou None)."""
+        run = self.latest_run(doc_hash)
+        return run if run is not None and run.resumable else None
+
+    def latest_run(self, doc_hash: str) -> Optional[RunInfo]:
+        """Dernière exécution pour ce document, terminée ou non (ou None)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT r.run_id, r.doc_hash, r.status, r.nb_packets, r.updated_at, "
+                "(SELECT COUNT(*) FROM packets p WHERE p.run_id = r.run_id), r.counter_name "
+                "FROM runs r WHERE r.doc_hash = ? ORDER BY r.updated_at DESC LIMIT 1",
+                (doc_hash,),
+            ).fetchone()
+        if row is None:
+            return None
+        return RunInfo(
+            run_id=row[0],
+            doc_hash=row[1],
+            status=row[2],
+            nb_packets=row[3],
+            nb_done=row[5],
+            updated_at=row[4],
+            counter_name=row[6],
+        )
+
+    def purge(self, older_than_s: float = 7 * 24 * 3600) -> int:
+        """Supprime les exécutions (et leurs paquets) inactives depuis older_than_s."""
+        cutoff = time.time() - older_than_s
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM packets WHERE run_id IN (SELECT run_id FROM runs WHERE updated_at < ?)",
+                (cutoff,),
+            )
+            cursor = self._conn.execute("DELETE FROM runs WHERE updated_at < ?", (cutoff,))
+            self._conn.commit()
+        return cursor.rowcount
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Stockage partagé du processus (chemin surchargeable via CHECKPOINTS_DB_PATH)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = os.getenv("CHECKPOINTS_DB_PATH") or DEFAULT_CHECKPOINTS_PATH
+                _store = CheckpointStore(Path(path))
+                _store.purge()
+    return _store
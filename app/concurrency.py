@@ -0,0 +1,167 @@
+"""
+Contrôle adaptatif de la concurrence des appels LLM (AIMD).
+
+- Augmentation additive : tant que les appels réussissent avec une latence
+  saine, la limite d'appels simultanés monte d'environ 1 par « fenêtre »
+  (soit +1/limite à chaque succès).
+- Diminution multiplicative : sur HTTP 429 / 5xx ou timeout, la limite est
+  divisée par deux (au plus une fois par période de refroidissement).
+
+Un limiteur est conservé par fournisseur pour toute la durée du processus :
+la limite apprise est réutilisée d'une requête (et d'une session) à l'autre.
+Les limiteurs s'utilisent depuis la boucle asyncio partagée (async_runtime).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+import httpx
+
+from llm_clients import MAX_EXTRACTION_CONCURRENCY
+
+# Codes HTTP traités comme une surcharge du fournisseur
+THROTTLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def throttle_reason(exc: BaseException) -> Optional[str]:
+    """
+    Indique si une exception correspond à une surcharge (429, 5xx, timeout).
+
+    Returns:
+        Une courte description ("HTTP 429", "timeout"...) ou None
+    """
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    if status_code in THROTTLE_STATUS_CODES:
+        return f"HTTP {status_code}"
+    return None
+
+
+class AdaptiveLimiter:
+    """
+    Limiteur de concurrence AIMD pour un fournisseur.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 2,
+        min_limit: float = 1,
+        max_limit: float = MAX_EXTRACTION_CONCURRENCY,
+        latency_target_s: float = 90.0,
+        decrease_factor: float = 0.5,
+        cooldown_s: float = 10.0,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.latency_target_s = latency_target_s
+        self.decrease_factor = decrease_factor
+        self.cooldown_s = cooldown_s
+
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.last_latency_s: Optional[float] = None
+        self.throttle_events: Deque[Dict[str, object]] = deque(maxlen=20)
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Réserve une place ; enregistre succès / surcharge selon l'issue de l'appel."""
+        await self.acquire()
+        start = time.time()
+        try:
+            yield
+        except BaseException as e:
+            reason = throttle_reason(e)
+            if reason:
+                self.record_throttle(reason)
+            raise
+        else:
+            self.record_success(time.time() - start)
+        finally:
+            await self.release()
+
+    def record_success(self, latency_s: float) -> None:
+        self.successes += 1
+        self.last_latency_s = latency_s
+        if latency_s <= self.latency_target_s:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def record_throttle(self, reason: str) -> None:
+        self.throttles += 1
+        now = time.time()
+        decreased = now - self._last_decrease >= self.cooldown_s
+        if decreased:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self._last_decrease = now
+        self.throttle_events.append({
+            "time": time.strftime("%H:%M:%S", time.localtime(now)),
+            "reason": reason,
+            "limit_after": int(self.limit),
+            "decreased": decreased,
+        })
+        # Réveiller les attentes : la limite a pu changer
+        if self._condition is not None:
+            asyncio.get_running_loop().create_task(self._notify())
+
+    async def _notify(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    def metrics(self) -> Dict[str, object]:
+        """Instantané des métriques (lecture seule, appelable depuis n'importe quel thread)."""
+        return {
+            "provider": self.name,
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "successes": self.successes,
+            "throttle_events": self.throttles,
+            "last_latency_s": round(self.last_latency_s, 1) if self.last_latency_s is not None else None,
+            "recent_throttles": list(self.throttle_events),
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(provider: str) -> AdaptiveLimiter:
+    """Retourne le limiteur (persistant) associé à un fournisseur."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters.setdefault(provider, AdaptiveLimiter(provider))
+    return limiter
+
+
+def all_limiter_metrics() -> Dict[str, Dict[str, object]]:
+    """Métriques de tous les limiteurs créés dans le processus."""
+    return {name: limiter.metrics() for name, limiter in _limiters.items()}
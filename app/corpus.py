@@ -0,0 +1,202 @@
+"""
+Corpus de fichiers de l'application : dossiers de conclusions, prompts,
+critères d'évaluation.
+
+Streamlit ré-exécute app.py à chaque interaction, mais les modules importés
+restent chargés : le corpus est un objet du processus, partagé par tous les
+reruns et toutes les sessions.
+
+- Découverte : les dossiers (dossiers/*.txt) et les prompts (prompts/*.md)
+  sont listés depuis les répertoires ; la liste n'est recalculée que si la
+  date de modification du répertoire change (ajout, suppression, renommage).
+- Chargement à la demande : le contenu d'un fichier n'est lu qu'au premier
+  accès, puis conservé tant que sa date de modification et sa taille ne
+  changent pas (une sauvegarde depuis l'éditeur de prompt est donc prise en
+  compte au rerun suivant).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_BASE_DIR = Path(__file__).parent
+
+DOSSIER_NAME_RE = re.compile(r"^do\w*ssier[\s_-]*(\d+(?:-\d+)?)[\s_-]*(.*)$", re.I)
+
+# Mots des noms de fichiers écrits sans accents ou avec une coquille
+LABEL_WORDS = {
+    "conculsion": "conclusion",
+    "intimee": "intimée",
+    "salarie": "salarié",
+    "defendeur": "défendeur",
+    "defenderesse": "défenderesse",
+}
+LABEL_LOWERCASE_WORDS = {"sans", "de", "du", "des", "la", "le", "les", "et", "def"}
+
+# Libellés fixés à la main (nom de fichier sans extension → libellé), quand le
+# nom du fichier porte une mention de travail qui n'a pas à être affichée
+LABEL_OVERRIDES = {
+    "Dossier_17-3_Dossier  assignation sans def": "Dossier 17-3 - Assignation",
+}
+
+
+def dossier_label(filename: str) -> str:
+    """
+    Libellé affiché d'un dossier à partir de son nom de fichier.
+
+    Ex. "Dossier_4_conclusion_intimee.txt" → "Dossier 4 - Conclusion Intimée",
+    "Doissier 14 - defendeur.txt" → "Dossier 14 - Défendeur".
+    """
+    stem = Path(filename).stem
+    if stem.strip() in LABEL_OVERRIDES:
+        return LABEL_OVERRIDES[stem.strip()]
+    match = DOSSIER_NAME_RE.match(stem.strip())
+    if not match:
+        return stem.replace("_", " ").strip()
+    number, rest = match.groups()
+    words = re.split(r"[\s_]+", rest.strip(" -_"))
+    label_words = []
+    for position, word in enumerate(w for w in words if w):
+        core = word.strip("()")
+        core = LABEL_WORDS.get(core.casefold(), core)
+        if position and core.casefold() in LABEL_LOWERCASE_WORDS:
+            core = core.casefold()
+        else:
+            core = core[:1].upper() + core[1:]
+        label_words.append(f"({core})" if word.startswith("(") else core)
+    label = f"Dossier {number}"
+    return f"{label} - {' '.join(label_words)}" if label_words else label
+
+
+def _natural_key(text: str):
+    """Clé de tri naturel ("Dossier 9-2" avant "Dossier 13")."""
+    return [int(part) if part.isdigit() else part.casefold() for part in re.split(r"(\d+)", text)]
+
+
+@dataclass(frozen=True)
+class CorpusFile:
+    """Fichier du corpus : nom, libellé et chemin ; contenu lu à la demande."""
+    name: str
+    label: str
+    path: Path
+    corpus: "Corpus"
+
+    @property
+    def text(self) -> str:
+        return self.corpus.read_text(self.path)
+
+
+class Corpus:
+    """Lecture des fichiers de l'application, mémorisée par date de modification."""
+
+    def __init__(self, base_dir: Path = DEFAULT_BASE_DIR):
+        self.base_dir = Path(base_dir)
+        self.dossiers_dir = self.base_dir / "dossiers"
+        self.prompts_dir = self.base_dir / "prompts"
+        self.reads = 0
+        self.hits = 0
+        self._files: Dict[Tuple[Path, str], Tuple[Tuple[int, int], object]] = {}
+        self._listings: Dict[Tuple[Path, str], Tuple[int, Dict[str, CorpusFile]]] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, path: Path, kind: str, load: Callable[[str], object]) -> object:
+        """Contenu du fichier (texte ou JSON décodé), relu si sa date ou sa taille a changé."""
+        stat = path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = (path, kind)
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+        value = load(path.read_text(encoding="utf-8"))
+        with self._lock:
+            self._files[key] = (signature, value)
+            self.reads += 1
+        return value
+
+    def read_text(self, path: Path) -> str:
+        """
+        Contenu texte d'un fichier (chemin absolu ou relatif au répertoire de l'application).
+
+        Raises:
+            FileNotFoundError: si le fichier n'existe pas
+        """
+        return self._cached(self._resolve(path), "text", lambda text: text)
+
+    def read_json(self, path: Path) -> object:
+        """JSON décodé d'un fichier ; la valeur retournée est partagée et ne doit pas être modifiée."""
+        return self._cached(self._resolve(path), "json", json.loads)
+
+    def derive(self, path: Path, kind: str, compute: Callable[[str], object]) -> object:
+        """
+        Valeur calculée à partir du texte d'un fichier (ex. métadonnées d'un
+        dossier), mémorisée et invalidée comme son contenu ; kind distingue
+        les calculs d'un même fichier.
+        """
+        return self._cached(self._resolve(path), kind, compute)
+
+    def _resolve(self, path: Path) -> Path:
+        path = Path(path)
+        return path if path.is_absolute() else self.base_dir / path
+
+    def _listing(self, directory: Path, pattern: str, label: Callable[[str], str]) -> Dict[str, CorpusFile]:
+        """Fichiers d'un répertoire (nom → CorpusFile), relistés si le répertoire a changé."""
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        key = (directory, pattern)
+        with self._lock:
+            entry = self._listings.get(key)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+        files = sorted(directory.glob(pattern), key=lambda p: _natural_key(label(p.name)))
+        listing = {p.stem: CorpusFile(p.stem, label(p.name), p, self) for p in files}
+        with self._lock:
+            self._listings[key] = (mtime, listing)
+        return listing
+
+    def dossiers(self) -> Dict[str, CorpusFile]:
+        """Dossiers de conclusions (libellé → fichier), triés par numéro de dossier."""
+        return {f.label: f for f in self._listing(self.dossiers_dir, "*.txt", dossier_label).values()}
+
+    def dossier(self, name: str) -> Optional[CorpusFile]:
+        """Dossier par nom de fichier sans extension (référence stable, indépendante du libellé)."""
+        return self._listing(self.dossiers_dir, "*.txt", dossier_label).get(name)
+
+    def prompt_path(self, name: str) -> Path:
+        return self.prompts_dir / f"{name}.md"
+
+    def prompt(self, name: str) -> str:
+        """
+        Contenu du prompt prompts/<name>.md.
+
+        Raises:
+            FileNotFoundError: si le prompt n'existe pas
+        """
+        return self.read_text(self.prompt_path(name))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"files": len(self._files), "reads": self.reads, "hits": self.hits}
+
+
+_corpus: Optional[Corpus] = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus() -> Corpus:
+    """Corpus partagé du processus (CORPUS_DIR pour changer le répertoire de base)."""
+    global _corpus
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = Corpus(Path(os.getenv("CORPUS_DIR") or DEFAULT_BASE_DIR))
+    return _corpus
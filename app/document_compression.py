@@ -10,6 +10,7 @@ Pipeline :
 
 from __future__ import annotations
 
+import bisect
 import json
 import math
 import re
@@ -17,33 +18,67 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+from corpus import get_corpus
+from token_counting import TokenCounter
+
 # Répertoire des prompts
 PROMPTS_DIR = Path(__file__).parent / "prompts"
 
+# Version du parseur : à incrémenter quand la sortie de parse_document /
+# build_packets change (invalide les résultats mémorisés par parse_cache)
+PARSER_VERSION = "1"
+
 
 # ============================================================
 # Data structures
 # ============================================================
 
-@dataclass
+class SourceDocument:
+    """
+    Tampon source unique d'un document (fins de ligne normalisées en \\n).
+    Toutes les sections du document y font référence par offsets.
+    """
+    __slots__ = ("text", "metadata")
+
+    def __init__(self, text: str):
+        self.text = text
+        # Index des métadonnées du document (DocumentMetadataIndex), construit au parsing
+        self.metadata: Optional["DocumentMetadataIndex"] = None
+
+
+Span = Tuple[int, int]
+
+
+@dataclass(slots=True, eq=False)
 class SectionNode:
     """
     Représente une section logique du document.
+
+    Le texte n'est pas copié : la section référence le tampon source partagé
+    par une liste de plages (start, end) en caractères. Le texte normalisé est
+    reconstruit à la demande (propriété `text`), typiquement au moment de
+    construire le prompt d'un paquet.
     """
     id: str
     title: str
     level: int
     start_line: int
     end_line: int
-    text: str
+    source: SourceDocument
+    spans: Tuple[Span, ...]
     section_type: str
+    approx_tokens: int = 0
     path: List[str] = field(default_factory=list)
     children: List["SectionNode"] = field(default_factory=list)
     meta: Dict[str, object] = field(default_factory=dict)
 
+    def __post_init__(self) -> None:
+        if not self.approx_tokens:
+            self.approx_tokens = approximate_tokens(self.text)
+
     @property
-    def approx_tokens(self) -> int:
-        return approximate_tokens(self.text)
+    def text(self) -> str:
+        return materialize_spans(self.source.text, self.spans)
 
 
 @dataclass
@@ -127,6 +162,36 @@ HEADING_PATTERNS: List[Tuple[int, re.Pattern[str], str]] = [
     (1, re.compile(r"^\s*[A-ZÉÈÀÙÂÊÎÔÛÇ'\-\s]{6,}\s*$"), "caps"),
 ]
 
+# Scanner de titres : toutes les HEADING_PATTERNS réunies en une seule alternance
+# nommée, essayée dans le même ordre de priorité. Le préfixe de civilité
+# (M., Mme, Dr...) est exclu par une assertion négative en tête.
+HEADING_LEVELS: Dict[str, int] = {kind: level for level, _pattern, kind in HEADING_PATTERNS}
+
+
+def _compile_heading_scanner() -> re.Pattern[str]:
+    alternatives = []
+    for _level, pattern, kind in HEADING_PATTERNS:
+        body = pattern.pattern
+        if body.startswith("^"):
+            body = body[1:]
+        if body.endswith("$"):
+            body = body[:-1]
+        if pattern.flags & re.I:
+            body = f"(?i:{body})"
+        alternatives.append(f"(?P<{kind}>{body})$")
+    return re.compile(r"^(?!(?i:M|Mme|Mlle|Dr|Pr)\.\s)(?:" + "|".join(alternatives) + ")")
+
+
+HEADING_SCANNER = _compile_heading_scanner()
+
+# Pré-filtre appliqué au document entier (re.M) : ne retient que les lignes dont
+# les deux premiers caractères non blancs sont compatibles avec un titre.
+# Sur-ensemble strict des lignes acceptées par HEADING_SCANNER.
+HEADING_CANDIDATE_RE = re.compile(
+    r"^[^\S\n]*(?:\d|[a-z]\)|(?i:grief)|[A-ZÉÈÀÙÂÊÎÔÛÇ'\-](?=[A-ZÉÈÀÙÂÊÎÔÛÇ'\-.\s]|$))",
+    re.M,
+)
+
 ARTICLE_RE = re.compile(r"\b(article|articles)\s+[A-Z]?\s*\d+[\d\-\.]*\b", re.I)
 CASELAW_RE = re.compile(
     r"\bCass\.\s*"
@@ -172,6 +237,11 @@ SIDE_HINT_PATTERNS: List[Tuple[re.Pattern[str], str]] = [
     (re.compile(r"\bsalari[ée]\b", re.I), "opposing_party"),
 ]
 
+# Union des indices : si elle ne trouve rien, aucun motif ne peut correspondre
+# (évite de tester chaque motif sur les contextes sans indice)
+ROLE_HINT_ANY_RE = re.compile("|".join(f"(?:{p.pattern})" for p, _role in ROLE_HINT_PATTERNS), re.I)
+SIDE_HINT_ANY_RE = re.compile("|".join(f"(?:{p.pattern})" for p, _side in SIDE_HINT_PATTERNS), re.I)
+
 ROLE_BLACKLIST_KINDS = {"institution", "institutional_actor"}
 ROLE_WINDOW = 80
 SIDE_WINDOW = 80
@@ -183,7 +253,12 @@ SIDE_WINDOW = 80
 
 def approximate_tokens(text: str) -> int:
     """Approximation simple (1 token pour 4 caractères)."""
-    return max(1, math.ceil(len(text) / 4))
+    return approximate_tokens_for_length(len(text))
+
+
+def approximate_tokens_for_length(length: int) -> int:
+    """Même approximation, à partir de la longueur du texte normalisé (sans le construire)."""
+    return max(1, math.ceil(length / 4))
 
 
 def normalize_space(text: str) -> str:
@@ -193,8 +268,45 @@ def normalize_space(text: str) -> str:
     return text.strip()
 
 
+def materialize_spans(buffer: str, spans: Tuple[Span, ...]) -> str:
+    """
+    Reconstruit le texte normalisé d'une section à partir de ses plages.
+    Plusieurs plages sont jointes comme des paragraphes distincts.
+    """
+    if len(spans) == 1:
+        start, end = spans[0]
+        return normalize_space(buffer[start:end])
+    return normalize_space("\n\n".join(normalize_space(buffer[start:end]) for start, end in spans))
+
+
+def split_spans(buffer: str, span: Span, separator: re.Pattern[str]) -> List[Span]:
+    """
+    Découpe une plage du tampon selon un séparateur regex, comme
+    [p.strip() for p in separator.split(texte) if p.strip()], mais en
+    retournant des plages au lieu de copies.
+    """
+    start, end = span
+    pieces: List[Span] = []
+    piece_start = start
+    for m in separator.finditer(buffer, start, end):
+        pieces.append((piece_start, m.start()))
+        piece_start = m.end()
+    pieces.append((piece_start, end))
+
+    stripped: List[Span] = []
+    for a, b in pieces:
+        piece = buffer[a:b]
+        content = piece.strip()
+        if not content:
+            continue
+        lead = len(piece) - len(piece.lstrip())
+        stripped.append((a + lead, a + lead + len(content)))
+    return stripped
+
+
 def clean_line(line: str) -> str:
-    return re.sub(r"\s+", " ", line).strip()
+    # Équivalent à re.sub(r"\s+", " ", line).strip(), sans passer par le moteur regex
+    return " ".join(line.split())
 
 
 def clean_caselaw_match(s: str) -> str:
@@ -226,6 +338,44 @@ def heading_level_and_kind(line: str) -> Optional[Tuple[int, str]]:
     return None
 
 
+def classify_heading(stripped: str) -> Optional[Tuple[int, str]]:
+    """
+    Version en une passe de heading_level_and_kind, pour une ligne déjà nettoyée
+    par clean_line : mêmes (niveau, type) en un seul appel regex.
+    """
+    if not stripped:
+        return None
+    m = HEADING_SCANNER.match(stripped)
+    if not m:
+        return None
+    kind = m.lastgroup
+    if kind == "caps" and len(stripped.split()) > 12:
+        return None
+    return HEADING_LEVELS[kind], kind
+
+
+def scan_headings(lines: List[str]) -> List[Tuple[int, int, str, str]]:
+    """
+    Repère les titres d'un document en une passe.
+
+    Returns:
+        Liste de (numéro de ligne, niveau, type, ligne nettoyée)
+    """
+    buffer = "\n".join(lines)
+    headings: List[Tuple[int, int, str, str]] = []
+    line_no = 0
+    pos = 0
+    for m in HEADING_CANDIDATE_RE.finditer(buffer):
+        # Les correspondances sont ordonnées : compter les sauts de ligne depuis la précédente
+        line_no += buffer.count("\n", pos, m.start())
+        pos = m.start()
+        stripped = clean_line(lines[line_no])
+        hk = classify_heading(stripped)
+        if hk:
+            headings.append((line_no, hk[0], hk[1], stripped))
+    return headings
+
+
 def split_lines(text: str) -> List[str]:
     return text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
 
@@ -397,6 +547,8 @@ def infer_role(context: str, kind: str = "") -> Optional[str]:
     if kind in ROLE_BLACKLIST_KINDS:
         return None
     short_context = context[:ROLE_WINDOW]
+    if not ROLE_HINT_ANY_RE.search(short_context):
+        return None
     for pattern, role in ROLE_HINT_PATTERNS:
         if pattern.search(short_context):
             return role
@@ -407,6 +559,8 @@ def infer_side(context: str, kind: str = "") -> Optional[str]:
     if kind in ROLE_BLACKLIST_KINDS:
         return None
     short_context = context[:SIDE_WINDOW]
+    if not SIDE_HINT_ANY_RE.search(short_context):
+        return None
     for pattern, side in SIDE_HINT_PATTERNS:
         if pattern.search(short_context):
             return side
@@ -444,61 +598,76 @@ def extract_entities(text: str) -> List[Dict[str, Optional[str]]]:
 # Parsing
 # ============================================================
 
-def parse_document(text: str) -> List[SectionNode]:
-    """Parse un document juridique en liste ordonnée de sections logiques."""
+def parse_document(text: str, header_registry: Optional[Dict[str, object]] = None) -> List[SectionNode]:
+    """
+    Parse un document juridique en liste ordonnée de sections logiques.
+
+    Args:
+        header_registry: Registre de l'en-tête déjà extrait (voir
+            parse_cache.cached_extract_header_registry) ; calculé sinon
+    """
     lines = split_lines(text)
-    header_registry = extract_header_registry(text)
+    if header_registry is None:
+        header_registry = extract_header_registry(text)
 
-    heading_idx: List[Tuple[int, int, str]] = []
+    # Tampon unique partagé par toutes les sections, et offset de début de chaque ligne
+    source = SourceDocument("\n".join(lines))
+    line_starts: List[int] = [0] * (len(lines) + 1)
+    offset = 0
     for i, line in enumerate(lines):
-        hk = heading_level_and_kind(line)
-        if hk:
-            level, kind = hk
-            heading_idx.append((i, level, clean_line(line)))
+        line_starts[i] = offset
+        offset += len(line) + 1
+    line_starts[len(lines)] = offset
+
+    def lines_span(first: int, stop: int) -> Span:
+        """Plage des lignes [first, stop) sans le saut de ligne final."""
+        return (line_starts[first], max(line_starts[first], line_starts[stop] - 1))
+
+    heading_idx: List[Tuple[int, int, str]] = [
+        (line_no, level, stripped) for line_no, level, _kind, stripped in scan_headings(lines)
+    ]
+
+    # Métadonnées extraites en un balayage du document, puis réparties par section
+    boundaries = [0] + [line_no for line_no, _level, _title in heading_idx if line_no > 0] + [len(lines)]
+    source.metadata = DocumentMetadataIndex(
+        source.text,
+        [lines_span(first, stop) for first, stop in zip(boundaries, boundaries[1:])],
+    )
+
+    def make_node(node_id: str, title: str, level: int, first: int, stop: int, section_type: str, path: List[str]) -> SectionNode:
+        spans = (lines_span(first, stop),)
+        # Taille lue dans l'index normalisé : le texte de la section n'est construit qu'à l'accès (node.text)
+        approx_tokens = approximate_tokens_for_length(source.metadata.normalized_length(spans[0]))
+        return SectionNode(
+            id=node_id,
+            title=title,
+            level=level,
+            start_line=first,
+            end_line=stop - 1,
+            source=source,
+            spans=spans,
+            section_type=section_type,
+            approx_tokens=approx_tokens,
+            path=path,
+            meta=source.metadata.metadata_for(spans, approx_tokens, header_registry),
+        )
 
     if not heading_idx:
-        full = normalize_space(text)
-        return [
-            SectionNode(
-                id="S1",
-                title="DOCUMENT",
-                level=1,
-                start_line=0,
-                end_line=len(lines) - 1,
-                text=full,
-                section_type="document",
-                path=["DOCUMENT"],
-                meta=extract_light_metadata(full, header_registry=header_registry),
-            )
-        ]
+        return [make_node("S1", "DOCUMENT", 1, 0, len(lines), "document", ["DOCUMENT"])]
 
     nodes: List[SectionNode] = []
 
     first_heading_line = heading_idx[0][0]
     if first_heading_line > 0:
-        pre_text = normalize_space("\n".join(lines[:first_heading_line]))
-        if pre_text:
-            nodes.append(
-                SectionNode(
-                    id="S0",
-                    title="EN-TÊTE",
-                    level=1,
-                    start_line=0,
-                    end_line=first_heading_line - 1,
-                    text=pre_text,
-                    section_type="header",
-                    path=["EN-TÊTE"],
-                    meta=extract_light_metadata(pre_text, header_registry=header_registry),
-                )
-            )
+        pre_node = make_node("S0", "EN-TÊTE", 1, 0, first_heading_line, "header", ["EN-TÊTE"])
+        if source.metadata.normalized_length(pre_node.spans[0]):
+            nodes.append(pre_node)
 
     stack: List[Tuple[int, str]] = []
     inherited_type: Optional[str] = None
 
     for idx, (line_no, level, title) in enumerate(heading_idx):
         next_line_no = heading_idx[idx + 1][0] if idx + 1 < len(heading_idx) else len(lines)
-        body_lines = lines[line_no:next_line_no]
-        body_text = normalize_space("\n".join(body_lines))
 
         while stack and stack[-1][0] >= level:
             stack.pop()
@@ -509,18 +678,7 @@ def parse_document(text: str) -> List[SectionNode]:
         if section_type != "argument":
             inherited_type = section_type
 
-        node = SectionNode(
-            id=f"S{len(nodes) + 1}",
-            title=title,
-            level=level,
-            start_line=line_no,
-            end_line=next_line_no - 1,
-            text=body_text,
-            section_type=section_type,
-            path=path,
-            meta=extract_light_metadata(body_text, header_registry=header_registry),
-        )
-        nodes.append(node)
+        nodes.append(make_node(f"S{len(nodes) + 1}", title, level, line_no, next_line_no, section_type, path))
 
     return postprocess_nodes(nodes)
 
@@ -540,7 +698,9 @@ def postprocess_nodes(nodes: List[SectionNode]) -> List[SectionNode]:
         ):
             nxt = nodes[i + 1]
             if nxt.path[: len(current.path)] == current.path:
-                nxt.text = normalize_space(current.title + "\n\n" + nxt.text)
+                # Le titre seul est rattaché à la section suivante (plages concaténées)
+                nxt.spans = current.spans + nxt.spans
+                nxt.approx_tokens = approximate_tokens(nxt.text)
                 nxt.path = current.path[:-1] + nxt.path[-1:]
                 i += 1
                 continue
@@ -572,6 +732,187 @@ def extract_light_metadata(text: str, header_registry: Optional[Dict[str, object
     }
 
 
+# Suites de blancs horizontaux réellement modifiées par normalize_space
+# (tabulation, insécable ou plusieurs espaces) et sauts de ligne multiples :
+# mêmes substitutions, en une seule passe (les espaces simples ne sont pas visités)
+NORMALIZE_RUN_RE = re.compile(r"[ \t\u00A0]*[\t\u00A0][ \t\u00A0]*| {2,}|\n{3,}")
+
+
+class DocumentMetadataIndex:
+    """
+    Métadonnées d'un document entier, extraites en un seul balayage.
+
+    Le tampon source est normalisé une fois (avec correspondance des offsets),
+    chaque regex (articles, jurisprudence, montants, dates, entités) est
+    exécutée une seule fois sur tout le document, et les correspondances sont
+    ensuite attribuées aux sections selon leurs plages. Le contexte ±80
+    caractères des entités (rôle, camp) est évalué une seule fois, borné à la
+    section qui contient l'entité.
+    """
+
+    def __init__(self, buffer: str, section_spans: List[Span]):
+        """
+        Args:
+            buffer: Tampon source du document (SourceDocument.text)
+            section_spans: Plages des sections de premier niveau, dans l'ordre
+        """
+        self._build_normalized(buffer)
+
+        self._section_bounds = [self.normalized_range(span) for span in section_spans]
+        self._section_starts = [start for start, _end in self._section_bounds]
+
+        text = self.text
+        self.articles = [(m.start(), m.end(), m.group(0)) for m in ARTICLE_RE.finditer(text)]
+        self.caselaw = [(m.start(), m.end(), clean_caselaw_match(m.group(0))) for m in CASELAW_RE.finditer(text)]
+        self.amounts = [(m.start(), m.end(), m.group(0)) for m in MONEY_RE.finditer(text)]
+        self.dates = [(m.start(), m.end(), m.group(0)) for m in DATE_RE.finditer(text)]
+        self.entities = self._scan_entities()
+
+        self._article_starts = [m[0] for m in self.articles]
+        self._caselaw_starts = [m[0] for m in self.caselaw]
+        self._amount_starts = [m[0] for m in self.amounts]
+        self._date_starts = [m[0] for m in self.dates]
+        self._entity_starts = [m[0] for m in self.entities]
+
+    def _build_normalized(self, buffer: str) -> None:
+        """Normalise le tampon et mémorise les substitutions pour convertir les offsets."""
+        pieces: List[str] = []
+        # Substitutions modifiant la longueur : (offset source, fin source, offset normalisé, longueur remplacement)
+        self._sub_orig_starts: List[int] = []
+        self._subs: List[Tuple[int, int, int]] = []
+        pos = 0
+        norm_pos = 0
+        for m in NORMALIZE_RUN_RE.finditer(buffer):
+            pieces.append(buffer[pos:m.start()])
+            norm_pos += m.start() - pos
+            replacement = " " if m.group(0)[0] != "\n" else "\n\n"
+            pieces.append(replacement)
+            if m.end() - m.start() != len(replacement):
+                self._sub_orig_starts.append(m.start())
+                self._subs.append((m.end(), norm_pos, len(replacement)))
+            norm_pos += len(replacement)
+            pos = m.end()
+        pieces.append(buffer[pos:])
+        self.text = "".join(pieces)
+
+    def to_normalized(self, offset: int) -> int:
+        """Convertit un offset du tampon source en offset du texte normalisé."""
+        i = bisect.bisect_right(self._sub_orig_starts, offset) - 1
+        if i < 0:
+            return offset
+        orig_start = self._sub_orig_starts[i]
+        orig_end, norm_start, replacement_len = self._subs[i]
+        if offset < orig_end:
+            return norm_start + min(offset - orig_start, replacement_len)
+        return norm_start + replacement_len + (offset - orig_end)
+
+    def normalized_range(self, span: Span) -> Span:
+        """Plage normalisée d'une plage source, sans les blancs de bord (comme .strip())."""
+        text = self.text
+        start, end = self.to_normalized(span[0]), self.to_normalized(span[1])
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def normalized_length(self, span: Span) -> int:
+        """Longueur du texte normalisé d'une plage (len(materialize_spans(...)) pour une plage unique)."""
+        start, end = self.normalized_range(span)
+        return end - start
+
+    def _scan_entities(self) -> List[Tuple[int, int, int, str, Optional[str], Optional[str], Optional[str]]]:
+        """
+        Returns:
+            Liste triée de (début, fin, index du motif, nom, type, rôle, camp)
+        """
+        text = self.text
+        found = []
+        for pattern_idx, (_label, pattern, default_side, kind) in enumerate(PERSON_ENTITY_PATTERNS):
+            for match in pattern.finditer(text):
+                name = clean_entity_name(match.group(0), kind)
+                if not name:
+                    continue
+                section_start, section_end = self._containing_section(match.start())
+                context = text[max(section_start, match.start() - 80):min(section_end, match.end() + 80)]
+                role = infer_role(context, kind=kind)
+                side = infer_side(context, kind=kind) or default_side
+                found.append((match.start(), match.end(), pattern_idx, name, kind, role, side))
+        found.sort()
+        return found
+
+    def _containing_section(self, offset: int) -> Span:
+        i = bisect.bisect_right(self._section_starts, offset) - 1
+        if i < 0:
+            return 0, len(self.text)
+        return self._section_bounds[i]
+
+    @staticmethod
+    def _within(matches: list, starts: List[int], ranges: List[Span]) -> list:
+        """Correspondances entièrement contenues dans l'une des plages normalisées."""
+        selected = []
+        for start, end in ranges:
+            i = bisect.bisect_left(starts, start)
+            while i < len(matches) and matches[i][0] < end:
+                if matches[i][1] <= end:
+                    selected.append(matches[i])
+                i += 1
+        return selected
+
+    def metadata_for(
+        self,
+        spans: Tuple[Span, ...],
+        approx_tokens: int,
+        header_registry: Optional[Dict[str, object]] = None,
+    ) -> Dict[str, object]:
+        """
+        Métadonnées d'une section (ou d'une partie de section) à partir de ses plages,
+        au même format que extract_light_metadata.
+        """
+        ranges = [self.normalized_range(span) for span in spans]
+
+        articles = sorted({m[2] for m in self._within(self.articles, self._article_starts, ranges)})
+        caselaw = sorted({m[2] for m in self._within(self.caselaw, self._caselaw_starts, ranges)})
+        amounts = sorted({m[2] for m in self._within(self.amounts, self._amount_starts, ranges)})
+        dates = sorted({m[2] for m in self._within(self.dates, self._date_starts, ranges)})
+
+        # Même ordre que extract_entities : par motif, puis par position
+        entity_matches = sorted(
+            self._within(self.entities, self._entity_starts, ranges),
+            key=lambda m: (m[2], m[0]),
+        )
+        entities = [
+            {"name": name, "kind": kind, "role": role, "side": side}
+            for _start, _end, _idx, name, kind, role, side in entity_matches
+        ]
+        entities = [e for e in dedupe_entities(entities) if len(e["name"]) <= 120]
+        entities.sort(key=lambda x: (x.get("side") is None, x.get("role") is None, x["name"]))
+
+        if header_registry:
+            entities = [canonicalize_entity_against_registry(e, header_registry) for e in entities]
+
+        return {
+            "approx_tokens": approx_tokens,
+            "articles": articles[:30],
+            "caselaw": caselaw[:30],
+            "amounts": amounts[:30],
+            "dates": dates[:30],
+            "entities": entities[:20],
+        }
+
+
+def node_metadata(
+    source: SourceDocument,
+    spans: Tuple[Span, ...],
+    text: str,
+    header_registry: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    """Métadonnées via l'index du document s'il existe, sinon extraction sur le texte."""
+    if source.metadata is not None:
+        return source.metadata.metadata_for(spans, approximate_tokens(text), header_registry)
+    return extract_light_metadata(text, header_registry=header_registry)
+
+
 # ============================================================
 # Packeting algorithm
 # ============================================================
@@ -582,11 +923,32 @@ def build_packets(
     prompt_budget_tokens: int = 2500,
     output_budget_tokens: int = 3000,
     min_fill_ratio: float = 0.55,
+    mode: str = "greedy",
+    parent_split_penalty: float = 0.1,
+    token_counter: Optional[TokenCounter] = None,
 ) -> List[Packet]:
-    """Regroupe les sections en paquets respectant un budget de tokens."""
+    """
+    Regroupe les sections en paquets respectant un budget de tokens.
+
+    Args:
+        mode: "greedy" (remplissage séquentiel) ou "optimal" (nombre minimal
+            de paquets, puis tailles équilibrées, voir build_packets_optimal)
+        parent_split_penalty: Pénalité (mode optimal) pour une coupure entre
+            deux sections d'un même parent
+        token_counter: Compteur de tokens du modèle d'extraction (défaut :
+            approximate_tokens). Les sections sont recomptées en un seul lot.
+    """
     safe_content_budget = max_input_tokens - prompt_budget_tokens - output_budget_tokens
     if safe_content_budget <= 0:
         raise ValueError("Token budget too small after prompt/output reservation.")
+    if token_counter is not None:
+        recount_nodes(nodes, token_counter)
+    if mode == "optimal":
+        return build_packets_optimal(
+            nodes, safe_content_budget, parent_split_penalty=parent_split_penalty, token_counter=token_counter
+        )
+    if mode != "greedy":
+        raise ValueError(f"Unknown packing mode: {mode}")
 
     packets: List[Packet] = []
     current: List[SectionNode] = []
@@ -605,7 +967,7 @@ def build_packets(
 
         if node_tokens > safe_content_budget:
             flush()
-            split_nodes = split_oversized_node(node, safe_content_budget)
+            split_nodes = split_oversized_node(node, safe_content_budget, token_counter=token_counter)
             for split_node in split_nodes:
                 if split_node.approx_tokens > safe_content_budget:
                     raise ValueError(f"Node {split_node.id} still exceeds safe budget after splitting.")
@@ -640,21 +1002,107 @@ def build_packets(
     return packets
 
 
+def build_packets_optimal(
+    nodes: List[SectionNode],
+    safe_content_budget: int,
+    parent_split_penalty: float = 0.1,
+    token_counter: Optional[TokenCounter] = None,
+) -> List[Packet]:
+    """
+    Découpage optimal des sections en paquets contigus (programmation dynamique).
+
+    Objectif, par ordre de priorité :
+    1. nombre minimal de paquets (appels LLM) ;
+    2. coût = somme des (taille / budget)² + parent_split_penalty par coupure
+       entre deux sections d'un même parent (shared_parent). Le carré favorise
+       des paquets de tailles proches : le temps de l'extraction parallèle est
+       fixé par le plus gros paquet.
+
+    Les sections trop grosses sont d'abord découpées (split_oversized_node) ;
+    leurs parties se regroupent ensuite comme les autres sections.
+    """
+    items: List[SectionNode] = []
+    for node in nodes:
+        if node.approx_tokens > safe_content_budget:
+            for split_node in split_oversized_node(node, safe_content_budget, token_counter=token_counter):
+                if split_node.approx_tokens > safe_content_budget:
+                    raise ValueError(f"Node {split_node.id} still exceeds safe budget after splitting.")
+                items.append(split_node)
+        else:
+            items.append(node)
+    if not items:
+        return []
+
+    n = len(items)
+    # best[i] = (nombre de paquets, coût) optimal pour les i premières sections
+    best: List[Tuple[int, float]] = [(0, 0.0)] + [(n + 1, math.inf)] * n
+    cut_before: List[int] = [0] * (n + 1)
+
+    for i in range(1, n + 1):
+        size = 0
+        for j in range(i - 1, -1, -1):
+            # Paquet candidat : items[j:i]
+            size += items[j].approx_tokens
+            if size > safe_content_budget:
+                break
+            count, cost = best[j]
+            cost += (size / safe_content_budget) ** 2
+            if j > 0 and shared_parent(items[j - 1], items[j]):
+                cost += parent_split_penalty
+            candidate = (count + 1, cost)
+            if candidate < best[i]:
+                best[i] = candidate
+                cut_before[i] = j
+
+    bounds: List[Tuple[int, int]] = []
+    i = n
+    while i > 0:
+        bounds.append((cut_before[i], i))
+        i = cut_before[i]
+    bounds.reverse()
+
+    return [make_packet(num, items[start:end]) for num, (start, end) in enumerate(bounds, start=1)]
+
+
+def recount_nodes(nodes: List[SectionNode], token_counter: TokenCounter) -> None:
+    """Recompte les tokens de toutes les sections en un seul appel au compteur."""
+    counts = token_counter.count_batch([node.text for node in nodes])
+    for node, count in zip(nodes, counts):
+        node.approx_tokens = count
+        node.meta["approx_tokens"] = count
+
+
 def shared_parent(a: SectionNode, b: SectionNode, depth: int = 2) -> bool:
     return a.path[:depth] == b.path[:depth]
 
 
-def split_oversized_node(node: SectionNode, safe_content_budget: int, header_registry: Optional[Dict[str, object]] = None) -> List[SectionNode]:
-    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", node.text) if p.strip()]
+PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+SENTENCE_BREAK_RE = re.compile(r"(?<=[\.!?;:])\s+(?=[A-ZÉÈÀÙÂÊÎÔÛÇ])")
+
+
+def split_oversized_node(
+    node: SectionNode,
+    safe_content_budget: int,
+    header_registry: Optional[Dict[str, object]] = None,
+    token_counter: Optional[TokenCounter] = None,
+) -> List[SectionNode]:
+    buffer = node.source.text
+    paragraphs = [p for span in node.spans for p in split_spans(buffer, span, PARAGRAPH_BREAK_RE)]
     if len(paragraphs) <= 1:
-        paragraphs = split_sentences(node.text)
+        paragraphs = [p for span in node.spans for p in split_spans(buffer, span, SENTENCE_BREAK_RE)]
 
-    groups: List[List[str]] = []
-    current_group: List[str] = []
+    def count_all(texts: List[str]) -> List[int]:
+        if token_counter is not None:
+            return token_counter.count_batch(texts)
+        return [approximate_tokens(text) for text in texts]
+
+    paragraph_tokens = count_all([materialize_spans(buffer, (para,)) for para in paragraphs])
+
+    groups: List[List[Span]] = []
+    current_group: List[Span] = []
     current_tokens = 0
 
-    for para in paragraphs:
-        para_tokens = approximate_tokens(para)
+    for para, para_tokens in zip(paragraphs, paragraph_tokens):
         if current_group and current_tokens + para_tokens > safe_content_budget:
             groups.append(current_group)
             current_group = [para]
@@ -665,9 +1113,14 @@ def split_oversized_node(node: SectionNode, safe_content_budget: int, header_reg
     if current_group:
         groups.append(current_group)
 
+    part_texts = [materialize_spans(buffer, tuple(group)) for group in groups]
+    part_tokens = count_all(part_texts)
+
     split_nodes: List[SectionNode] = []
-    for i, group in enumerate(groups, start=1):
-        text = normalize_space("\n\n".join(group))
+    for i, (group, text, tokens) in enumerate(zip(groups, part_texts, part_tokens), start=1):
+        spans = tuple(group)
+        meta = node_metadata(node.source, spans, text, header_registry=header_registry)
+        meta["approx_tokens"] = tokens
         split_nodes.append(
             SectionNode(
                 id=f"{node.id}_{i}",
@@ -675,17 +1128,19 @@ def split_oversized_node(node: SectionNode, safe_content_budget: int, header_reg
                 level=node.level,
                 start_line=node.start_line,
                 end_line=node.end_line,
-                text=text,
+                source=node.source,
+                spans=spans,
                 section_type=node.section_type,
+                approx_tokens=tokens,
                 path=node.path + [f"part {i}/{len(groups)}"],
-                meta=extract_light_metadata(text, header_registry=header_registry),
+                meta=meta,
             )
         )
     return split_nodes
 
 
 def split_sentences(text: str) -> List[str]:
-    parts = re.split(r"(?<=[\.!?;:])\s+(?=[A-ZÉÈÀÙÂÊÎÔÛÇ])", normalize_space(text))
+    parts = SENTENCE_BREAK_RE.split(normalize_space(text))
     return [p.strip() for p in parts if p.strip()]
 
 
@@ -772,6 +1227,92 @@ def build_extraction_system_prompt() -> str:
     )
 
 
+def _string_array() -> Dict[str, object]:
+    return {"type": "array", "items": {"type": "string"}}
+
+
+def _closed_object(properties: Dict[str, object]) -> Dict[str, object]:
+    """Objet dont tous les champs sont requis (mode strict des sorties structurées)."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+SIDE_SCHEMA = {"type": ["string", "null"], "enum": ["current_party", "opposing_party", "neutral", None]}
+LEVEL_SCHEMA = {"type": "string", "enum": ["high", "medium", "low"]}
+
+EXTRACTION_SECTION_SCHEMA = _closed_object({
+    "title": {"type": "string"},
+    "path": _string_array(),
+    "section_type": {"type": "string", "enum": ["header", "facts", "procedure", "discussion", "claims", "argument", "other"]},
+    "participants": {
+        "type": "array",
+        "items": _closed_object({
+            "name": {"type": "string"},
+            "kind": {"type": "string", "enum": ["person", "organization", "institution", "lawyer", "institutional_actor"]},
+            "role": {"type": "string"},
+            "side": SIDE_SCHEMA,
+        }),
+    },
+    "thesis": {"type": "string"},
+    "facts": _string_array(),
+    "arguments": _string_array(),
+    "rebuttals": _string_array(),
+    "legal_references": _string_array(),
+    "pieces_cited": _string_array(),
+    "dates_amounts": _string_array(),
+    "requests": _string_array(),
+    "key_source_excerpt": {"type": "string"},
+    "key_verbatim_points": _string_array(),
+    "compression_ratio_hint": {"type": "string", "enum": ["low", "medium", "high"]},
+    "importance": LEVEL_SCHEMA,
+    "argument_density": LEVEL_SCHEMA,
+})
+
+# Version JSON Schema de la structure cible de build_extraction_user_prompt
+# (sorties structurées du fournisseur + validation locale)
+EXTRACTION_JSON_SCHEMA = _closed_object({
+    "packet_id": {"type": "string"},
+    "document_role": {"type": "string", "enum": ["appelant", "intimé", "demandeur", "défendeur", "inconnu"]},
+    "packet_summary": {"type": "string"},
+    "sections": {"type": "array", "items": EXTRACTION_SECTION_SCHEMA},
+    "carry_forward": _closed_object({
+        "main_issues": _string_array(),
+        "open_threads": _string_array(),
+        "claims_block_present": {"type": "boolean"},
+        "participants_to_track": {
+            "type": "array",
+            "items": _closed_object({
+                "name": {"type": "string"},
+                "role": {"type": "string"},
+                "side": SIDE_SCHEMA,
+            }),
+        },
+    }),
+})
+
+
+def build_fragment_repair_prompt(fragment: object, errors: List[str]) -> str:
+    """Prompt de correction d'un fragment d'extraction non conforme au schéma."""
+    return f"""
+Le fragment JSON ci-dessous, issu d'une extraction de conclusions, ne respecte pas le schéma attendu.
+
+ERREURS DÉTECTÉES
+{chr(10).join(f"- {error}" for error in errors)}
+
+TÂCHE
+Retournez le fragment corrigé, conforme au schéma, en conservant tout son contenu.
+Ne modifiez que ce qui est nécessaire pour corriger les erreurs ; pour un champ manquant,
+utilisez une valeur vide ("" ou []) ou la valeur la plus prudente.
+
+FRAGMENT
+{json.dumps(fragment, ensure_ascii=False, indent=2)}
+""".strip()
+
+
 def build_extraction_user_prompt(packet: Packet) -> str:
     """Construit le prompt utilisateur pour un paquet donné."""
     schema = {
@@ -862,17 +1403,129 @@ def build_final_system_prompt(prompt_type: str = "resume_conclusions") -> str:
         raise ValueError(f"Type de prompt inconnu: {prompt_type}. Valeurs possibles: {list(prompt_files.keys())}")
 
     try:
-        return prompt_file.read_text(encoding="utf-8")
+        return get_corpus().read_text(prompt_file)
     except FileNotFoundError:
         raise FileNotFoundError(f"Fichier prompt non trouvé: {prompt_file}")
 
 
+def _is_empty(value: object) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _drop_empty(value: object) -> object:
+    """Retire récursivement les champs vides (None, "", [], {})."""
+    if isinstance(value, dict):
+        cleaned = {key: _drop_empty(item) for key, item in value.items()}
+        return {key: item for key, item in cleaned.items() if not _is_empty(item)}
+    if isinstance(value, list):
+        cleaned = [_drop_empty(item) for item in value]
+        return [item for item in cleaned if not _is_empty(item)]
+    return value
+
+
+def compact_extracted_jsons(extracted_packets_json: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """
+    Compacte les JSON intermédiaires avant la synthèse finale :
+    - champs vides retirés ("rebuttals": [], "side": null...) ;
+    - paquets en erreur réduits à un marqueur (sans réponse brute) ;
+    - participants de carry_forward.participants_to_track déjà cités par un
+      paquet précédent retirés.
+    Les JSON d'origine ne sont pas modifiés.
+    """
+    compacted = []
+    seen_participants = set()
+    for packet_json in extracted_packets_json:
+        if "error" in packet_json:
+            compacted.append({"packet_id": packet_json.get("packet_id"), "error": "extraction indisponible"})
+            continue
+        packet_json = _drop_empty(packet_json)
+        carry_forward = packet_json.get("carry_forward")
+        if isinstance(carry_forward, dict) and isinstance(carry_forward.get("participants_to_track"), list):
+            kept = []
+            for participant in carry_forward["participants_to_track"]:
+                if not isinstance(participant, dict):
+                    kept.append(participant)
+                    continue
+                key = (
+                    str(participant.get("name", "")).casefold().strip(),
+                    str(participant.get("role", "")).casefold().strip(),
+                    participant.get("side"),
+                )
+                if key not in seen_participants:
+                    seen_participants.add(key)
+                    kept.append(participant)
+            carry_forward = _drop_empty({**carry_forward, "participants_to_track": kept})
+            packet_json = {**packet_json, "carry_forward": carry_forward} if carry_forward else {
+                key: value for key, value in packet_json.items() if key != "carry_forward"
+            }
+        compacted.append(packet_json)
+    return compacted
+
+
+def _format_lines(value: object, indent: str = "") -> List[str]:
+    """Rendu ligne à ligne (clé: valeur, listes en tirets) d'une valeur JSON."""
+    lines = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, list) and all(isinstance(x, str) and len(x) <= 60 for x in item):
+                # Liste de valeurs courtes (path, dates, pièces...) : sur une ligne
+                lines.append(f"{indent}{key}: {' | '.join(item)}")
+            elif isinstance(item, (dict, list)):
+                lines.append(f"{indent}{key}:")
+                lines.extend(_format_lines(item, indent + "  "))
+            else:
+                lines.append(f"{indent}{key}: {item}")
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                inner = _format_lines(item, indent + "  ")
+                lines.append(f"{indent}- {inner[0].lstrip()}" if inner else f"{indent}-")
+                lines.extend(inner[1:])
+            elif isinstance(item, list):
+                lines.append(f"{indent}-")
+                lines.extend(_format_lines(item, indent + "  "))
+            else:
+                lines.append(f"{indent}- {item}")
+    else:
+        lines.append(f"{indent}{value}")
+    return lines
+
+
+# Formats de sérialisation des données intermédiaires du prompt final
+FINAL_PROMPT_SERIALIZATIONS = ("indent", "json", "lines")
+
+
+def serialize_extracted_jsons(extracted_packets_json: List[Dict[str, object]], serialization: str = "json") -> str:
+    """
+    Sérialise les JSON intermédiaires pour le prompt final.
+
+    Args:
+        extracted_packets_json: JSON intermédiaires des paquets
+        serialization:
+            - "indent" : JSON indenté, sans compaction (format historique)
+            - "json"   : JSON compacté et minifié
+            - "lines"  : JSON compacté, rendu en lignes "clé: valeur" / "- élément"
+
+    Returns:
+        Le texte inséré dans le prompt final
+    """
+    if serialization == "indent":
+        return json.dumps(extracted_packets_json, ensure_ascii=False, indent=2)
+    compacted = compact_extracted_jsons(extracted_packets_json)
+    if serialization == "json":
+        return json.dumps(compacted, ensure_ascii=False, separators=(",", ":"))
+    if serialization == "lines":
+        return "\n\n".join("\n".join(_format_lines(packet_json)) for packet_json in compacted)
+    raise ValueError(f"Sérialisation inconnue: {serialization}. Valeurs possibles: {list(FINAL_PROMPT_SERIALIZATIONS)}")
+
+
 def build_final_user_prompt(
     extracted_packets_json: List[Dict[str, object]],
     mode: str = "resume_global",
     max_pages_hint: int = 5,
+    serialization: str = "json",
 ) -> str:
-    """Construit le prompt final à partir des JSON intermédiaires."""
+    """Construit le prompt final à partir des JSON intermédiaires (voir serialize_extracted_jsons)."""
     mode_instructions = {
         "resume_global": "Produisez un résumé structuré complet : parties, faits, procédure, prétentions si présentes, puis moyens de façon substantielle. Lorsque les données intermédiaires contiennent des extraits source ou des points verbatim, utilisez-les comme ancrages de fidélité sans transformer le résumé en compilation de citations.",
         "faits_procedure": "Produisez uniquement les faits et la procédure, sans développer les moyens sauf mention minimale de leur objet.",
@@ -893,10 +1546,81 @@ CONTRAINTE DE LONGUEUR
 Visez un document d'environ {max_pages_hint} pages maximum à densité normale.
 
 DONNÉES INTERMÉDIAIRES
-{json.dumps(extracted_packets_json, ensure_ascii=False, indent=2)}
+{serialize_extracted_jsons(extracted_packets_json, serialization)}
 """.strip()
 
 
+def build_merge_system_prompt() -> str:
+    """Prompt système de fusion de JSON intermédiaires consécutifs (réduction hiérarchique)."""
+    return normalize_space(
+        """
+        Rôle
+        Vous êtes un assistant juridique français chargé de fusionner les extractions intermédiaires de plusieurs paquets consécutifs d'un même document.
+
+        Objectif
+        Produire une seule extraction intermédiaire, au même format que les extractions reçues, plus courte que leur somme, sans rédiger le résumé final.
+
+        Règles
+        - Utiliser uniquement les informations présentes dans les extractions reçues.
+        - Ne rien inventer.
+        - Conserver l'ordre du document et les intitulés exacts des sections.
+        - Regrouper les sections redondantes et supprimer les répétitions.
+        - Conserver les dates, montants, articles, jurisprudences, pièces, participants et prétentions.
+        - Ne pas fusionner des positions distinctes ; conserver l'attribution de chaque position (partie, camp).
+        - Raccourcir en priorité les extraits source et points verbatim redondants.
+        - Respecter la taille cible indiquée par l'utilisateur.
+
+        Format de sortie
+        Retourner exclusivement un JSON valide conforme au schéma d'extraction, sans texte avant ou après.
+        """
+    )
+
+
+def build_merge_user_prompt(
+    extracted_packets_json: List[Dict[str, object]],
+    target_tokens: int,
+    serialization: str = "json",
+) -> str:
+    """Prompt utilisateur de fusion d'un groupe de JSON intermédiaires consécutifs."""
+    return f"""
+TÂCHE
+Fusionnez les {len(extracted_packets_json)} extractions consécutives ci-dessous en une seule extraction,
+au même format (packet_id, document_role, packet_summary, sections, carry_forward).
+
+TAILLE CIBLE
+Environ {target_tokens:,} tokens au maximum pour le JSON fusionné.
+
+EXTRACTIONS À FUSIONNER
+{serialize_extracted_jsons(extracted_packets_json, serialization)}
+""".strip()
+
+
+def group_for_merge(sizes: List[int], budget_tokens: int) -> List[List[int]]:
+    """
+    Regroupe des extractions consécutives pour la réduction hiérarchique.
+
+    Args:
+        sizes: Taille (tokens) de chaque extraction, dans l'ordre du document
+        budget_tokens: Taille maximale (tokens) des extractions d'un groupe
+
+    Returns:
+        Groupes contigus d'indices ; une extraction dépassant seule le budget
+        forme son propre groupe
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, size in enumerate(sizes):
+        if current and current_tokens + size > budget_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += size
+    if current:
+        groups.append(current)
+    return groups
+
+
 # ============================================================
 # Main pipeline function
 # ============================================================
@@ -906,25 +1630,58 @@ def parse_and_packetize(
     max_input_tokens: int = 42000,
     prompt_budget_tokens: int = 2500,
     output_budget_tokens: int = 3000,
+    packing_mode: str = "greedy",
+    token_counter: Optional[TokenCounter] = None,
+    header_registry: Optional[Dict[str, object]] = None,
 ) -> Tuple[List[SectionNode], List[Packet]]:
     """
     Pipeline principal :
-    1. parsing du document,
-    2. découpage en paquets.
+    1. parsing du document (header_registry : voir parse_document),
+    2. découpage en paquets (packing_mode : "greedy" ou "optimal"), les
+       tokens étant comptés avec token_counter s'il est fourni.
     """
-    nodes = parse_document(source_text)
+    nodes = parse_document(source_text, header_registry=header_registry)
     packets = build_packets(
         nodes,
         max_input_tokens=max_input_tokens,
         prompt_budget_tokens=prompt_budget_tokens,
         output_budget_tokens=output_budget_tokens,
+        mode=packing_mode,
+        token_counter=token_counter,
     )
     return nodes, packets
 
 
-def compute_compressed_tokens(extracted_jsons: List[Dict[str, object]]) -> int:
+def compute_compressed_tokens(
+    extracted_jsons: List[Dict[str, object]],
+    token_counter: Optional[TokenCounter] = None,
+) -> int:
     """
     Calcule le nombre de tokens du contenu compressé (JSON intermédiaires).
     """
     compressed_text = json.dumps(extracted_jsons, ensure_ascii=False)
+    if token_counter is not None:
+        return token_counter.count(compressed_text)
     return approximate_tokens(compressed_text)
+
+
+def compute_serialization_savings(
+    extracted_jsons: List[Dict[str, object]],
+    serialization: str = "json",
+    token_counter: Optional[TokenCounter] = None,
+) -> Dict[str, object]:
+    """
+    Tokens des données intermédiaires du prompt final : format historique
+    (JSON indenté complet) contre la sérialisation retenue.
+    """
+    count = token_counter.count if token_counter is not None else approximate_tokens
+    tokens_before = count(serialize_extracted_jsons(extracted_jsons, "indent"))
+    tokens_after = count(serialize_extracted_jsons(extracted_jsons, serialization))
+    saved = tokens_before - tokens_after
+    return {
+        "serialization": serialization,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "saved_tokens": saved,
+        "saved_pct": round(saved / tokens_before * 100, 1) if tokens_before else 0.0,
+    }
@@ -0,0 +1,169 @@
+"""
+Documents de la conversation, conservés une seule fois par session.
+
+Les conclusions collées dans le chat (ou envoyées depuis l'onglet "Fichiers
+de conclusions") font souvent plusieurs dizaines de milliers de caractères.
+Plutôt que de les garder dans chaque message de l'historique et dans les
+infos de compression, le magasin les conserve une fois, par empreinte
+SHA-256 (un même dossier envoyé deux fois n'est stocké qu'une fois) ; les
+messages ne portent qu'une référence ("doc_ref") et un libellé court.
+
+Pour les relances, l'historique envoyé au modèle est reconstruit à partir
+des références (api_messages) : le document du dernier message est toujours
+transmis en entier, les documents des tours précédents peuvent être
+renvoyés en entier, remplacés par une mention (la synthèse du modèle figure
+déjà dans sa réponse) ou réduits aux sections choisies.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from checkpoints import document_hash
+from document_compression import parse_document
+from parse_cache import cached_extract_header_registry
+
+# Contenu au-delà duquel un message est rangé dans le magasin (même seuil que l'aperçu du chat)
+STORE_MIN_CHARS = 1500
+
+# Document des tours précédents renvoyé lors d'une relance
+FOLLOW_UP_FULL = "complet"
+FOLLOW_UP_SUMMARY = "resume"
+FOLLOW_UP_SECTIONS = "sections"
+
+
+@dataclass
+class StoredDocument:
+    """Document conservé par le magasin ; sections parsées à la demande."""
+    doc_hash: str
+    text: str
+    label: str
+    _sections: Optional[List[Tuple[str, str]]] = field(default=None, repr=False)
+
+    @property
+    def chars(self) -> int:
+        return len(self.text)
+
+    @property
+    def placeholder(self) -> str:
+        """Contenu affiché dans l'historique à la place du document."""
+        return f"[{self.label} - {self.chars:,} caractères]"
+
+    def sections(self) -> List[Tuple[str, str]]:
+        """Sections (titre, texte) du document, dans l'ordre."""
+        if self._sections is None:
+            registry = cached_extract_header_registry(self.text)
+            self._sections = [(node.title, node.text) for node in parse_document(self.text, header_registry=registry)]
+        return self._sections
+
+
+class DocumentStore:
+    """Documents de la session, indexés par empreinte du contenu."""
+
+    def __init__(self):
+        self._documents: Dict[str, StoredDocument] = {}
+        self.puts = 0
+
+    def put(self, text: str, label: str = "Document") -> str:
+        """
+        Range un document (une seule fois par contenu) et retourne sa référence.
+
+        Args:
+            text: Contenu du document
+            label: Libellé affiché (conservé depuis le premier ajout)
+
+        Returns:
+            Empreinte SHA-256 du contenu
+        """
+        ref = document_hash(text)
+        self.puts += 1
+        if ref not in self._documents:
+            self._documents[ref] = StoredDocument(ref, text, label)
+        return ref
+
+    def get(self, ref: str) -> StoredDocument:
+        """
+        Raises:
+            KeyError: si la référence est inconnue de la session
+        """
+        return self._documents[ref]
+
+    def text(self, ref: Optional[str], default: str = "") -> str:
+        """Contenu d'une référence (default si elle est absente ou inconnue)."""
+        document = self._documents.get(ref) if ref else None
+        return document.text if document is not None else default
+
+    def message(self, role: str, content: str, label: str = "Document") -> Dict[str, object]:
+        """Message d'historique : les contenus volumineux sont remplacés par une référence."""
+        if len(content) < STORE_MIN_CHARS:
+            return {"role": role, "content": content}
+        ref = self.put(content, label)
+        return {"role": role, "content": self._documents[ref].placeholder, "doc_ref": ref}
+
+    def full_content(self, message: Dict[str, object]) -> str:
+        """Contenu complet d'un message d'historique (document résolu)."""
+        return self.text(message.get("doc_ref"), message["content"])
+
+    def latest(self, messages: Sequence[Dict[str, object]]) -> Optional[StoredDocument]:
+        """Dernier document référencé par l'historique."""
+        for message in reversed(messages):
+            if message.get("doc_ref") in self._documents:
+                return self._documents[message["doc_ref"]]
+        return None
+
+    def api_messages(
+        self,
+        messages: Sequence[Dict[str, object]],
+        follow_up: str = FOLLOW_UP_FULL,
+        sections: Sequence[int] = (),
+    ) -> List[Dict[str, str]]:
+        """
+        Historique à envoyer au modèle (role/content), documents résolus.
+
+        Args:
+            messages: Historique de la session (messages avec ou sans doc_ref)
+            follow_up: Traitement des documents des tours précédents
+                (FOLLOW_UP_FULL, FOLLOW_UP_SUMMARY ou FOLLOW_UP_SECTIONS)
+            sections: Indices des sections à renvoyer (FOLLOW_UP_SECTIONS)
+
+        Returns:
+            Liste de messages {"role", "content"} ; un document transmis en
+            entier porte aussi sa référence ("digest"), qui sert de clé aux
+            comptes de tokens (token_counting.count_messages_tokens) sans
+            rehacher le document
+        """
+        last_user = max((i for i, m in enumerate(messages) if m["role"] == "user"), default=-1)
+        resolved = []
+        for i, message in enumerate(messages):
+            ref = message.get("doc_ref")
+            if ref not in self._documents:
+                resolved.append({"role": message["role"], "content": message["content"]})
+            elif i == last_user or follow_up == FOLLOW_UP_FULL:
+                resolved.append({"role": message["role"], "content": self._documents[ref].text, "digest": ref})
+            else:
+                content = self.follow_up_content(self._documents[ref], follow_up, sections)
+                resolved.append({"role": message["role"], "content": content})
+        return resolved
+
+    def follow_up_content(self, document: StoredDocument, follow_up: str, sections: Sequence[int]) -> str:
+        """Contenu d'un document déjà transmis, tel que renvoyé lors d'une relance."""
+        if follow_up == FOLLOW_UP_SECTIONS and sections:
+            available = document.sections()
+            parts = [available[i][1] for i in sections if 0 <= i < len(available)]
+            if parts:
+                return (
+                    f"[{document.label} déjà transmis ({document.chars:,} caractères) ; "
+                    f"sections renvoyées pour cette relance :]\n\n" + "\n\n".join(parts)
+                )
+        return (
+            f"[{document.label} déjà transmis au tour précédent ({document.chars:,} caractères) : "
+            f"sa synthèse figure dans la réponse qui suit.]"
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": len(self._documents),
+            "chars": sum(d.chars for d in self._documents.values()),
+            "puts": self.puts,
+        }
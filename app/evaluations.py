@@ -0,0 +1,192 @@
+"""
+File d'attente des évaluations Magistral.
+
+L'évaluation d'une réponse par un modèle de raisonnement prend souvent plus
+de temps que la réponse elle-même : elle ne doit pas retarder son affichage.
+Les évaluations sont donc soumises à une file partagée par le processus et
+exécutées par un thread de répartition ; la session récupère le résultat
+au rerun suivant, par sa clé.
+
+- Déduplication : la clé est l'empreinte (type de prompt, document source,
+  réponse) ; une évaluation déjà obtenue ou en cours n'est pas relancée
+  (les résultats en erreur sont relancés à la soumission suivante).
+- Lots : les évaluations en attente sont prises ensemble (au plus
+  batch_size) et exécutées en parallèle ; le lot suivant part quand le
+  précédent est terminé, ce qui borne le nombre d'appels simultanés.
+- Les résultats sont gardés en mémoire (LRU borné). Un résultat attendu
+  par une session (soumis, pas encore récupéré par collect) n'est jamais
+  évincé ; une clé inconnue de la file est rendue comme expirée, pour que
+  la session cesse de l'attendre.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_MAX_RESULTS = 256
+
+EvaluateFn = Callable[[str, str, str], Dict[str, object]]
+
+EXPIRED_RESULT = {"error": "Évaluation expirée (résultat non conservé), relancez la question pour la réévaluer"}
+
+
+def evaluation_key(document_source: str, reponse_llm: str, prompt_type: str) -> str:
+    """Empreinte SHA-256 d'une évaluation (type de prompt, document source, réponse)."""
+    h = hashlib.sha256()
+    for part in (prompt_type, document_source, reponse_llm):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class EvaluationQueue:
+    """
+    File des évaluations : soumission par clé, exécution par lots dans un
+    thread de répartition, résultats mémorisés.
+    """
+
+    def __init__(self, evaluate: EvaluateFn, batch_size: int = DEFAULT_BATCH_SIZE, max_results: int = DEFAULT_MAX_RESULTS):
+        self.evaluate = evaluate
+        self.batch_size = max(1, batch_size)
+        self.max_results = max_results
+        self.batches = 0
+        self.deduplicated = 0
+        self._pending: "OrderedDict[str, Tuple[str, str, str]]" = OrderedDict()
+        self._running: Dict[str, Tuple[str, str, str]] = {}
+        self._results: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        # Nombre de sessions en attente du résultat de chaque clé (soumis, pas encore récupéré)
+        self._waiters: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=self.batch_size, thread_name_prefix="evaluation")
+        self._dispatcher = threading.Thread(target=self._dispatch, name="evaluation-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, document_source: str, reponse_llm: str, prompt_type: str) -> str:
+        """
+        Place une évaluation dans la file (sauf si elle est déjà obtenue ou en cours).
+
+        Returns:
+            Clé de l'évaluation (voir collect)
+        """
+        key = evaluation_key(document_source, reponse_llm, prompt_type)
+        with self._condition:
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            cached = self._results.get(key)
+            if (cached is not None and "error" not in cached) or key in self._pending or key in self._running:
+                self.deduplicated += 1
+                return key
+            self._results.pop(key, None)
+            self._pending[key] = (document_source, reponse_llm, prompt_type)
+            self._condition.notify()
+        print(f"🎯 Évaluation {key[:12]} en file ({len(self._pending)} en attente)", flush=True)
+        return key
+
+    def finished(self, key: str) -> bool:
+        """True si le résultat est disponible (ou expiré) : collect ne retournera pas None."""
+        with self._condition:
+            return key not in self._pending and key not in self._running
+
+    def collect(self, key: str) -> Optional[Dict[str, object]]:
+        """
+        Récupère le résultat d'une évaluation soumise (une fois par soumission).
+
+        Returns:
+            Le résultat, None si l'évaluation n'est pas terminée, ou
+            EXPIRED_RESULT si la clé est inconnue de la file
+        """
+        with self._condition:
+            if key in self._pending or key in self._running:
+                return None
+            self._release(key)
+            result = self._results.get(key)
+            if result is None:
+                return dict(EXPIRED_RESULT)
+            self._results.move_to_end(key)
+            self._evict()
+            return result
+
+    def release(self, key: str) -> None:
+        """Abandonne l'attente d'un résultat (conversation réinitialisée) : il redevient évinçable."""
+        with self._condition:
+            self._release(key)
+            self._evict()
+
+    def _release(self, key: str) -> None:
+        waiters = self._waiters.get(key, 0) - 1
+        if waiters > 0:
+            self._waiters[key] = waiters
+        else:
+            self._waiters.pop(key, None)
+
+    def _evict(self) -> None:
+        """Éviction LRU des résultats qu'aucune session n'attend (appelé sous le verrou)."""
+        excess = len(self._results) - self.max_results
+        if excess <= 0:
+            return
+        for key in [k for k in self._results if k not in self._waiters][:excess]:
+            del self._results[key]
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._pending) + len(self._running)
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                batch: List[Tuple[str, Tuple[str, str, str]]] = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popitem(last=False))
+                self._running.update(batch)
+            start = time.time()
+            print(f"🎯 Lot de {len(batch)} évaluation(s) Magistral", flush=True)
+            results = list(self._executor.map(lambda item: self._evaluate_one(*item[1]), batch))
+            with self._condition:
+                self.batches += 1
+                for (key, _params), result in zip(batch, results):
+                    self._running.pop(key, None)
+                    self._results[key] = result
+                self._evict()
+            print(f"🎯 Lot de {len(batch)} évaluation(s) terminé en {time.time() - start:.1f}s", flush=True)
+
+    def _evaluate_one(self, document_source: str, reponse_llm: str, prompt_type: str) -> Dict[str, object]:
+        try:
+            return self.evaluate(document_source, reponse_llm, prompt_type)
+        except Exception as e:
+            traceback.print_exc()
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "running": len(self._running),
+                "results": len(self._results),
+                "awaited": len(self._waiters),
+                "batches": self.batches,
+                "deduplicated": self.deduplicated,
+            }
+
+
+_queue: Optional[EvaluationQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_evaluation_queue(evaluate: EvaluateFn) -> EvaluationQueue:
+    """File partagée du processus (EVALUATION_BATCH_SIZE pour changer la taille des lots)."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                batch_size = int(os.getenv("EVALUATION_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+                _queue = EvaluationQueue(evaluate, batch_size=batch_size)
+    return _queue
@@ -0,0 +1,174 @@
+"""
+Cache persistant des extractions par paquet.
+
+La clé est une empreinte SHA-256 de (modèle, température, prompt système,
+prompt utilisateur) : si un paquet est ré-extrait à l'identique (même dossier,
+même découpage), le JSON déjà obtenu est réutilisé sans appel LLM.
+
+Stockage SQLite sur disque, borné en taille avec éviction LRU
+(date du dernier accès), et compteurs de hits / misses. Les dates d'accès
+des hits sont écrites par lots (au plus LAST_ACCESS_BATCH hits en attente,
+et avant chaque écriture ou éviction) plutôt qu'à chaque lecture.
+
+Les méthodes sont bloquantes (SQLite) : depuis la boucle asyncio, elles sont
+appelées via asyncio.to_thread.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / ".cache" / "extraction_cache.sqlite"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200 Mo
+LAST_ACCESS_BATCH = 32
+
+
+def make_cache_key(
+    model_id: str,
+    temperature: float,
+    system_prompt: str,
+    user_prompt: str,
+    response_format: Optional[Dict[str, object]] = None,
+) -> str:
+    """
+    Empreinte de la requête d'extraction (champs séparés par un octet nul).
+
+    Le format de réponse imposé (JSON Schema des sorties structurées, ou texte
+    libre s'il est absent) fait partie de la clé : changer de mode ou de
+    schéma ne réutilise pas les extractions obtenues avec l'ancien.
+    """
+    response_format_part = json.dumps(response_format, sort_keys=True, ensure_ascii=False) if response_format else "texte"
+    h = hashlib.sha256()
+    for part in (model_id, repr(float(temperature)), system_prompt, user_prompt, response_format_part):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Cache clé → JSON extrait, persistant et borné en taille (LRU).
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Dates d'accès des hits pas encore écrites (clé → date)
+        self._accessed: Dict[str, float] = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON extractions(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= LAST_ACCESS_BATCH:
+                self._write_accesses()
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, object]) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._accessed.pop(key, None)
+            self._write_accesses()
+            self._evict()
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """Écrit les dates d'accès en attente."""
+        with self._lock:
+            if self._accessed:
+                self._write_accesses()
+                self._conn.commit()
+
+    def _write_accesses(self) -> None:
+        """Reporte les dates d'accès en attente dans la table (appelé sous le verrou)."""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE extractions SET last_access = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM extractions ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache: Optional[ExtractionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Cache partagé du processus (chemin surchargeable via EXTRACTION_CACHE_PATH)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.getenv("EXTRACTION_CACHE_PATH") or DEFAULT_CACHE_PATH
+                _cache = ExtractionCache(Path(path))
+                atexit.register(_cache.flush)
+    return _cache
@@ -0,0 +1,208 @@
+"""
+Exécution des pipelines longs en arrière-plan.
+
+Les pipelines (compression par paquets, compression simplifiée, appel direct)
+peuvent durer plusieurs minutes : plutôt que de bloquer le thread du script
+Streamlit, ils sont soumis à un pool de workers partagé par le processus.
+
+- Chaque job est enregistré dans une table SQLite (statut, progression,
+  paramètres, résultat ou erreur), ce qui permet de le retrouver après un
+  rafraîchissement du navigateur (identifiant conservé dans l'URL).
+- Les handlers ne doivent pas utiliser l'API Streamlit : ils reçoivent leurs
+  paramètres et une fonction report(message) pour la progression, et
+  retournent un dictionnaire sérialisable en JSON.
+- Au démarrage du processus, les jobs restés en cours sont marqués interrompus.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+DEFAULT_JOBS_PATH = Path(__file__).parent.parent / ".cache" / "jobs.sqlite"
+DEFAULT_MAX_WORKERS = 4
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+FINISHED_STATUSES = {STATUS_DONE, STATUS_ERROR}
+
+JobHandler = Callable[[Dict[str, object], Callable[[str], None]], Dict[str, object]]
+
+
+@dataclass
+class Job:
+    """Instantané d'un job (lu depuis la table)."""
+    id: str
+    kind: str
+    status: str
+    progress: str
+    params: Dict[str, object]
+    result: Optional[Dict[str, object]]
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def elapsed_s(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobRunner:
+    """
+    Pool de workers + table SQLite des jobs.
+    """
+
+    def __init__(self, path: Path = DEFAULT_JOBS_PATH, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.path = Path(path)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL DEFAULT '',
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        # Jobs d'un processus précédent : les fonctions Python ne survivent pas au redémarrage
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+            (STATUS_ERROR, "Job interrompu (redémarrage du serveur)", time.time(), STATUS_QUEUED, STATUS_RUNNING),
+        )
+        self._conn.commit()
+
+    def submit(self, kind: str, handler: JobHandler, params: Dict[str, object]) -> str:
+        """
+        Enregistre un job et le place dans la file du pool.
+
+        Args:
+            kind: Type de job (affichage / diagnostic)
+            handler: Fonction handler(params, report) -> résultat JSON
+            params: Paramètres sérialisables en JSON
+
+        Returns:
+            Identifiant du job
+        """
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, STATUS_QUEUED, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+        self._executor.submit(self._run, job_id, handler, params)
+        print(f"🗂️ Job {job_id} ({kind}) soumis", flush=True)
+        return job_id
+
+    def _update(self, job_id: str, **fields: object) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _run(self, job_id: str, handler: JobHandler, params: Dict[str, object]) -> None:
+        self._update(job_id, status=STATUS_RUNNING, started_at=time.time())
+
+        def report(message: str) -> None:
+            self._update(job_id, progress=str(message))
+
+        try:
+            result = handler(params, report)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=STATUS_ERROR, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+            print(f"❌ Job {job_id} en erreur: {e}", flush=True)
+            return
+        self._update(
+            job_id,
+            status=STATUS_DONE,
+            result=json.dumps(result, ensure_ascii=False, default=str),
+            finished_at=time.time(),
+        )
+        print(f"✅ Job {job_id} terminé", flush=True)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, progress, params, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(
+            id=row[0],
+            kind=row[1],
+            status=row[2],
+            progress=row[3],
+            params=json.loads(row[4]),
+            result=json.loads(row[5]) if row[5] else None,
+            error=row[6],
+            created_at=row[7],
+            started_at=row[8],
+            finished_at=row[9],
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Nombre de jobs par statut."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self, older_than_s: float = 7 * 24 * 3600) -> int:
+        """Supprime les jobs terminés plus anciens que older_than_s."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (STATUS_DONE, STATUS_ERROR, time.time() - older_than_s),
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Pool partagé du processus (JOBS_DB_PATH, JOBS_MAX_WORKERS pour surcharger)."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                path = os.getenv("JOBS_DB_PATH") or DEFAULT_JOBS_PATH
+                max_workers = int(os.getenv("JOBS_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+                _runner = JobRunner(Path(path), max_workers=max_workers)
+                _runner.purge()
+    return _runner
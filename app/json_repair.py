@@ -0,0 +1,419 @@
+"""
+Réparation locale et déterministe des JSON produits par les LLM.
+
+Les réponses d'extraction sont parfois du JSON presque valide : texte ou
+backticks autour, virgules en trop ou manquantes, guillemets non échappés
+dans une chaîne, sauts de ligne bruts, réponse tronquée par la limite de
+tokens... Plutôt qu'une série de nettoyages regex suivis d'un appel LLM de
+réparation, le texte est analysé en une seule passe par un parseur tolérant
+qui corrige ces défauts au fil de la lecture et indique les réparations
+appliquées.
+
+Un JSON valide est décodé directement par json (chemin rapide) ; le parseur
+tolérant n'est utilisé qu'en cas d'échec.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, List
+
+# Types de réparation signalés
+REPAIR_SURROUNDING_TEXT = "surrounding_text"
+REPAIR_TRAILING_COMMA = "trailing_comma"
+REPAIR_MISSING_COMMA = "missing_comma"
+REPAIR_EXTRA_COMMA = "extra_comma"
+REPAIR_MISSING_COLON = "missing_colon"
+REPAIR_MISSING_VALUE = "missing_value"
+REPAIR_UNESCAPED_QUOTE = "unescaped_quote"
+REPAIR_RAW_NEWLINE = "raw_newline"
+REPAIR_CONTROL_CHAR = "control_char"
+REPAIR_INVALID_ESCAPE = "invalid_escape"
+REPAIR_UNQUOTED_KEY = "unquoted_key"
+REPAIR_UNQUOTED_VALUE = "unquoted_value"
+REPAIR_PYTHON_LITERAL = "python_literal"
+REPAIR_COMMENT = "comment"
+REPAIR_MISMATCHED_BRACKET = "mismatched_bracket"
+REPAIR_TRUNCATED = "truncated"
+
+MAX_DEPTH = 200
+
+_WS_RE = re.compile(r"[ \t\n\r]*")
+_STRING_CHUNK_RE = re.compile(r'[^"\\\x00-\x1f]*')
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_WORD_RE = re.compile(r"[A-Za-z_][\w-]*")
+_BARE_VALUE_RE = re.compile(r"[^,}\]\n]*")
+_HEX4_RE = re.compile(r"[0-9a-fA-F]{4}")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LITERALS = {"true": True, "false": False, "null": None}
+_PYTHON_LITERALS = {"True": True, "False": False, "None": None}
+
+_MISSING = object()
+
+
+class JSONRepairError(ValueError):
+    """Le texte ne contient aucune structure JSON exploitable."""
+
+
+@dataclass
+class RepairResult:
+    """Valeur décodée et réparations appliquées (dans l'ordre de lecture)."""
+    value: Any
+    repairs: List[str] = field(default_factory=list)
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.repairs)
+
+    def summary(self) -> str:
+        """Résumé lisible, ex. "trailing_comma×2, truncated"."""
+        counts = Counter(self.repairs)
+        return ", ".join(kind if n == 1 else f"{kind}×{n}" for kind, n in counts.items())
+
+
+def repair_json(text: str) -> RepairResult:
+    """
+    Décode le premier objet (ou tableau) JSON du texte, en le réparant si besoin.
+
+    Args:
+        text: Réponse brute du LLM
+
+    Returns:
+        RepairResult (valeur décodée + liste des réparations)
+
+    Raises:
+        JSONRepairError: si le texte ne contient ni { ni [
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise JSONRepairError("Aucune accolade { } trouvée dans la réponse")
+    start = min(starts)
+
+    repairs: List[str] = []
+    if text[:start].strip():
+        repairs.append(REPAIR_SURROUNDING_TEXT)
+
+    # Chemin rapide : JSON valide (éventuellement entouré de texte)
+    try:
+        value, end = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError:
+        pass
+    else:
+        if text[end:].strip() and REPAIR_SURROUNDING_TEXT not in repairs:
+            repairs.append(REPAIR_SURROUNDING_TEXT)
+        return RepairResult(value, repairs)
+
+    scanner = _Scanner(text, start, repairs)
+    value = scanner.parse_value(0)
+    scanner.skip_ws()
+    if scanner.pos < len(text) and REPAIR_SURROUNDING_TEXT not in repairs:
+        repairs.append(REPAIR_SURROUNDING_TEXT)
+    return RepairResult(value, repairs)
+
+
+class _Scanner:
+    """Parseur JSON tolérant (descente récursive, une seule passe)."""
+
+    def __init__(self, text: str, pos: int, repairs: List[str]):
+        self.text = text
+        self.n = len(text)
+        self.pos = pos
+        self.repairs = repairs
+
+    def repair(self, kind: str) -> None:
+        self.repairs.append(kind)
+
+    def truncated(self) -> None:
+        if REPAIR_TRUNCATED not in self.repairs:
+            self.repairs.append(REPAIR_TRUNCATED)
+
+    def skip_ws(self) -> None:
+        """Saute les blancs, commentaires // et /* */ et caractères de contrôle parasites."""
+        text = self.text
+        while True:
+            self.pos = _WS_RE.match(text, self.pos).end()
+            if self.pos >= self.n:
+                return
+            if text.startswith("//", self.pos):
+                end = text.find("\n", self.pos)
+                self.pos = self.n if end == -1 else end
+                self.repair(REPAIR_COMMENT)
+            elif text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                self.pos = self.n if end == -1 else end + 2
+                self.repair(REPAIR_COMMENT)
+            elif text[self.pos] < " " or "\x7f" <= text[self.pos] <= "\x9f":
+                self.pos += 1
+                self.repair(REPAIR_CONTROL_CHAR)
+            else:
+                return
+
+    def parse_value(self, depth: int) -> Any:
+        if depth > MAX_DEPTH:
+            raise JSONRepairError(f"Profondeur d'imbrication supérieure à {MAX_DEPTH}")
+        self.skip_ws()
+        if self.pos >= self.n:
+            self.truncated()
+            return _MISSING
+        c = self.text[self.pos]
+        if c == "{":
+            return self.parse_object(depth)
+        if c == "[":
+            return self.parse_array(depth)
+        if c == '"':
+            return self.parse_string(is_key=False)
+        if c in ",}]":
+            self.repair(REPAIR_MISSING_VALUE)
+            return None
+        if c == ":":
+            # Deux-points en trop : ignoré
+            self.pos += 1
+            self.repair(REPAIR_EXTRA_COMMA)
+            return self.parse_value(depth)
+        if c == "-" or c.isdigit():
+            return self.parse_number()
+        return self.parse_word()
+
+    def parse_object(self, depth: int) -> dict:
+        text = self.text
+        self.pos += 1
+        obj = {}
+        while True:
+            self.skip_ws()
+            if self.pos >= self.n:
+                self.truncated()
+                return obj
+            c = text[self.pos]
+            if c == "}":
+                self.pos += 1
+                return obj
+            if c == "]":
+                self.pos += 1
+                self.repair(REPAIR_MISMATCHED_BRACKET)
+                return obj
+            if c == ",":
+                self.pos += 1
+                self.repair(REPAIR_EXTRA_COMMA)
+                continue
+
+            if c == '"':
+                key = self.parse_string(is_key=True)
+            else:
+                match = _WORD_RE.match(text, self.pos)
+                if match is None:
+                    # Caractère inattendu à la place d'une clé : ignoré
+                    self.pos += 1
+                    self.repair(REPAIR_UNQUOTED_VALUE)
+                    continue
+                key = match.group()
+                self.pos = match.end()
+                self.repair(REPAIR_UNQUOTED_KEY)
+
+            self.skip_ws()
+            if self.pos >= self.n:
+                # Clé sans valeur (réponse tronquée) : abandonnée
+                self.truncated()
+                return obj
+            if text[self.pos] == ":":
+                self.pos += 1
+            else:
+                self.repair(REPAIR_MISSING_COLON)
+
+            value = self.parse_value(depth + 1)
+            if value is _MISSING:
+                return obj
+            obj[key] = value
+
+            if not self.after_member("}"):
+                return obj
+
+    def parse_array(self, depth: int) -> list:
+        text = self.text
+        self.pos += 1
+        arr = []
+        while True:
+            self.skip_ws()
+            if self.pos >= self.n:
+                self.truncated()
+                return arr
+            c = text[self.pos]
+            if c == "]":
+                self.pos += 1
+                return arr
+            if c == "}":
+                self.pos += 1
+                self.repair(REPAIR_MISMATCHED_BRACKET)
+                return arr
+            if c == ",":
+                self.pos += 1
+                self.repair(REPAIR_EXTRA_COMMA)
+                continue
+
+            value = self.parse_value(depth + 1)
+            if value is _MISSING:
+                return arr
+            arr.append(value)
+
+            if not self.after_member("]"):
+                return arr
+
+    def after_member(self, closing: str) -> bool:
+        """
+        Lit le séparateur après un membre d'objet / élément de tableau.
+
+        Returns:
+            True si la lecture du conteneur continue, False s'il est refermé
+        """
+        text = self.text
+        self.skip_ws()
+        if self.pos >= self.n:
+            self.truncated()
+            return False
+        c = text[self.pos]
+        if c == ",":
+            self.pos += 1
+            self.skip_ws()
+            if self.pos >= self.n:
+                self.truncated()
+                return False
+            if text[self.pos] in "}]":
+                self.repair(REPAIR_TRAILING_COMMA)
+                if text[self.pos] != closing:
+                    self.repair(REPAIR_MISMATCHED_BRACKET)
+                self.pos += 1
+                return False
+            return True
+        if c in "}]":
+            if c != closing:
+                self.repair(REPAIR_MISMATCHED_BRACKET)
+            self.pos += 1
+            return False
+        # Membre suivant sans virgule
+        self.repair(REPAIR_MISSING_COMMA)
+        return True
+
+    def parse_string(self, is_key: bool) -> str:
+        text = self.text
+        self.pos += 1
+        chunks = []
+        while True:
+            match = _STRING_CHUNK_RE.match(text, self.pos)
+            chunks.append(match.group())
+            self.pos = match.end()
+            if self.pos >= self.n:
+                self.truncated()
+                return "".join(chunks)
+            c = text[self.pos]
+            if c == '"':
+                self.pos += 1
+                if self.closes_string(is_key):
+                    return "".join(chunks)
+                chunks.append('"')
+                self.repair(REPAIR_UNESCAPED_QUOTE)
+            elif c == "\\":
+                if self.pos + 1 >= self.n:
+                    self.pos += 1
+                    self.truncated()
+                    return "".join(chunks)
+                chunks.append(self.parse_escape())
+            elif c in "\n\r":
+                chunks.append(c)
+                self.pos += 1
+                self.repair(REPAIR_RAW_NEWLINE)
+            elif c == "\t":
+                chunks.append(c)
+                self.pos += 1
+                self.repair(REPAIR_CONTROL_CHAR)
+            else:
+                # Autres caractères de contrôle : supprimés
+                self.pos += 1
+                self.repair(REPAIR_CONTROL_CHAR)
+
+    def parse_escape(self) -> str:
+        text = self.text
+        nxt = text[self.pos + 1]
+        if nxt in _ESCAPES:
+            self.pos += 2
+            return _ESCAPES[nxt]
+        if nxt == "u" and _HEX4_RE.match(text, self.pos + 2):
+            code = int(text[self.pos + 2:self.pos + 6], 16)
+            self.pos += 6
+            # Paire de substitution UTF-16 (😀)
+            if 0xD800 <= code <= 0xDBFF and text.startswith("\\u", self.pos) and _HEX4_RE.match(text, self.pos + 2):
+                low = int(text[self.pos + 2:self.pos + 6], 16)
+                if 0xDC00 <= low <= 0xDFFF:
+                    self.pos += 6
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00))
+            return chr(code)
+        # Échappement invalide (\' , \é ...) : le caractère est conservé
+        self.pos += 2
+        self.repair(REPAIR_INVALID_ESCAPE)
+        return nxt
+
+    def closes_string(self, is_key: bool) -> bool:
+        """
+        Indique si le guillemet qui vient d'être lu ferme la chaîne, d'après
+        ce qui le suit (sinon c'est un guillemet non échappé du contenu).
+        """
+        text = self.text
+        j = _WS_RE.match(text, self.pos).end()
+        if j >= self.n:
+            return True
+        c = text[j]
+        if c in ":}]":
+            return True
+        if is_key:
+            return False
+        if c == ",":
+            k = _WS_RE.match(text, j + 1).end()
+            if k >= self.n:
+                return True
+            d = text[k]
+            return d in '"{[]}-' or d.isdigit() or text.startswith(("true", "false", "null", "//", "/*"), k)
+        if c == '"':
+            # Chaîne suivante sur une autre ligne : virgule manquante
+            return "\n" in text[self.pos:j]
+        return False
+
+    def parse_number(self) -> Any:
+        match = _NUMBER_RE.match(self.text, self.pos)
+        if match is None:
+            if self.pos + 1 >= self.n:
+                self.pos = self.n
+                self.truncated()
+                return _MISSING
+            return self.parse_word()
+        self.pos = match.end()
+        number = match.group()
+        if self.pos >= self.n:
+            self.truncated()
+        if "." in number or "e" in number or "E" in number:
+            return float(number)
+        return int(number)
+
+    def parse_word(self) -> Any:
+        text = self.text
+        match = _WORD_RE.match(text, self.pos)
+        if match is not None:
+            word = match.group()
+            if word in _LITERALS:
+                self.pos = match.end()
+                return _LITERALS[word]
+            if word in _PYTHON_LITERALS:
+                self.pos = match.end()
+                self.repair(REPAIR_PYTHON_LITERAL)
+                return _PYTHON_LITERALS[word]
+            if match.end() >= self.n and any(lit.startswith(word) for lit in _LITERALS):
+                # Littéral coupé (tru, nul...) : réponse tronquée
+                self.pos = self.n
+                self.truncated()
+                return _MISSING
+        # Valeur non délimitée : lue jusqu'au prochain séparateur
+        match = _BARE_VALUE_RE.match(text, self.pos)
+        self.pos = max(match.end(), self.pos + 1)
+        self.repair(REPAIR_UNQUOTED_VALUE)
+        return match.group().strip()
@@ -0,0 +1,270 @@
+"""
+Registre des clients LLM partagés par le processus.
+
+- Une table déclarative décrit chaque modèle proposé dans l'interface
+  (fournisseur, identifiant, température, limite de contexte).
+- Les clients Mistral / OpenAI (Nebius) sont créés une seule fois par
+  (fournisseur, clé API) et réutilisent un pool de connexions HTTP keep-alive
+  dimensionné pour l'extraction parallèle des paquets.
+- Les réponses longues peuvent être reçues en flux (ChatStream) pour être
+  affichées au fil de l'eau.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from mistralai import Mistral
+from openai import OpenAI
+
+
+# ============================================================
+# Configuration
+# ============================================================
+
+# Nombre maximal de requêtes d'extraction simultanées visé par le pipeline.
+MAX_EXTRACTION_CONCURRENCY = 16
+
+# Pool HTTP : on garde assez de connexions ouvertes pour l'extraction
+# parallèle, plus une petite marge pour les appels de synthèse/évaluation.
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=MAX_EXTRACTION_CONCURRENCY + 4,
+    max_keepalive_connections=MAX_EXTRACTION_CONCURRENCY,
+    keepalive_expiry=120.0,
+)
+
+# Les synthèses longues peuvent prendre plusieurs minutes.
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=15.0)
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    """Fournisseur d'API (clé, URL, type de SDK)."""
+    name: str
+    label: str
+    sdk: str  # "mistral" | "openai"
+    env_var: str
+    base_url: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Modèle sélectionnable dans l'interface."""
+    label: str
+    provider: str
+    model_id: str
+    temperature: float
+    context_limit: int
+    # Ajoute les consignes de complétude / style (Mistral Small 4)
+    completeness_reminder: bool = False
+    # Remonte finish_reason et usage pour affichage debug
+    capture_debug: bool = False
+
+
+PROVIDERS: Dict[str, ProviderSpec] = {
+    "mistral": ProviderSpec(
+        name="mistral",
+        label="Mistral",
+        sdk="mistral",
+        env_var="MISTRAL_API_KEY",
+    ),
+    "nebius": ProviderSpec(
+        name="nebius",
+        label="Nebius",
+        sdk="openai",
+        env_var="NEBIUS_API_KEY",
+        base_url="https://api.studio.nebius.ai/v1/",
+    ),
+}
+
+# Ordre préservé : c'est l'ordre d'affichage dans la barre latérale.
+MODEL_SPECS: Dict[str, ModelSpec] = {
+    spec.label: spec
+    for spec in [
+        ModelSpec("Mixtral 8x22B (Mistral)", "mistral", "open-mixtral-8x22b", 0.3, 64000),
+        ModelSpec("Mistral-medium-2508", "mistral", "mistral-medium-2508", 0.3, 128000),
+        ModelSpec("Mistral Large 2", "mistral", "mistral-large-2411", 0.3, 131072),
+        ModelSpec(
+            "Mistral Small 4", "mistral", "mistral-small-2603", 0.3, 256000,
+            completeness_reminder=True,
+            capture_debug=True,
+        ),
+        ModelSpec("GPT-OSS-120B (Nebius)", "nebius", "openai/gpt-oss-120b", 0.3, 128000),
+        ModelSpec("Nemotron Super 120B (Nebius)", "nebius", "nvidia/nemotron-3-super-120b-a12b", 0.3, 1000000),
+    ]
+}
+
+# Limites de tokens par modèle (contexte d'entrée)
+MODEL_TOKEN_LIMITS: Dict[str, int] = {label: spec.context_limit for label, spec in MODEL_SPECS.items()}
+
+# Modèles internes du pipeline (non sélectionnables)
+EXTRACTION_MODEL_ID = "mistral-small-2603"
+EXTRACTION_TEMPERATURE = 0.0
+EVALUATION_MODEL_ID = "magistral-medium-2506"
+
+
+# ============================================================
+# Registre des clients
+# ============================================================
+
+_clients: Dict[Tuple[str, str], object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_key(provider: str) -> str:
+    """Retourne la clé API du fournisseur depuis l'environnement (chaîne vide si absente)."""
+    return os.getenv(PROVIDERS[provider].env_var, "")
+
+
+def _build_client(provider_spec: ProviderSpec, api_key: str):
+    if provider_spec.sdk == "mistral":
+        return Mistral(
+            api_key=api_key,
+            client=httpx.Client(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT),
+            async_client=httpx.AsyncClient(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT),
+        )
+    return OpenAI(
+        base_url=provider_spec.base_url,
+        api_key=api_key,
+        http_client=httpx.Client(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT),
+    )
+
+
+def get_client(provider: str, api_key: Optional[str] = None):
+    """
+    Retourne le client partagé d'un fournisseur.
+
+    Args:
+        provider: Nom du fournisseur ("mistral" ou "nebius")
+        api_key: Clé API explicite (défaut: variable d'environnement du fournisseur)
+
+    Returns:
+        Client Mistral ou OpenAI réutilisé entre les appels
+    """
+    provider_spec = PROVIDERS[provider]
+    key = api_key if api_key is not None else get_api_key(provider)
+    if not key:
+        raise ValueError(f"La clé API {provider_spec.label} n'est pas configurée.")
+
+    cache_key = (provider, key)
+    client = _clients.get(cache_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(cache_key)
+            if client is None:
+                client = _build_client(provider_spec, key)
+                _clients[cache_key] = client
+    return client
+
+
+def get_mistral_client(api_key: Optional[str] = None) -> Mistral:
+    """Raccourci pour le client Mistral partagé."""
+    return get_client("mistral", api_key)
+
+
+def chat_complete(provider: str, model: str, messages, api_key: Optional[str] = None, **kwargs):
+    """
+    Appel de complétion synchrone, quel que soit le SDK du fournisseur.
+
+    Returns:
+        La réponse brute du SDK (choices[0].message.content, usage, ...)
+    """
+    client = get_client(provider, api_key)
+    if PROVIDERS[provider].sdk == "mistral":
+        return client.chat.complete(model=model, messages=messages, **kwargs)
+    return client.chat.completions.create(model=model, messages=messages, **kwargs)
+
+
+def json_schema_response_format(name: str, schema: Dict[str, object], strict: bool = True) -> Dict[str, object]:
+    """
+    Paramètre response_format des sorties structurées (JSON Schema), accepté
+    tel quel par les SDK Mistral et OpenAI.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": strict},
+    }
+
+
+class ChatStream:
+    """
+    Réponse en flux, quel que soit le SDK du fournisseur.
+
+    S'itère en fragments de texte (utilisable tel quel avec st.write_stream).
+    La requête n'est envoyée qu'au début de l'itération. Une fois le flux
+    épuisé : `text` (réponse complète), `finish_reason` et `usage` (dernier
+    fragment), puis appel des fonctions enregistrées avec on_complete().
+    """
+
+    def __init__(self, sdk: str, open_stream: Callable[[], object]):
+        self._sdk = sdk
+        self._open_stream = open_stream
+        self._callbacks: List[Callable[["ChatStream"], None]] = []
+        self.text: Optional[str] = None
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+
+    def on_complete(self, callback: Callable[["ChatStream"], None]) -> "ChatStream":
+        self._callbacks.append(callback)
+        return self
+
+    def __iter__(self) -> Iterator[str]:
+        parts: List[str] = []
+        for event in self._open_stream():
+            # Mistral : CompletionEvent(data=CompletionChunk) ; OpenAI : ChatCompletionChunk
+            chunk = event.data if self._sdk == "mistral" else event
+            if getattr(chunk, "usage", None):
+                self.usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                self.finish_reason = str(choice.finish_reason)
+            delta = _delta_text(choice.delta.content if choice.delta else None)
+            if delta:
+                parts.append(delta)
+                yield delta
+        self.text = "".join(parts)
+        for callback in self._callbacks:
+            callback(self)
+
+    def consume(self) -> str:
+        """Lit tout le flux (sans affichage) et retourne la réponse complète."""
+        for _ in self:
+            pass
+        return self.text
+
+
+def _delta_text(content) -> str:
+    """Texte d'un fragment (chaîne, ou liste de blocs pour les modèles de raisonnement)."""
+    if not content:
+        return ""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(block, "text", "") or "" for block in content if getattr(block, "type", "text") == "text")
+
+
+def chat_stream(provider: str, model: str, messages, api_key: Optional[str] = None, **kwargs) -> ChatStream:
+    """
+    Appel de complétion en flux, quel que soit le SDK du fournisseur.
+
+    Returns:
+        Un ChatStream (la requête part à la première itération)
+    """
+    client = get_client(provider, api_key)
+    if PROVIDERS[provider].sdk == "mistral":
+        return ChatStream("mistral", lambda: client.chat.stream(model=model, messages=messages, **kwargs))
+    return ChatStream(
+        "openai",
+        lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs,
+        ),
+    )
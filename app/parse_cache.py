@@ -0,0 +1,221 @@
+"""
+Cache des résultats de parsing / packetisation.
+
+Chaque tour de conversation en mode compression re-parse le même dossier :
+le résultat de parse_and_packetize (sections, paquets, métadonnées) est
+mémorisé par empreinte du contenu + paramètres de budget + PARSER_VERSION.
+
+- Niveau mémoire : LRU borné, partagé par toutes les sessions du processus.
+- Niveau disque (optionnel) : pickle des sections (offsets dans le tampon
+  source) et des métadonnées, pour qu'un nouveau worker Streamlit reparte
+  à chaud.
+
+Les objets retournés sont partagés entre appels : ils ne doivent pas être modifiés.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from document_compression import (
+    PARSER_VERSION,
+    Packet,
+    SectionNode,
+    extract_header_registry,
+    parse_and_packetize,
+)
+from token_counting import TokenCounter
+
+DEFAULT_DISK_DIR = Path(__file__).parent.parent / ".cache" / "parse"
+DEFAULT_MAX_ENTRIES = 16
+DEFAULT_MAX_DISK_ENTRIES = 64
+
+
+def make_parse_key(kind: str, text: str, *params: object) -> str:
+    """Empreinte (type de résultat, version du parseur, paramètres, contenu)."""
+    h = hashlib.sha256()
+    for part in (kind, PARSER_VERSION, repr(params)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache clé → résultat de parsing, en mémoire (LRU) avec niveau disque optionnel.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        disk_dir: Optional[Path] = None,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return self._entries[key]
+
+        value = self._load_from_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: object) -> None:
+        with self._lock:
+            self._remember(key, value)
+        self._save_to_disk(key, value)
+
+    def _remember(self, key: str, value: object) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.pkl"
+
+    def _load_from_disk(self, key: str) -> Optional[object]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with path.open("rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Fichier tronqué ou produit par une version incompatible : on l'ignore
+            print(f"⚠️ Cache de parsing illisible ({path.name}): {e}", flush=True)
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return value
+
+    def _save_to_disk(self, key: str, value: object) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ Écriture du cache de parsing impossible: {e}", flush=True)
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Supprime les fichiers les moins récemment utilisés au-delà de max_disk_entries."""
+        files = sorted(self.disk_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        for path in files[: max(0, len(files) - self.max_disk_entries)]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups * 100, 1) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """
+    Cache partagé du processus.
+
+    Le niveau disque est activé par défaut (PARSE_CACHE_DIR pour changer le
+    répertoire, PARSE_CACHE_DISK=0 pour le désactiver).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                disk_dir = None
+                if os.getenv("PARSE_CACHE_DISK", "1") != "0":
+                    disk_dir = Path(os.getenv("PARSE_CACHE_DIR") or DEFAULT_DISK_DIR)
+                _cache = ParseCache(disk_dir=disk_dir)
+    return _cache
+
+
+def cached_parse_and_packetize(
+    source_text: str,
+    max_input_tokens: int = 42000,
+    prompt_budget_tokens: int = 2500,
+    output_budget_tokens: int = 3000,
+    packing_mode: str = "greedy",
+    token_counter: Optional[TokenCounter] = None,
+) -> Tuple[List[SectionNode], List[Packet], bool]:
+    """
+    parse_and_packetize mémorisé.
+
+    Returns:
+        Tuple (sections, paquets, True si le résultat vient du cache)
+    """
+    cache = get_parse_cache()
+    key = make_parse_key(
+        "packets", source_text, max_input_tokens, prompt_budget_tokens, output_budget_tokens, packing_mode,
+        token_counter.name if token_counter is not None else "approx",
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        nodes, packets = cached
+        return nodes, packets, True
+
+    nodes, packets = parse_and_packetize(
+        source_text,
+        max_input_tokens=max_input_tokens,
+        prompt_budget_tokens=prompt_budget_tokens,
+        output_budget_tokens=output_budget_tokens,
+        packing_mode=packing_mode,
+        token_counter=token_counter,
+        # Registre de l'en-tête partagé par les découpages du même document (autres budgets, autre modèle)
+        header_registry=cached_extract_header_registry(source_text),
+    )
+    cache.put(key, (nodes, packets))
+    return nodes, packets, False
+
+
+def cached_extract_header_registry(source_text: str) -> Dict[str, object]:
+    """extract_header_registry mémorisé (parties, rôles et avocats de l'en-tête)."""
+    cache = get_parse_cache()
+    key = make_parse_key("header_registry", source_text)
+    registry = cache.get(key)
+    if registry is None:
+        registry = extract_header_registry(source_text)
+        cache.put(key, registry)
+    return registry
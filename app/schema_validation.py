@@ -0,0 +1,102 @@
+"""
+Validation locale d'une valeur JSON contre un JSON Schema.
+
+Sous-ensemble de JSON Schema utilisé par les schémas de sortie du pipeline
+(type, enum, properties, required, additionalProperties, items), sans
+dépendance externe. Chaque erreur porte le chemin de la valeur fautive, ce
+qui permet de ne faire corriger que le fragment invalide.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple, Union
+
+JsonPath = Tuple[Union[str, int], ...]
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+@dataclass(frozen=True)
+class SchemaError:
+    """Écart au schéma, localisé par son chemin dans la valeur."""
+    path: JsonPath
+    message: str
+
+    @property
+    def location(self) -> str:
+        """Chemin lisible, ex. "sections[3].participants[0].kind"."""
+        out = ""
+        for part in self.path:
+            out += f"[{part}]" if isinstance(part, int) else (f".{part}" if out else part)
+        return out or "(racine)"
+
+    def __str__(self) -> str:
+        return f"{self.location}: {self.message}"
+
+
+def validate(value: Any, schema: Dict[str, Any], path: JsonPath = ()) -> List[SchemaError]:
+    """
+    Valide une valeur contre un schéma.
+
+    Args:
+        value: Valeur JSON décodée
+        schema: JSON Schema (sous-ensemble supporté, voir en-tête du module)
+        path: Chemin de la valeur (usage interne)
+
+    Returns:
+        Liste des erreurs (vide si la valeur est conforme)
+    """
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_TYPE_CHECKS[t](value) for t in types):
+            return [SchemaError(path, f"type {type(value).__name__} au lieu de {'|'.join(types)}")]
+
+    if "enum" in schema and value not in schema["enum"]:
+        return [SchemaError(path, f"valeur {value!r} hors de {schema['enum']}")]
+
+    errors: List[SchemaError] = []
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(SchemaError(path + (key,), "champ manquant"))
+        for key, item in value.items():
+            if key in properties:
+                errors.extend(validate(item, properties[key], path + (key,)))
+            elif schema.get("additionalProperties") is False:
+                errors.append(SchemaError(path + (key,), "champ non prévu par le schéma"))
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], path + (i,)))
+    return errors
+
+
+def subschema_at(schema: Dict[str, Any], path: JsonPath) -> Dict[str, Any]:
+    """Schéma de la valeur située au chemin donné."""
+    for part in path:
+        schema = schema["items"] if isinstance(part, int) else schema["properties"][part]
+    return schema
+
+
+def get_at(value: Any, path: JsonPath) -> Any:
+    for part in path:
+        value = value[part]
+    return value
+
+
+def set_at(value: Any, path: JsonPath, new_value: Any) -> Any:
+    """Remplace la valeur au chemin donné (chemin vide : retourne new_value)."""
+    if not path:
+        return new_value
+    get_at(value, path[:-1])[path[-1]] = new_value
+    return value
@@ -3,7 +3,10 @@ Module de compression simplifiée pour les conclusions juridiques.
 
 Process en 3 étapes :
 1. Identification de la structure (Faits, Procédure, Moyens, Prétentions) via LLM
-2. Résumé ciblé des sous-sections de Faits et Procédure (> 7000 tokens → réduction 20%)
+   (par défaut, le LLM ne renvoie que les titres et des ancres de début / fin ;
+   le contenu est découpé localement dans le document source)
+2. Résumé ciblé des sous-sections de Faits et Procédure (> 7000 tokens → réduction 20%),
+   lancé en parallèle pour toutes les sous-sections concernées
 3. Reconstitution + application du prompt de résumé final
 
 Auteur: POC_MAC
@@ -11,15 +14,25 @@ Date: 2026-04-15
 """
 
 import json
-import os
-import tiktoken
+import re
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import SequenceMatcher
 from typing import Dict, List, Optional, Tuple
-from mistralai import Mistral
+
+from corpus import get_corpus
+from llm_clients import chat_stream, get_mistral_client
+from token_counting import count_text_tokens
+
+# Réductions de sous-sections lancées en parallèle (appels Mistral concurrents)
+MAX_PARALLEL_REDUCTIONS = 4
 
 
 def estimate_tokens(text: str) -> int:
     """
-    Estime le nombre de tokens dans un texte en utilisant tiktoken.
+    Estime le nombre de tokens dans un texte en utilisant tiktoken
+    (encodeur partagé, comptes mémorisés par contenu).
 
     Args:
         text: Texte à analyser
@@ -27,17 +40,13 @@ def estimate_tokens(text: str) -> int:
     Returns:
         Nombre estimé de tokens
     """
-    try:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
-    except Exception:
-        # Fallback: approximation 1 token ≈ 4 caractères
-        return len(text) // 4
+    return count_text_tokens(text)
 
 
 def load_prompt(prompt_name: str) -> str:
     """
-    Charge un fichier de prompt depuis le dossier prompts/.
+    Charge un fichier de prompt depuis le dossier prompts/ (mémorisé par le
+    corpus tant que le fichier n'est pas modifié).
 
     Args:
         prompt_name: Nom du fichier prompt (sans extension .md)
@@ -45,9 +54,7 @@ def load_prompt(prompt_name: str) -> str:
     Returns:
         Contenu du prompt
     """
-    prompt_path = os.path.join(os.path.dirname(__file__), "prompts", f"{prompt_name}.md")
-    with open(prompt_path, "r", encoding="utf-8") as f:
-        return f.read()
+    return get_corpus().prompt(prompt_name)
 
 
 def identify_structure(document: str, api_key: str) -> Dict:
@@ -72,7 +79,7 @@ def identify_structure(document: str, api_key: str) -> Dict:
             "pretentions": {"contenu": "..."}
         }
     """
-    client = Mistral(api_key=api_key)
+    client = get_mistral_client(api_key)
 
     # Charger le prompt d'identification
     system_prompt = load_prompt("identification_structure")
@@ -93,6 +100,221 @@ def identify_structure(document: str, api_key: str) -> Dict:
     return structure
 
 
+# Part minimale de mots communs (SequenceMatcher sur les mots) pour accepter une ancre approchée
+ANCHOR_MIN_SCORE = 0.6
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize_word(word: str) -> str:
+    """Mot sans accents ni casse (comparaison des ancres)."""
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class AnchorLocator:
+    """
+    Localise des ancres (quelques mots cités par le LLM) dans le document
+    source, de façon approchée : casse, accents, ponctuation et quelques mots
+    erronés ou manquants sont tolérés.
+    """
+
+    def __init__(self, document: str):
+        self.document = document
+        self.words = [(normalize_word(m.group()), m.start(), m.end()) for m in WORD_RE.finditer(document)]
+        self.index = defaultdict(list)
+        for i, (word, _, _) in enumerate(self.words):
+            self.index[word].append(i)
+
+    def find(self, anchor: str, min_word: int = 0, max_word: Optional[int] = None,
+             heading: str = "") -> Optional[Tuple[int, int]]:
+        """
+        Cherche la fenêtre de mots la plus proche de l'ancre.
+
+        Args:
+            anchor: Texte de l'ancre
+            min_word: Indice de mot à partir duquel une occurrence est préférée
+                (ordre du document) ; une occurrence antérieure reste possible
+            max_word: Si fourni, seules les fenêtres comprises entre min_word et
+                max_word sont retenues, la plus tardive étant préférée (ancre de fin)
+            heading: Titre attendu juste avant l'ancre ; départage les ouvertures
+                répétées à l'identique (ex. plusieurs "CONFIRMER le jugement...")
+
+        Returns:
+            (indice du premier mot, indice après le dernier mot) ou None
+        """
+        target = [normalize_word(w) for w in WORD_RE.findall(anchor or "")]
+        if not target:
+            return None
+        k = len(target)
+        heading_words = [normalize_word(w) for w in WORD_RE.findall(heading or "")]
+
+        # Fenêtres candidates : alignées sur les occurrences des deux mots les plus rares de l'ancre
+        rare = sorted(
+            ((j, word) for j, word in enumerate(target) if word in self.index),
+            key=lambda item: len(self.index[item[1]]),
+        )[:2]
+        aligned = {i - j for j, word in rare for i in self.index[word]}
+        # Un mot omis ou ajouté par le LLM décale la fenêtre d'un mot
+        candidates = aligned | {start + shift for start in aligned for shift in (-1, 1)}
+
+        best = None
+        best_key = None
+        for start in candidates:
+            for size in (k, k - 1, k + 1):
+                if start < 0 or size < 1 or start + size > len(self.words):
+                    continue
+                if max_word is not None and (start < min_word or start + size > max_word):
+                    continue
+                window = [word for word, _, _ in self.words[start:start + size]]
+                if window == target:
+                    score = 1.0
+                else:
+                    matcher = SequenceMatcher(None, target, window, autojunk=False)
+                    matched = sum(block.size for block in matcher.get_matching_blocks())
+                    score = matched / max(len(target), size)
+                if score < ANCHOR_MIN_SCORE:
+                    continue
+                # À score égal : fenêtre précédée du titre, alignée et de la longueur de l'ancre, puis la plus proche
+                if max_word is not None:
+                    proximity = (True, start)
+                else:
+                    proximity = (start >= min_word, -start if start >= min_word else start)
+                after_heading = bool(heading_words) and start >= len(heading_words) and [
+                    word for word, _, _ in self.words[start - len(heading_words):start]] == heading_words
+                key = (round(score, 3), after_heading, start in aligned and size == k) + proximity
+                if best_key is None or key > best_key:
+                    best, best_key = (start, start + size), key
+        return best
+
+    def char_start(self, word_index: int) -> int:
+        """Début du mot, étendu au début de la ligne si seuls des symboles le précèdent (puces, guillemets)."""
+        start = self.words[word_index][1]
+        line_start = self.document.rfind("\n", 0, start) + 1
+        if not WORD_RE.search(self.document, line_start, start):
+            return line_start
+        return start
+
+    def char_end(self, word_end: int) -> int:
+        """Fin du dernier mot, étendue à la fin de sa ligne (ponctuation finale)."""
+        end = self.words[word_end - 1][2]
+        line_end = self.document.find("\n", end)
+        return len(self.document) if line_end == -1 else line_end
+
+
+def slice_structure(document: str, anchors: Dict) -> Tuple[Dict, List[str]]:
+    """
+    Construit la structure (même format que identify_structure) en découpant
+    le contenu de chaque partie dans le document à partir de ses ancres.
+
+    Une partie s'étend de son ancre de début jusqu'à son ancre de fin, sans
+    dépasser le début de la partie suivante dans le document (ni la fin du
+    document si l'ancre de fin est introuvable).
+
+    Args:
+        document: Texte complet de la conclusion
+        anchors: Réponse du LLM (titres + ancres "debut" / "fin")
+
+    Returns:
+        Tuple (structure, titres des parties dont le début n'a pas été localisé)
+    """
+    locator = AnchorLocator(document)
+
+    # Parties à localiser, dans l'ordre de la réponse
+    items = []
+    for section_name in ("faits", "procedure"):
+        for subsection in (anchors.get(section_name) or {}).get("sous_sections") or []:
+            items.append({"section": section_name, "titre": subsection.get("titre", ""),
+                          "debut": subsection.get("debut", ""), "fin": subsection.get("fin", "")})
+    for section_name in ("moyens", "pretentions"):
+        section = anchors.get(section_name) or {}
+        if section.get("debut"):
+            items.append({"section": section_name, "titre": section_name,
+                          "debut": section.get("debut", ""), "fin": section.get("fin", "")})
+
+    # Début de chaque partie (les sous-sections d'une même section se suivent :
+    # une ouverture répétée à l'identique est cherchée après la précédente)
+    next_min_word = {}
+    for item in items:
+        found = locator.find(item["debut"], next_min_word.get(item["section"], 0), heading=item["titre"])
+        item["start_word"] = found[0] if found else None
+        if found:
+            next_min_word[item["section"]] = found[0] + 1
+
+    located = sorted((item for item in items if item["start_word"] is not None), key=lambda item: item["start_word"])
+    for position, item in enumerate(located):
+        next_start = located[position + 1]["start_word"] if position + 1 < len(located) else None
+        start = locator.char_start(item["start_word"])
+        end = locator.char_start(next_start) if next_start is not None else len(document)
+        limit = next_start if next_start is not None else len(locator.words)
+        found = locator.find(item["fin"], item["start_word"], limit)
+        if found:
+            end = min(end, locator.char_end(found[1]))
+        item["contenu"] = document[start:end].strip()
+
+    structure = {
+        "faits": {"sous_sections": []},
+        "procedure": {"sous_sections": []},
+    }
+    for item in items:
+        contenu = item.get("contenu", "")
+        if item["section"] in ("faits", "procedure"):
+            structure[item["section"]]["sous_sections"].append({"titre": item["titre"], "contenu": contenu})
+        else:
+            structure[item["section"]] = {"contenu": contenu}
+
+    missing = [item["titre"] or item["section"] for item in items if item["start_word"] is None]
+    return structure, missing
+
+
+def identify_structure_anchors(document: str, api_key: str) -> Tuple[Dict, Dict]:
+    """
+    Identifie la structure du document via des ancres : le LLM ne renvoie que
+    les titres et les premiers / derniers mots de chaque partie, le contenu
+    est découpé localement (slice_structure). Si aucune ancre n'est
+    localisée, repli sur identify_structure (contenu recopié par le LLM).
+
+    Args:
+        document: Texte complet de la conclusion
+        api_key: Clé API Mistral
+
+    Returns:
+        Tuple (structure au format de identify_structure, infos d'identification)
+    """
+    import time
+
+    client = get_mistral_client(api_key)
+    system_prompt = load_prompt("identification_structure_ancres")
+
+    start_time = time.time()
+    response = client.chat.complete(
+        model="mistral-large-latest",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": document}
+        ],
+        temperature=0.0,
+        response_format={"type": "json_object"}
+    )
+    anchors = json.loads(response.choices[0].message.content)
+    structure, missing = slice_structure(document, anchors)
+
+    info = {
+        "mode": "ancres",
+        "ancres": anchors,
+        "ancres_non_localisees": missing,
+        "tokens_sortie": response.usage.completion_tokens if response.usage else None,
+    }
+    has_content = any(sub["contenu"] for name in ("faits", "procedure") for sub in structure[name]["sous_sections"]) \
+        or any(structure.get(name, {}).get("contenu") for name in ("moyens", "pretentions"))
+    if not has_content:
+        print("⚠️ Aucune ancre localisée dans le document : repli sur l'identification complète", flush=True)
+        structure = identify_structure(document, api_key)
+        info["mode"] = "complet (repli)"
+    info["duree_s"] = round(time.time() - start_time, 1)
+    return structure, info
+
+
 def reduce_subsection(subsection_content: str, api_key: str, reduction_pct: float = 20.0) -> str:
     """
     Réduit une sous-section de X% via résumé LLM.
@@ -105,7 +327,7 @@ def reduce_subsection(subsection_content: str, api_key: str, reduction_pct: floa
     Returns:
         Texte résumé de la sous-section
     """
-    client = Mistral(api_key=api_key)
+    client = get_mistral_client(api_key)
 
     # Charger le prompt de résumé
     system_prompt = load_prompt("resume_subsection")
@@ -184,14 +406,17 @@ def simple_compression_pipeline(
     final_prompt: str = "resume_conclusions",
     threshold_tokens: int = 7000,
     reduction_pct: float = 20.0,
-    progress_callback = None
+    progress_callback = None,
+    stream_final: bool = False,
+    structure_mode: str = "ancres",
+    max_parallel_reductions: int = MAX_PARALLEL_REDUCTIONS
 ) -> Tuple[str, Dict]:
     """
     Pipeline complet de compression simplifiée.
 
     Étapes :
     1. Identifier la structure (Faits, Procédure, Moyens, Prétentions)
-    2. Réduire les sous-sections de Faits/Procédure > seuil de tokens
+    2. Réduire les sous-sections de Faits/Procédure > seuil de tokens (en parallèle)
     3. Reconstituer le document
     4. Appliquer le prompt de résumé final
 
@@ -203,6 +428,12 @@ def simple_compression_pipeline(
         threshold_tokens: Seuil pour considérer une sous-section comme "grande" (défaut: 7000)
         reduction_pct: Pourcentage de réduction pour les sous-sections (défaut: 20%)
         progress_callback: Fonction callback pour afficher la progression (Streamlit)
+        stream_final: Si True, le résumé final est un ChatStream (à afficher avec
+            st.write_stream) ; tokens_final est renseigné à la fin du flux
+        structure_mode: "ancres" (titres + ancres, contenu découpé localement)
+            ou "complet" (le LLM recopie le contenu de chaque section)
+        max_parallel_reductions: Nombre maximal de réductions de sous-sections
+            lancées en parallèle (défaut: MAX_PARALLEL_REDUCTIONS)
 
     Returns:
         Tuple (résumé_final, données_intermédiaires)
@@ -220,7 +451,16 @@ def simple_compression_pipeline(
     if progress_callback:
         progress_callback("🔍 Étape 1/4 : Identification de la structure du document...")
 
-    structure = identify_structure(document, api_key)
+    if structure_mode == "ancres":
+        structure, identification = identify_structure_anchors(document, api_key)
+        if identification["ancres_non_localisees"] and progress_callback:
+            progress_callback(f"⚠️ Ancres non localisées : {', '.join(identification['ancres_non_localisees'])}")
+    else:
+        import time
+        start_time = time.time()
+        structure = identify_structure(document, api_key)
+        identification = {"mode": "complet", "duree_s": round(time.time() - start_time, 1)}
+    intermediary_data["identification"] = identification
     intermediary_data["structure_initiale"] = structure
 
     # Étape 2 : Résumé ciblé des sous-sections volumineuses
@@ -229,6 +469,8 @@ def simple_compression_pipeline(
 
     sections_to_reduce = ["faits", "procedure"]
 
+    # Sous-sections à réduire, dans l'ordre du document
+    to_reduce = []
     for section_name in sections_to_reduce:
         if section_name not in structure:
             continue
@@ -237,24 +479,51 @@ def simple_compression_pipeline(
             continue
 
         for i, subsection in enumerate(structure[section_name]["sous_sections"]):
-            contenu = subsection.get("contenu", "")
-            tokens = estimate_tokens(contenu)
-
+            tokens = estimate_tokens(subsection.get("contenu", ""))
             if tokens > threshold_tokens:
+                to_reduce.append((section_name, i, subsection, tokens))
+
+    if to_reduce:
+        import time
+
+        def timed_reduce(contenu):
+            start = time.time()
+            reduced = reduce_subsection(contenu, api_key, reduction_pct)
+            return reduced, round(time.time() - start, 1)
+
+        if progress_callback:
+            for section_name, i, subsection, tokens in to_reduce:
+                titre = subsection.get("titre", f"Sous-section {i+1}")
+                progress_callback(f"  📝 Réduction de '{titre}' ({tokens} tokens → ~{int(tokens * 0.8)} tokens)...")
+
+        # Réductions en parallèle (pool borné) ; la progression est rapportée
+        # depuis le thread appelant, les résultats sont réécrits dans l'ordre
+        start_time = time.time()
+        results = [None] * len(to_reduce)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel_reductions, len(to_reduce)))) as executor:
+            futures = {
+                executor.submit(timed_reduce, subsection.get("contenu", "")): position
+                for position, (_, _, subsection, _) in enumerate(to_reduce)
+            }
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                position = futures[future]
+                results[position] = future.result()
                 if progress_callback:
+                    _, i, subsection, _ = to_reduce[position]
                     titre = subsection.get("titre", f"Sous-section {i+1}")
-                    progress_callback(f"  📝 Réduction de '{titre}' ({tokens} tokens → ~{int(tokens * 0.8)} tokens)...")
+                    progress_callback(f"  ✅ '{titre}' réduite en {results[position][1]} s ({done_count}/{len(to_reduce)})")
+        intermediary_data["duree_reductions_s"] = round(time.time() - start_time, 1)
 
-                # Réduire la sous-section
-                reduced_content = reduce_subsection(contenu, api_key, reduction_pct)
-                subsection["contenu"] = reduced_content
+        for (section_name, _, subsection, tokens), (reduced_content, duree_s) in zip(to_reduce, results):
+            subsection["contenu"] = reduced_content
 
-                intermediary_data["sous_sections_reduites"].append({
-                    "section": section_name,
-                    "titre": subsection.get("titre", ""),
-                    "tokens_original": tokens,
-                    "tokens_reduit": estimate_tokens(reduced_content)
-                })
+            intermediary_data["sous_sections_reduites"].append({
+                "section": section_name,
+                "titre": subsection.get("titre", ""),
+                "tokens_original": tokens,
+                "tokens_reduit": estimate_tokens(reduced_content),
+                "duree_s": duree_s
+            })
 
     # Étape 3 : Reconstitution du document
     if progress_callback:
@@ -268,15 +537,32 @@ def simple_compression_pipeline(
     if progress_callback:
         progress_callback(f"📋 Étape 4/4 : Application du prompt final '{final_prompt}'...")
 
-    client = Mistral(api_key=api_key)
     final_system_prompt = load_prompt(final_prompt)
-
+    final_messages = [
+        {"role": "system", "content": final_system_prompt},
+        {"role": "user", "content": reconstructed_doc}
+    ]
+
+    if stream_final:
+        final_stream = chat_stream(
+            "mistral",
+            model=final_model,
+            messages=final_messages,
+            api_key=api_key,
+            temperature=0.3,
+            max_tokens=16000
+        )
+
+        def on_final_complete(done):
+            intermediary_data["tokens_final"] = estimate_tokens(done.text.strip())
+            intermediary_data["finish_reason"] = done.finish_reason
+
+        return final_stream.on_complete(on_final_complete), intermediary_data
+
+    client = get_mistral_client(api_key)
     response = client.chat.complete(
         model=final_model,
-        messages=[
-            {"role": "system", "content": final_system_prompt},
-            {"role": "user", "content": reconstructed_doc}
-        ],
+        messages=final_messages,
         temperature=0.3,
         max_tokens=16000
     )
@@ -0,0 +1,344 @@
+"""
+Comptage de tokens pour le découpage en paquets.
+
+Interface commune (TokenCounter) avec trois implémentations :
+- CharRatioCounter : ceil(caractères / ratio), ratio fixe (4 par défaut,
+  équivalent à approximate_tokens) ;
+- calibré : même estimateur, avec le ratio caractères/token appris par modèle
+  à partir du usage.prompt_tokens renvoyé par les API (TokenCalibration).
+  Le ratio est figé par document (document_key) : un même document est
+  toujours découpé de la même façon, quelles que soient les réponses reçues
+  entre-temps ;
+- ExactCounter : tokenizer Mistral officiel (paquet optionnel mistral-common).
+
+count_batch compte une liste de textes en un seul appel : le découpage compte
+toutes les sections d'un document d'un coup plutôt qu'à chaque accès.
+
+Le module fournit aussi la comptabilité des conversations (tiktoken
+cl100k_base) : un encodeur unique pour le processus et des comptes mémorisés
+par empreinte du contenu (LRU borné).
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_CALIBRATION_PATH = Path(__file__).parent.parent / ".cache" / "token_calibration.json"
+
+# Au-delà de ce volume, les totaux sont divisés par deux : les mesures
+# récentes pèsent davantage (le tokenizer ou le type de documents peut changer)
+CALIBRATION_DECAY_TOKENS = 2_000_000
+# Nombre minimal de tokens observés avant d'utiliser le ratio appris
+CALIBRATION_MIN_TOKENS = 5_000
+# Intervalle minimal entre deux écritures du fichier de calibration
+CALIBRATION_SAVE_INTERVAL_S = 30.0
+# Ratios figés par document (découpage stable d'un même document)
+RATIO_SNAPSHOT_SIZE = 256
+
+TOKEN_COUNT_MODES = ("ratio", "calibrated", "exact")
+
+
+class TokenCounter:
+    """Interface d'un compteur de tokens."""
+
+    name = "base"
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        raise NotImplementedError
+
+
+class CharRatioCounter(TokenCounter):
+    """Estimation rapide : 1 token pour `chars_per_token` caractères (au moins 1)."""
+
+    def __init__(self, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN, name: Optional[str] = None):
+        self.chars_per_token = chars_per_token
+        self.name = name or f"ratio:{chars_per_token:.3f}"
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        ratio = self.chars_per_token
+        return [max(1, math.ceil(len(text) / ratio)) for text in texts]
+
+
+class ExactCounter(TokenCounter):
+    """Tokenizer Mistral officiel (mistral-common), pour un modèle donné."""
+
+    def __init__(self, model_id: str):
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+        try:
+            mistral_tokenizer = MistralTokenizer.from_model(model_id, strict=False)
+        except Exception:
+            # Modèle inconnu de la version installée : tokenizer Tekken le plus récent
+            mistral_tokenizer = MistralTokenizer.v3(is_tekken=True)
+        self._tokenizer = mistral_tokenizer.instruct_tokenizer.tokenizer
+        self.name = f"exact:{model_id}"
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        encode = self._tokenizer.encode
+        return [max(1, len(encode(text, bos=False, eos=False))) for text in texts]
+
+
+class TokenCalibration:
+    """
+    Ratios caractères/token appris par modèle, persistés en JSON.
+
+    Chaque réponse d'API apporte (nombre de caractères envoyés, usage.prompt_tokens).
+    Les mesures sont écrites sur disque au plus toutes les save_interval_s
+    secondes (et à l'arrêt du processus via flush) : record ne fait pas
+    d'entrée/sortie à chaque réponse.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CALIBRATION_PATH, save_interval_s: float = CALIBRATION_SAVE_INTERVAL_S):
+        self.path = Path(path)
+        self.save_interval_s = save_interval_s
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._totals: Dict[str, Dict[str, float]] = {}
+        try:
+            self._totals = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self._totals = {}
+
+    def record(self, model_id: str, prompt_chars: int, prompt_tokens: Optional[int]) -> None:
+        """Ajoute une mesure (ignorée si l'API n'a pas renvoyé d'usage)."""
+        if not prompt_tokens or prompt_chars <= 0:
+            return
+        with self._lock:
+            totals = self._totals.setdefault(model_id, {"chars": 0.0, "tokens": 0.0})
+            totals["chars"] += prompt_chars
+            totals["tokens"] += prompt_tokens
+            if totals["tokens"] > CALIBRATION_DECAY_TOKENS:
+                totals["chars"] /= 2
+                totals["tokens"] /= 2
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval_s
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Écrit les mesures non sauvegardées."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._totals, indent=2)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        self._save(payload)
+
+    def _save(self, payload: str) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(payload, encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Calibration des tokens non sauvegardée: {e}", flush=True)
+
+    def chars_per_token(self, model_id: str) -> Optional[float]:
+        """Ratio appris pour le modèle, ou None si trop peu de mesures."""
+        totals = self._totals.get(model_id)
+        if not totals or totals["tokens"] < CALIBRATION_MIN_TOKENS:
+            return None
+        return totals["chars"] / totals["tokens"]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                model_id: {
+                    "chars_per_token": round(t["chars"] / t["tokens"], 3) if t["tokens"] else None,
+                    "observed_tokens": int(t["tokens"]),
+                }
+                for model_id, t in self._totals.items()
+            }
+
+
+_calibration: Optional[TokenCalibration] = None
+_ratio_snapshots: "OrderedDict[Tuple[str, str], Optional[float]]" = OrderedDict()
+_exact_counters: Dict[str, TokenCounter] = {}
+_exact_available = True
+_lock = threading.Lock()
+
+
+def get_calibration() -> TokenCalibration:
+    """Calibration partagée du processus (chemin surchargeable via TOKEN_CALIBRATION_PATH)."""
+    global _calibration
+    if _calibration is None:
+        with _lock:
+            if _calibration is None:
+                path = os.getenv("TOKEN_CALIBRATION_PATH") or DEFAULT_CALIBRATION_PATH
+                _calibration = TokenCalibration(Path(path))
+                atexit.register(_calibration.flush)
+    return _calibration
+
+
+def record_usage(model_id: str, messages: Sequence[Dict[str, str]], prompt_tokens: Optional[int]) -> None:
+    """Enregistre le usage.prompt_tokens d'une réponse pour calibrer le ratio du modèle."""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    get_calibration().record(model_id, prompt_chars, prompt_tokens)
+
+
+def get_token_counter(model_id: str, mode: Optional[str] = None, document_key: Optional[str] = None) -> TokenCounter:
+    """
+    Compteur de tokens pour un modèle.
+
+    Args:
+        model_id: Identifiant API du modèle qui recevra les textes
+        mode: "ratio", "calibrated" ou "exact" (défaut : variable TOKEN_COUNT_MODE,
+            sinon "calibrated")
+        document_key: Empreinte du document à découper ; en mode calibré, le
+            ratio lu au premier appel pour ce document est réutilisé ensuite
+            (même compteur, donc mêmes paquets et mêmes clés de cache)
+
+    Returns:
+        Un TokenCounter. Le mode exact retombe sur le mode calibré si
+        mistral-common n'est pas installé.
+    """
+    mode = mode or os.getenv("TOKEN_COUNT_MODE", "calibrated")
+    if mode not in TOKEN_COUNT_MODES:
+        raise ValueError(f"Unknown token count mode: {mode}")
+
+    global _exact_available
+    if mode == "exact" and _exact_available:
+        counter = _exact_counters.get(model_id)
+        if counter is not None:
+            return counter
+        try:
+            counter = ExactCounter(model_id)
+        except ImportError:
+            print("⚠️ mistral-common non installé : comptage de tokens calibré", flush=True)
+            _exact_available = False
+        else:
+            _exact_counters[model_id] = counter
+            return counter
+    if mode == "exact":
+        mode = "calibrated"
+
+    if mode == "calibrated":
+        ratio = _calibrated_ratio(model_id, document_key)
+        if ratio:
+            return CharRatioCounter(ratio, name=f"calibrated:{model_id}:{ratio:.2f}")
+    return CharRatioCounter()
+
+
+def _calibrated_ratio(model_id: str, document_key: Optional[str]) -> Optional[float]:
+    """Ratio appris (arrondi), figé pour document_key s'il est fourni."""
+    key = (model_id, document_key) if document_key else None
+    with _lock:
+        if key in _ratio_snapshots:
+            _ratio_snapshots.move_to_end(key)
+            return _ratio_snapshots[key]
+    ratio = get_calibration().chars_per_token(model_id)
+    # Arrondi : le nom (et donc la clé du cache de parsing) reste stable
+    ratio = round(ratio, 2) if ratio else None
+    if key is not None:
+        with _lock:
+            ratio = _ratio_snapshots.setdefault(key, ratio)
+            while len(_ratio_snapshots) > RATIO_SNAPSHOT_SIZE:
+                _ratio_snapshots.popitem(last=False)
+    return ratio
+
+
+def counter_from_name(name: str) -> Optional[TokenCounter]:
+    """
+    Recrée un compteur à partir de son nom (TokenCounter.name), par exemple
+    celui enregistré avec un point de reprise : une reprise redécoupe le
+    document exactement comme l'exécution interrompue.
+
+    Returns:
+        Le compteur, ou None si le nom n'est pas reconnu (ou si le tokenizer
+        exact n'est plus disponible)
+    """
+    kind, _, rest = name.partition(":")
+    try:
+        if kind == "ratio":
+            return CharRatioCounter(float(rest))
+        if kind == "calibrated":
+            _model_id, _, ratio = rest.rpartition(":")
+            return CharRatioCounter(float(ratio), name=name)
+    except ValueError:
+        return None
+    if kind == "exact" and rest:
+        counter = get_token_counter(rest, mode="exact")
+        return counter if counter.name == name else None
+    return None
+
+
+# ============================================================
+# Comptabilité des conversations (tiktoken)
+# ============================================================
+
+CONVERSATION_ENCODING = "cl100k_base"
+TEXT_COUNT_CACHE_SIZE = 256
+
+_text_counts: "OrderedDict[str, int]" = OrderedDict()
+_text_counts_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_tiktoken_encoding(name: str = CONVERSATION_ENCODING):
+    """Encodeur tiktoken partagé par le processus (chargé une seule fois)."""
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+def text_digest(text: str) -> str:
+    """Empreinte du contenu servant de clé aux comptes mémorisés."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def count_text_tokens(text: str, digest: Optional[str] = None) -> int:
+    """
+    Nombre de tokens d'un texte (tiktoken cl100k_base), mémorisé par empreinte :
+    un même dossier collé plusieurs fois n'est encodé qu'une fois.
+
+    Args:
+        digest: Empreinte du texte si elle est déjà calculée (text_digest)
+    """
+    if not text:
+        return 0
+    digest = digest or text_digest(text)
+    with _text_counts_lock:
+        count = _text_counts.get(digest)
+        if count is not None:
+            _text_counts.move_to_end(digest)
+            return count
+
+    try:
+        count = len(get_tiktoken_encoding().encode(text, disallowed_special=()))
+    except Exception:
+        # Fallback: approximation 1 token ≈ 4 caractères
+        count = len(text) // 4
+
+    with _text_counts_lock:
+        _text_counts[digest] = count
+        while len(_text_counts) > TEXT_COUNT_CACHE_SIZE:
+            _text_counts.popitem(last=False)
+    return count
+
+
+def count_messages_tokens(system_prompt: str, messages: Sequence[Dict[str, object]]) -> int:
+    """
+    Nombre total de tokens du prompt système et de l'historique.
+    Seuls les contenus nouveaux sont encodés ; un message peut porter
+    l'empreinte déjà connue de son contenu (clé "digest"), qui n'est alors
+    pas recalculée.
+    """
+    return count_text_tokens(system_prompt) + sum(
+        count_text_tokens(message.get("content") or "", message.get("digest")) for message in messages
+    )
@@ -0,0 +1,135 @@
+"""
+Pipeline de compression par paquets (call_model_with_compression) de bout en
+bout, appels aux modèles remplacés : l'extraction des paquets et la synthèse
+finale retournent des réponses fixes. Vérifie que l'exécution aboutit et que
+son point de reprise est marqué terminé (log_final), en réponse complète comme
+en flux, et qu'une extraction tronquée n'est ni mise en cache ni enregistrée
+comme point de reprise.
+"""
+
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("mistralai")
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+FINAL_TEXT = "Résumé final des conclusions."
+
+
+@pytest.fixture(scope="module")
+def chat_app(tmp_path_factory):
+    """Script Streamlit chargé en mode « bare » (caches, jobs et points de reprise isolés)."""
+    cache_dir = tmp_path_factory.mktemp("cache")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("PARSE_CACHE_DISK", "0")
+        mp.setenv("JOBS_DB_PATH", str(cache_dir / "jobs.sqlite"))
+        mp.setenv("CHECKPOINTS_DB_PATH", str(cache_dir / "checkpoints.sqlite"))
+        mp.setenv("EXTRACTION_CACHE_PATH", str(cache_dir / "extractions.sqlite"))
+        mp.setenv("TOKEN_CALIBRATION_PATH", str(cache_dir / "calibration.json"))
+        mp.syspath_prepend(str(APP_DIR))
+        spec = importlib.util.spec_from_file_location("chat_app", APP_DIR / "app.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+    sys.modules.pop("chat_app", None)
+
+
+@pytest.fixture
+def document():
+    return sorted((APP_DIR / "dossiers").glob("*.txt"))[0].read_text(encoding="utf-8")
+
+
+@pytest.fixture
+def stub_extraction(chat_app, monkeypatch):
+    async def extract_packets_async(packets, extraction_system_prompt, log_fn, report_progress, done_results=None, on_packet_done=None):
+        results = []
+        for packet_index, packet in enumerate(packets):
+            extracted = {"packet_id": packet.id, "document_role": "inconnu", "packet_summary": packet.id, "sections": []}
+            on_packet_done(packet_index, packet, extracted)
+            results.append((packet_index, packet, extracted, None))
+        return results
+
+    monkeypatch.setattr(chat_app, "extract_packets_async", extract_packets_async)
+
+
+class FakeStream:
+    """ChatStream minimal : le rappel on_complete reçoit la réponse complète."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def on_complete(self, callback):
+        callback(SimpleNamespace(text=self.text))
+        return self
+
+
+def assert_run_completed(chat_app, document):
+    run = chat_app.get_checkpoint_store().latest_resumable_run(chat_app.document_hash(document))
+    assert run is None, f"exécution {run.run_id} restée {run.status}"
+
+
+def test_final_synthesis_completes_run(chat_app, document, stub_extraction, monkeypatch):
+    monkeypatch.setattr(chat_app, "call_model", lambda *args, **kwargs: FINAL_TEXT)
+
+    result = chat_app.call_model_with_compression(next(iter(chat_app.MODEL_SPECS)), document)
+
+    assert result["final_response"] == FINAL_TEXT
+    assert result["failed_packets"] == []
+    assert len(result["extracted_jsons"]) == result["nb_packets"]
+    assert_run_completed(chat_app, document)
+
+
+def test_streamed_final_synthesis_completes_run(chat_app, document, stub_extraction, monkeypatch):
+    monkeypatch.setattr(chat_app, "call_model", lambda *args, **kwargs: FakeStream(FINAL_TEXT))
+
+    result = chat_app.call_model_with_compression(next(iter(chat_app.MODEL_SPECS)), document, stream_final=True)
+
+    assert result["final_response"].text == FINAL_TEXT
+    assert_run_completed(chat_app, document)
+
+
+def extract_first_packet(chat_app, document, monkeypatch, response):
+    """Extrait le premier paquet du document, l'API d'extraction retournant `response`."""
+    async def call_model_fast_extraction(*args, **kwargs):
+        return response
+
+    monkeypatch.setattr(chat_app, "call_model_fast_extraction", call_model_fast_extraction)
+    monkeypatch.setattr(chat_app, "STRUCTURED_EXTRACTION", False)
+    packet = chat_app.cached_parse_and_packetize(document)[1][0]
+    saved = []
+    result = asyncio.run(chat_app.extract_packet_parallel(
+        packet, 0, "système", lambda msg: None,
+        on_packet_done=lambda packet_index, packet, extracted: saved.append(extracted),
+    ))
+    return result, saved
+
+
+def test_truncated_extraction_is_not_persisted(chat_app, document, monkeypatch):
+    entries = chat_app.get_extraction_cache().stats()["entries"]
+
+    (_, _, extracted, error), saved = extract_first_packet(
+        chat_app, document, monkeypatch, '{"packet_id": "tronqué", "sections": [{"title": "Fait'
+    )
+
+    assert error is None
+    assert extracted["sections"] == [{"title": "Fait"}]
+    assert saved == []
+    assert chat_app.get_extraction_cache().stats()["entries"] == entries
+
+
+def test_complete_extraction_is_persisted(chat_app, document, monkeypatch):
+    entries = chat_app.get_extraction_cache().stats()["entries"]
+
+    (_, _, extracted, error), saved = extract_first_packet(
+        chat_app, document, monkeypatch, '{"packet_id": "complet", "sections": [{"title": "Fait"}]}'
+    )
+
+    assert error is None
+    assert saved == [extracted]
+    assert chat_app.get_extraction_cache().stats()["entries"] == entries + 1
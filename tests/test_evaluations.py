@@ -0,0 +1,56 @@
+"""
+File des évaluations (app/evaluations.py), fonction d'évaluation remplacée :
+déduplication, conservation des résultats attendus, clés expirées.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from evaluations import EXPIRED_RESULT, EvaluationQueue  # noqa: E402
+
+
+def wait_idle(queue, timeout_s=5.0):
+    deadline = time.time() + timeout_s
+    while queue.pending_count():
+        assert time.time() < deadline, "évaluations toujours en cours"
+        time.sleep(0.01)
+
+
+def make_queue(max_results=256):
+    calls = []
+
+    def evaluate(document_source, reponse_llm, prompt_type):
+        calls.append(reponse_llm)
+        return {"score_global": 4, "reponse": reponse_llm}
+
+    return EvaluationQueue(evaluate, batch_size=3, max_results=max_results), calls
+
+
+def test_same_evaluation_is_graded_once():
+    queue, calls = make_queue()
+    first = queue.submit("document", "réponse", "Résumé Conclusions")
+    second = queue.submit("document", "réponse", "Résumé Conclusions")
+    wait_idle(queue)
+
+    assert first == second
+    assert calls == ["réponse"]
+    assert queue.collect(first)["reponse"] == "réponse"
+    assert queue.collect(second)["reponse"] == "réponse"
+
+
+def test_awaited_results_are_not_evicted():
+    queue, _calls = make_queue(max_results=2)
+    keys = [queue.submit("document", f"réponse {i}", "Résumé Conclusions") for i in range(6)]
+    wait_idle(queue)
+
+    assert [queue.collect(key)["reponse"] for key in keys] == [f"réponse {i}" for i in range(6)]
+    assert queue.stats()["results"] == 2
+
+
+def test_unknown_key_is_expired():
+    queue, _calls = make_queue()
+    assert queue.finished("inconnue")
+    assert queue.collect("inconnue") == EXPIRED_RESULT